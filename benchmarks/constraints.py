@@ -0,0 +1,199 @@
+"""Compare the constraint modes of `mop.dag.matrix_constraint`.
+
+The same synthetic rig, see `scaling.generate_rig`, is built once per
+constraint mode. For every mode the number of nodes created by the build,
+the build time and the evaluation speed of the rig are reported, along with
+the largest difference of the deform joints' world matrices with the first
+mode, which should stay close to zero.
+
+The evaluation speed is measured by playing an animation of every
+controller with the parallel evaluation manager. Outside of Maya, run it
+against the headless backend, the controllers are then moved and the
+deform joints queried once per frame::
+
+    MOP_HEADLESS=1 python benchmarks/constraints.py --modules 16 64 \\
+        --joint-count 10 --output constraints.json
+
+From a Maya session, call `run` with the same arguments.
+Every build starts from a new scene.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from scaling import generate_rig  # also puts mop on the path
+import maya.cmds as cmds
+
+import mop.config
+from mop.dag import CONSTRAINT_MODES
+
+logger = logging.getLogger(__name__)
+
+
+def _no_profile(operation):
+    return _NoProfile()
+
+
+class _NoProfile(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+def _animated_attributes(controllers):
+    attributes = []
+    for ctl in controllers:
+        for attr in ("translateX", "rotateY"):
+            plug = ctl + "." + attr
+            if cmds.getAttr(plug, lock=True):
+                continue
+            if cmds.listConnections(plug, source=True, destination=False):
+                continue
+            attributes.append(plug)
+    return attributes
+
+
+def measure_fps(rig, frames):
+    """Return the number of frames per second the rig evaluates at."""
+    controllers = []
+    for module in rig.rig_modules:
+        controllers.extend(module.controllers.get())
+    attributes = _animated_attributes(controllers)
+    joints = rig.skeleton
+
+    if getattr(sys.modules["maya"], "headless", False):
+        start = time.time()
+        for frame in range(frames):
+            for attr in attributes:
+                cmds.setAttr(attr, frame * 0.1)
+            for joint in joints:
+                cmds.getAttr(joint + ".worldMatrix[0]")
+        return frames / (time.time() - start)
+
+    cmds.evaluationManager(mode="parallel")
+    cmds.playbackOptions(minTime=1, maxTime=frames)
+    for attr in attributes:
+        cmds.setKeyframe(attr, time=1, value=0)
+        cmds.setKeyframe(attr, time=frames, value=frames * 0.1)
+    cmds.currentTime(1)
+    start = time.time()
+    for frame in range(1, frames + 1):
+        cmds.currentTime(frame, update=True)
+    return frames / (time.time() - start)
+
+
+def _skeleton_matrices(rig):
+    return OrderedDict(
+        (joint, cmds.getAttr(joint + ".worldMatrix[0]")) for joint in rig.skeleton
+    )
+
+
+def _max_deviation(matrices, reference):
+    deviation = 0.0
+    for joint, matrix in matrices.iteritems():
+        for a, b in zip(matrix, reference.get(joint, matrix)):
+            deviation = max(deviation, abs(a - b))
+    return deviation
+
+
+def run(module_counts, joint_count, frames, modes=CONSTRAINT_MODES):
+    """Build the rigs in every constraint mode and return the results."""
+    results = []
+    default_mode = mop.config.constraint_mode
+    try:
+        for module_count in module_counts:
+            reference = None
+            for mode in modes:
+                logger.info(
+                    "Benchmarking {} modules with the {} mode".format(
+                        module_count, mode
+                    )
+                )
+                mop.config.constraint_mode = mode
+                start = time.time()
+                rig = generate_rig(module_count, joint_count, _no_profile)
+                build_time = time.time() - start
+                build_nodes = rig.build_nodes
+
+                node_types = OrderedDict()
+                for node in build_nodes:
+                    node_type = cmds.nodeType(node)
+                    node_types[node_type] = node_types.get(node_type, 0) + 1
+
+                matrices = _skeleton_matrices(rig)
+                if reference is None:
+                    reference = matrices
+                results.append(
+                    OrderedDict(
+                        [
+                            ("mode", mode),
+                            ("modules", module_count),
+                            ("joint_count", joint_count),
+                            ("build_nodes", len(build_nodes)),
+                            ("build_time", build_time),
+                            ("fps", measure_fps(rig, frames)),
+                            ("max_deviation", _max_deviation(matrices, reference)),
+                            ("node_types", node_types),
+                        ]
+                    )
+                )
+    finally:
+        mop.config.constraint_mode = default_mode
+    return OrderedDict(
+        [
+            ("headless", bool(getattr(sys.modules["maya"], "headless", False))),
+            ("results", results),
+        ]
+    )
+
+
+def print_report(report):
+    row = "{:<20}{:>9}{:>8}{:>8}{:>12}{:>10}{:>12}"
+    print(
+        row.format(
+            "mode", "modules", "joints", "nodes", "build (s)", "fps", "deviation"
+        )
+    )
+    for result in report["results"]:
+        print(
+            row.format(
+                result["mode"],
+                result["modules"],
+                result["joint_count"],
+                result["build_nodes"],
+                "{:.3f}".format(result["build_time"]),
+                "{:.1f}".format(result["fps"]),
+                "{:.1e}".format(result["max_deviation"]),
+            )
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--modules", nargs="+", type=int, default=[16, 64])
+    parser.add_argument("--joint-count", type=int, default=10)
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument(
+        "--modes", nargs="+", choices=CONSTRAINT_MODES, default=CONSTRAINT_MODES
+    )
+    parser.add_argument("--output", help="path of the JSON results file")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    report = run(sorted(args.modules), args.joint_count, args.frames, args.modes)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
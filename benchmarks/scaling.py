@@ -0,0 +1,233 @@
+"""Measure how the rig operations scale with the size of the rig.
+
+Synthetic rigs are generated for every combination of module count and
+joint count, the ``Chain`` and ``Spine`` modules use the joint count while
+the ``Leaf`` and ``Arm`` modules keep their own. Each operation is timed
+with `mop.utils.profiler` so the number of created nodes and of
+`maya.cmds` calls are reported along with the wall time.
+
+Outside of Maya, run it against the headless backend::
+
+    MOP_HEADLESS=1 python benchmarks/scaling.py --modules 10 100 1000 \\
+        --joint-counts 5 50 --output scaling.json
+
+From a Maya session, call `run` with the same arguments.
+Every run starts from a new scene.
+
+``--smoke`` only builds every module of `mop.modules.all_rig_modules`
+once and reports the ones that fail::
+
+    MOP_HEADLESS=1 python benchmarks/scaling.py --smoke
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import sys
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mop  # installs the headless backend when MOP_HEADLESS is set
+import maya.cmds as cmds
+
+from mop.core.rig import Rig
+from mop.modules import all_rig_modules
+from mop.utils.profiler import Profiler
+
+logger = logging.getLogger(__name__)
+
+MODULE_TYPES = ("Chain", "Leaf", "Spine", "Arm")
+
+
+def generate_rig(module_count, joint_count, profile):
+    """Create a rig of ``module_count`` modules and profile every step.
+
+    Modules are parented to the first deform joint of an earlier module,
+    so the rig is a tree a few levels deep rather than a flat list, and
+    changing the joint count does not delete the parent joints.
+    """
+    cmds.file(new=True, force=True)
+    rig = Rig()
+    root = rig.rig_modules[0]
+    modules = []
+
+    with profile("add_module"):
+        for i in range(module_count):
+            module_type = MODULE_TYPES[i % len(MODULE_TYPES)]
+            parent = modules[i // 2] if i else root
+            kwargs = {"parent_joint": parent.deform_joints.get()[0]}
+            if module_type == "Arm":
+                kwargs["side"] = "L"
+            modules.append(rig.add_module(module_type, **kwargs))
+
+    with profile("update"):
+        for module in modules:
+            if hasattr(module, "joint_count"):
+                module.joint_count.set(joint_count)
+            module.update()
+
+    with profile("mirror_module"):
+        for module in modules:
+            if module.side.get() == "L":
+                rig.mirror_module(module)
+
+    with profile("build"):
+        rig.build()
+    with profile("unbuild"):
+        rig.unbuild()
+    rig.build()
+    with profile("publish"):
+        rig.publish()
+    return rig
+
+
+def run(module_counts, joint_counts):
+    """Profile every operation for each rig size and return the results."""
+    results = []
+    for joint_count in joint_counts:
+        for module_count in module_counts:
+            logger.info(
+                "Benchmarking {} modules of {} joints".format(module_count, joint_count)
+            )
+            records = OrderedDict()
+
+            def profile(operation):
+                profiler = Profiler()
+                records[operation] = profiler
+                return profiler
+
+            generate_rig(module_count, joint_count, profile)
+            for operation, profiler in records.iteritems():
+                results.append(
+                    OrderedDict(
+                        [
+                            ("operation", operation),
+                            ("modules", module_count),
+                            ("joint_count", joint_count),
+                            ("wall_time", profiler.total_time),
+                            ("nodes_created", profiler.nodes_created),
+                            ("cmds_calls", profiler.cmds_calls),
+                        ]
+                    )
+                )
+    return OrderedDict(
+        [
+            ("headless", bool(getattr(sys.modules["maya"], "headless", False))),
+            ("results", results),
+            ("scaling", scaling(results)),
+        ]
+    )
+
+
+def smoke_build():
+    """Build, unbuild and build again every module type in its own rig.
+
+    :return: error of every module type that failed, by module type.
+    :rtype: OrderedDict
+    """
+    failures = OrderedDict()
+    for module_type in all_rig_modules:
+        cmds.file(new=True, force=True)
+        rig = Rig()
+        parent_joint = rig.rig_modules[0].deform_joints.get()[-1]
+        try:
+            module = rig.add_module(module_type, parent_joint=parent_joint)
+            # the inputs these modules cannot build without.
+            if module_type == "Rivet":
+                surface = cmds.createNode("nurbsSurface")
+                module.geometry.set(cmds.listRelatives(surface, parent=True)[0])
+            elif module_type == "Twist":
+                module.twist_driver.set(parent_joint)
+            elif module_type == "FkIkSpringChain":
+                # the IK start and end would be the same single joint.
+                module.joint_count.set(3)
+                module.update()
+            rig.build()
+            rig.unbuild()
+            rig.build()
+        except Exception as e:
+            logger.exception("Failed to build a {} module".format(module_type))
+            failures[module_type] = "{}: {}".format(type(e).__name__, e)
+    return failures
+
+
+def scaling(results):
+    """Estimate the scaling exponent of every operation.
+
+    The exponent is the slope of the log-log curve between two
+    consecutive module counts, 1 is linear, 2 quadratic.
+    """
+    curves = OrderedDict()
+    for result in results:
+        key = "{} ({} joints)".format(result["operation"], result["joint_count"])
+        curves.setdefault(key, []).append(result)
+
+    exponents = OrderedDict()
+    for key, curve in curves.iteritems():
+        slopes = []
+        for a, b in zip(curve, curve[1:]):
+            if min(a["wall_time"], b["wall_time"]) <= 0 or a["modules"] == b["modules"]:
+                continue
+            slopes.append(
+                OrderedDict(
+                    [
+                        ("modules", [a["modules"], b["modules"]]),
+                        (
+                            "exponent",
+                            math.log(b["wall_time"] / a["wall_time"])
+                            / math.log(float(b["modules"]) / a["modules"]),
+                        ),
+                    ]
+                )
+            )
+        exponents[key] = slopes
+    return exponents
+
+
+def print_report(report):
+    row = "{:<15}{:>9}{:>8}{:>12}{:>10}{:>12}"
+    print(row.format("operation", "modules", "joints", "time (s)", "nodes", "cmds"))
+    for result in report["results"]:
+        print(
+            row.format(
+                result["operation"],
+                result["modules"],
+                result["joint_count"],
+                "{:.3f}".format(result["wall_time"]),
+                result["nodes_created"],
+                result["cmds_calls"],
+            )
+        )
+    print("")
+    for key, slopes in report["scaling"].iteritems():
+        exponents = ", ".join("{:.2f}".format(s["exponent"]) for s in slopes)
+        print("{:<30}{}".format(key, exponents))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--modules", nargs="+", type=int, default=[4, 16, 64])
+    parser.add_argument("--joint-counts", nargs="+", type=int, default=[3, 30])
+    parser.add_argument("--output", help="path of the JSON results file")
+    parser.add_argument(
+        "--smoke", action="store_true", help="only build every module type once"
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    if args.smoke:
+        failures = smoke_build()
+        for module_type in all_rig_modules:
+            print("{:<25}{}".format(module_type, failures.get(module_type, "ok")))
+        return 1 if failures else 0
+    report = run(sorted(args.modules), sorted(args.joint_counts))
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=4)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,10 @@
+import os
+
+if os.environ.get("MOP_HEADLESS"):
+    import mop.headless
+
+    mop.headless.install()
+
 import mop.internals
 
 increment_version = mop.internals.increment_version
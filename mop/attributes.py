@@ -1,4 +1,9 @@
+from contextlib import contextmanager
+
 import maya.cmds as cmds
+import maya.api.OpenMaya as om2
+
+import mop.utils.undo
 
 
 valid_data_types = [
@@ -70,6 +75,54 @@ attr_whitelist = [
 ]
 
 
+# persistent values of the modules being built, by module node.
+# see `persistent_attributes_store`.
+_stores = {}
+
+
+@contextmanager
+def persistent_attributes_store(module_node, values, backup=False):
+    """Keep the persistent attributes of ``module_node`` in ``values``.
+
+    While active, `create_persistent_attribute` restores the attributes
+    from ``values`` and registers them in it, instead of backing them up
+    with an attribute on the module node.
+
+    :param module_node: module the persistent attributes are created for.
+    :type module_node: str
+    :param values: values by node then attribute name, updated in place.
+    :type values: dict
+    :param backup: still back the attributes up on the module node,
+        ``values`` then only overrides the backed up values.
+    :type backup: bool
+    """
+    _stores[module_node] = (values, backup)
+    try:
+        yield values
+    finally:
+        del _stores[module_node]
+
+
+def get_persistent_values(values):
+    """Return the current values of the persistent attributes in ``values``.
+
+    The attributes that don't exist in the scene keep their stored value.
+
+    :param values: values by node then attribute name.
+    :type values: dict
+    :rtype: dict
+    """
+    current_values = {}
+    for node, attributes in values.iteritems():
+        node_values = current_values.setdefault(node, {})
+        for attr, value in attributes.iteritems():
+            attr_name = node + "." + attr
+            if cmds.objExists(attr_name):
+                value = cmds.getAttr(attr_name)
+            node_values[attr] = value
+    return current_values
+
+
 def create_persistent_attribute(node, module_node, *args, **kwargs):
     """Create an attribute that keeps its value when rebuilding."""
     category = kwargs.pop("category", kwargs.pop("ct", []))
@@ -79,9 +132,25 @@ def create_persistent_attribute(node, module_node, *args, **kwargs):
 
     cmds.addAttr(node, longName=long_name, category=source_category, *args, **kwargs)
 
+    values, backup = _stores.get(module_node, (None, True))
+    if not backup:
+        node_values = values.setdefault(node, {})
+        value = node_values.get(long_name)
+        if value is None:
+            node_values[long_name] = cmds.getAttr(node + "." + long_name)
+            return
+        data_type = kwargs.get("dataType", kwargs.get("dt"))
+        kwargs = {}
+        if data_type in valid_data_types:
+            kwargs["type"] = data_type
+        cmds.setAttr(node + "." + long_name, value, **kwargs)
+        return
+
     module_attr_name = node + "__" + long_name
+    value = (values or {}).get(node, {}).get(long_name)
     if cmds.attributeQuery(module_attr_name, node=module_node, exists=True):
-        value = cmds.getAttr(module_node + "." + module_attr_name)
+        if value is None:
+            value = cmds.getAttr(module_node + "." + module_attr_name)
         data_type = cmds.addAttr(
             module_node + "." + module_attr_name, query=True, dataType=True
         )
@@ -90,6 +159,12 @@ def create_persistent_attribute(node, module_node, *args, **kwargs):
             kwargs["type"] = data_type[0]
         cmds.setAttr(node + "." + long_name, value, **kwargs)
     else:
+        if value is not None:
+            data_type = kwargs.get("dataType", kwargs.get("dt"))
+            set_kwargs = {}
+            if data_type in valid_data_types:
+                set_kwargs["type"] = data_type
+            cmds.setAttr(node + "." + long_name, value, **set_kwargs)
         backup_category = list(category)
         backup_category.append("persistent_attribute_backup")
         kwargs.pop("keyable", None)
@@ -143,3 +218,152 @@ def set_attributes_state(node, attributes_state):
 
         if not is_locked and not is_connected:
             cmds.setAttr(attr_name, value)
+
+
+# default state of the whitelisted attributes, by node type then attribute.
+_default_states = {}
+
+
+def _attribute_unit(attr):
+    """Return how the value of the whitelisted ``attr`` is read and written."""
+    if attr.endswith("Enable"):
+        return "bool"
+    if attr.startswith("rotate") or "Rot" in attr:
+        return "angle"
+    if attr.startswith("translate") or "Trans" in attr:
+        return "distance"
+    return "double"
+
+
+def get_plug_value(plug, unit):
+    """Return the value of ``plug`` in the ui units.
+
+    :param plug: plug to get the value of.
+    :type plug: om2.MPlug
+    :param unit: one of "bool", "int", "angle", "distance" or "double".
+    :type unit: str
+    """
+    if unit == "bool":
+        return plug.asBool()
+    if unit == "int":
+        return plug.asInt()
+    if unit == "angle":
+        return plug.asMAngle().asUnits(om2.MAngle.uiUnit())
+    if unit == "distance":
+        return plug.asMDistance().asUnits(om2.MDistance.uiUnit())
+    return plug.asDouble()
+
+
+def set_plug_value(modifier, plug, unit, value):
+    """Queue setting ``plug`` to ``value``, in the ui units, on ``modifier``.
+
+    :param modifier: modifier setting the value.
+    :type modifier: om2.MDGModifier
+    :param plug: plug to set.
+    :type plug: om2.MPlug
+    :param unit: one of "bool", "int", "angle", "distance" or "double".
+    :type unit: str
+    """
+    if unit == "bool":
+        modifier.newPlugValueBool(plug, bool(value))
+    elif unit == "int":
+        modifier.newPlugValueInt(plug, int(value))
+    elif unit == "angle":
+        modifier.newPlugValueMAngle(plug, om2.MAngle(value, om2.MAngle.uiUnit()))
+    elif unit == "distance":
+        modifier.newPlugValueMDistance(
+            plug, om2.MDistance(value, om2.MDistance.uiUnit())
+        )
+    else:
+        modifier.newPlugValueDouble(plug, value)
+
+
+def _get_default_state(node, node_type, attr):
+    key = (node_type, attr)
+    if key not in _default_states:
+        default = cmds.attributeQuery(attr, node=node, listDefault=True)[0]
+        if _attribute_unit(attr) == "bool":
+            default = bool(default)
+        _default_states[key] = {
+            "lock": False,
+            "keyable": cmds.attributeQuery(attr, node=node, keyable=True),
+            "channelBox": cmds.attributeQuery(attr, node=node, channelBox=True),
+            "value": default,
+        }
+    return _default_states[key]
+
+
+def _whitelisted_plugs(node):
+    """Yield the name, plug and default state of the whitelisted attributes."""
+    sel = om2.MSelectionList()
+    sel.add(node)
+    fn = om2.MFnDependencyNode(sel.getDependNode(0))
+    node_type = fn.typeName
+    for attr in attr_whitelist:
+        if not fn.hasAttribute(attr):
+            continue
+        yield attr, fn.findPlug(attr, False), _get_default_state(node, node_type, attr)
+
+
+def get_attributes_states(nodes):
+    """Get the attribute data of ``nodes`` that differ from the defaults.
+
+    Attributes with the default lock, keyable, channelBox and value
+    are not part of the returned data.
+
+    :param nodes: nodes to get the attribute data from.
+    :type nodes: list
+    :return: attribute data by node then attribute name.
+    :rtype: dict
+    """
+    attributes_states = {}
+    for node in nodes:
+        node_states = {}
+        for attr, plug, default_state in _whitelisted_plugs(node):
+            attr_state = {
+                "lock": plug.isLocked,
+                "keyable": plug.isKeyable,
+                "channelBox": plug.isChannelBox,
+                "value": get_plug_value(plug, _attribute_unit(attr)),
+            }
+            if attr_state != default_state:
+                node_states[attr] = attr_state
+        attributes_states[node] = node_states
+    return attributes_states
+
+
+def set_attributes_states(attributes_states):
+    """Set the attribute data of many nodes back.
+
+    The attributes missing from the data of a node are set to their defaults.
+    Only the values of unlocked and unconnected attributes are set,
+    all in a single undoable modifier.
+
+    :param attributes_states: attribute data by node then attribute name,
+        as returned by `get_attributes_states`.
+    :type attributes_states: dict
+    """
+    modifier = om2.MDGModifier()
+    has_values = False
+    for node, node_states in attributes_states.iteritems():
+        for attr, plug, default_state in _whitelisted_plugs(node):
+            attr_state = node_states.get(attr, default_state)
+            attr_name = node + "." + attr
+            if plug.isKeyable != attr_state["keyable"]:
+                cmds.setAttr(attr_name, keyable=attr_state["keyable"])
+            if plug.isLocked != attr_state["lock"]:
+                cmds.setAttr(attr_name, lock=attr_state["lock"])
+            if not attr_state["keyable"] and (
+                plug.isChannelBox != attr_state["channelBox"]
+            ):
+                # maya throws a warning if the attribute is keyable
+                cmds.setAttr(attr_name, channelBox=attr_state["channelBox"])
+
+            if attr_state["lock"] or plug.isDestination:
+                continue
+            unit = _attribute_unit(attr)
+            if get_plug_value(plug, unit) != attr_state["value"]:
+                set_plug_value(modifier, plug, unit, attr_state["value"])
+                has_values = True
+    if has_values:
+        mop.utils.undo.apply_modifier(modifier)
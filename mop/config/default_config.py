@@ -5,6 +5,26 @@ default_modules = {"Root": {"name": "root", "side": "M"}}
 
 side_color = {"M": [1.0, 0.6, 0.0], "L": [0.0, 0.5, 1.0], "R": [1.0, 0.05, 0.05]}
 
+# How `mop.dag.matrix_constraint` builds the constraints:
+# "decompose" drives the translate, rotate and scale through a decomposeMatrix,
+# "offsetParentMatrix" drives the offsetParentMatrix with a single multMatrix
+# (maya 2020 and up).
+# The rig has to be fully rebuilt for a change to be taken into account.
+constraint_mode = "decompose"
+
+# Merge the utility nodes computing the same values after building the rig.
+# Nodes are only merged within a module, which the stock modules never
+# duplicate, so this is off by default to save the time spent looking.
+deduplicate_build_nodes = False
+
+# Where the values of the persistent attributes are kept between builds:
+# "json" stores all the values of a module in a single string attribute,
+# "attributes" backs up each value in its own attribute on the module node.
+# Values found in the "json" storage take precedence over the backups, so both
+# can be switched to freely. Backups are only deleted by
+# `RigModule.delete_persistent_attribute_backups`.
+persistent_attributes_storage = "attributes"
+
 
 ########## Custom Scripts ##########
 general_scripts_dir = None  # {"relative": bool, "path": str}
@@ -1,21 +1,146 @@
 import collections
+import contextlib
+import copy
+import functools
 import json
 import logging
+import re
+import weakref
 
 import maya.api.OpenMaya as om2
 import maya.cmds as cmds
 import maya.mel
 
 from mop.utils.case import title
+from mop.utils.dg import node_name
 
 logger = logging.getLogger(__name__)
 
+_cache_depth = 0
+_cache_frozen = False
+_cache_generation = 0
+_names_generation = 0
+_cache_callback_ids = []
+_watched_nodes = {}
+_cache_stats = {"hits": 0, "misses": 0}
+
+_MISSING = object()
+
+
+@contextlib.contextmanager
+def field_cache(frozen=False):
+    """Cache the values of the fields inside of the context.
+
+    Values are written through when set with the fields. Changes made
+    to the field attributes by other means are caught by attribute
+    changed callbacks. Undo, redo and scene changes drop the whole cache,
+    renaming a connected node drops the cached message values.
+
+    :param frozen: if True, no callback is registered and the scene is
+        expected to only be edited through the fields inside of the context.
+    :type frozen: bool
+    """
+    global _cache_depth, _cache_frozen
+    if not _cache_depth:
+        _cache_frozen = frozen
+        if not frozen:
+            _register_cache_callbacks()
+    _cache_depth += 1
+    try:
+        yield
+    finally:
+        _cache_depth -= 1
+        if not _cache_depth:
+            om2.MMessage.removeCallbacks(_cache_callback_ids)
+            del _cache_callback_ids[:]
+            _watched_nodes.clear()
+            invalidate_field_cache()
+
+
+def cache_fields(func):
+    """Decorated function will run inside of a `field_cache`."""
+
+    @functools.wraps(func)
+    def wrapped(*args, **kwargs):
+        with field_cache():
+            return func(*args, **kwargs)
+
+    return wrapped
+
+
+def invalidate_field_cache(*args):
+    """Drop every cached field value."""
+    global _cache_generation
+    _cache_generation += 1
+
+
+def field_cache_stats():
+    """Return the number of cache hits and misses."""
+    return dict(_cache_stats)
+
+
+def reset_field_cache_stats():
+    _cache_stats["hits"] = 0
+    _cache_stats["misses"] = 0
+
+
+def _node_renamed(mobj, old_name, *args):
+    """Drop the cached message values if the renamed node is connected."""
+    global _names_generation
+    if om2.MFnDependencyNode(mobj).findPlug("message", False).isSource:
+        _names_generation += 1
+
+
+def _register_cache_callbacks():
+    _cache_callback_ids.append(
+        om2.MNodeMessage.addNameChangedCallback(om2.MObject(), _node_renamed)
+    )
+    for message in (
+        om2.MSceneMessage.kAfterNew,
+        om2.MSceneMessage.kAfterOpen,
+        om2.MSceneMessage.kAfterImport,
+    ):
+        _cache_callback_ids.append(
+            om2.MSceneMessage.addCallback(message, invalidate_field_cache)
+        )
+    for event in ("Undo", "Redo"):
+        _cache_callback_ids.append(
+            om2.MEventMessage.addEventCallback(event, invalidate_field_cache)
+        )
+
+
+def _watch_node(instance):
+    """Invalidate the cached values of ``instance`` when its attributes change."""
+    if _cache_frozen or id(instance) in _watched_nodes:
+        return
+    sel = om2.MSelectionList()
+    sel.add(instance.node_name)
+    callback_id = om2.MNodeMessage.addAttributeChangedCallback(
+        sel.getDependNode(0), _attribute_changed, weakref.ref(instance)
+    )
+    _watched_nodes[id(instance)] = callback_id
+    _cache_callback_ids.append(callback_id)
+
+
+def _attribute_changed(msg, plug, other_plug, instance_ref):
+    instance = instance_ref()
+    if instance is None:
+        return
+    name = re.split(r"[\[.]", plug.partialName(useLongNames=True))[0]
+    field = instance.fields_dict.get(name)
+    if field is not None and instance in field._attrs:
+        field._attrs[instance].invalidate()
+
 
 class AttributeBase(object):
     def __init__(self, instance, field):
         self.field = field
         self.is_multi = field.create_attr_args.get("multi", False)
         self.instance = instance
+        self._cached_value = _MISSING
+        self._cached_generation = None
+        self._handle = None
+        self._mplug = None
         if not cmds.attributeQuery(field.name, node=instance.node_name, exists=True):
             cmds.addAttr(
                 instance.node_name, longName=field.name, **field.create_attr_args
@@ -25,23 +150,82 @@ class AttributeBase(object):
     def attr_name(self):
         return ".".join([self.instance.node_name, self.field.name])
 
+    def plug(self):
+        """Return the MPlug of this attribute.
+
+        The plug is kept along with a handle to its node,
+        it is only looked up again once the node is no longer valid.
+        """
+        if self._handle is None or not self._handle.isValid():
+            sel = om2.MSelectionList()
+            sel.add(self.instance.node_name)
+            mobj = sel.getDependNode(0)
+            self._handle = om2.MObjectHandle(mobj)
+            self._mplug = om2.MFnDependencyNode(mobj).findPlug(self.field.name, False)
+        return self._mplug
+
+    def get(self):
+        if not _cache_depth:
+            return self._get()
+        if self._cached_generation == self._generation():
+            _cache_stats["hits"] += 1
+        else:
+            _cache_stats["misses"] += 1
+            _watch_node(self.instance)
+            self._cache(self._get())
+        value = self._cached_value
+        if isinstance(value, list):
+            return list(value)
+        if isinstance(value, dict):
+            return copy.deepcopy(value)
+        return value
+
+    def _get(self):
+        raise NotImplementedError
+
+    def _generation(self):
+        return _cache_generation
+
+    def _cache(self, value):
+        if _cache_depth:
+            self._cached_value = value
+            self._cached_generation = self._generation()
+
+    def invalidate(self, plug=False):
+        """Drop the cached value of this attribute.
+
+        :param plug: drop the cached MPlug too, for a recreated attribute.
+        :type plug: bool
+        """
+        self._cached_value = _MISSING
+        self._cached_generation = None
+        if plug:
+            self._handle = None
+            self._mplug = None
+
 
 class Attribute(AttributeBase):
     def set(self, value):
         casted_value = self.field.cast_to_attr(value)
         cmds.setAttr(self.attr_name, casted_value, **self.field.set_attr_args)
+        self._cache(self.field.value_from_set(value))
 
-    def get(self):
+    def _get(self):
         value = cmds.getAttr(self.attr_name, **self.field.get_attr_args)
         return self.field.cast_from_attr(value)
 
 
 class MessageAttribute(AttributeBase):
+    def _generation(self):
+        # the values are names of other nodes.
+        return _cache_generation, _names_generation
+
     def set(self, value):
         casted_value = self.field.cast_to_attr(value)
         cmds.connectAttr(casted_value + ".message", self.attr_name, force=True)
+        self.invalidate()
 
-    def get(self):
+    def _get(self):
         val = cmds.listConnections(
             "{}".format(self.attr_name), source=True, shapes=True
         )
@@ -60,8 +244,9 @@ class MultiAttribute(AttributeBase, collections.MutableSequence):
             casted_item = self.field.cast_to_attr(item)
             attrName = "{}[{}]".format(self.attr_name, index)
             cmds.setAttr(attrName, casted_item, **self.field.set_attr_args)
+        self.invalidate()
 
-    def get(self):
+    def _get(self):
         values = []
         for val in cmds.getAttr("{}[*]".format(self.attr_name)):
             val = self.field.cast_from_attr(val)
@@ -73,8 +258,14 @@ class MultiAttribute(AttributeBase, collections.MutableSequence):
             cmds.removeMultiInstance(self.attr_name, allChildren=True, b=True)
         except RuntimeError:
             pass
+        self.invalidate()
+
+    def __iter__(self):
+        return iter(self.get())
 
     def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.get()[index]
         val = cmds.getAttr("{}[{}]".format(self.attr_name, self._logical_index(index)))
         return self.field.cast_from_attr(val)
 
@@ -82,8 +273,13 @@ class MultiAttribute(AttributeBase, collections.MutableSequence):
         casted_item = self.field.cast_to_attr(value)
         attrName = "{}[{}]".format(self.attr_name, self._logical_index(index))
         cmds.setAttr(attrName, casted_item, **self.field.set_attr_args)
+        self.invalidate()
 
     def __delitem__(self, index):
+        if isinstance(index, slice):
+            for i in sorted(range(*index.indices(len(self))), reverse=True):
+                del self[i]
+            return
         target = "{}[{}]".format(self.attr_name, self._logical_index(index))
         sources = cmds.listConnections(target, source=True, plugs=True) or []
 
@@ -91,28 +287,24 @@ class MultiAttribute(AttributeBase, collections.MutableSequence):
             cmds.disconnectAttr(source, target)
 
         cmds.removeMultiInstance(target, b=True)
+        self.invalidate()
 
     def __len__(self):
-        return len(cmds.getAttr("{}[*]".format(self.attr_name)))
+        return len(self._logical_indices())
 
     def insert(self, index, value):
         casted_item = self.field.cast_to_attr(value)
         attrName = "{}[{}]".format(self.attr_name, index)
         cmds.setAttr(attrName, casted_item, **self.field.set_attr_args)
+        self.invalidate()
 
     def append(self, value):
         """Append to the very last plug of the multi attribute."""
-        index = cmds.getAttr("{}".format(self.attr_name), size=True)
+        index = self.plug().numElements()
         self.insert(index, value)
 
     def _logical_indices(self):
-        sel = om2.MSelectionList()
-        node_name, _, plug_name = self.attr_name.partition(".")
-        sel.add(node_name)
-        mobj = sel.getDependNode(0)
-        mfn = om2.MFnDependencyNode(mobj)
-        plug = mfn.findPlug(plug_name, 0)
-        return plug.getExistingArrayAttributeIndices()
+        return self.plug().getExistingArrayAttributeIndices()
 
     def _logical_index(self, index):
         logical_indices = self._logical_indices()
@@ -126,14 +318,30 @@ class MultiAttribute(AttributeBase, collections.MutableSequence):
 
 
 class MessageMultiAttribute(MultiAttribute):
+    def _generation(self):
+        return _cache_generation, _names_generation
+
     def __setitem__(self, index, value):
         casted_item = self.field.cast_to_attr(value)
         attrName = "{}[{}]".format(self.attr_name, index)
         cmds.connectAttr(casted_item + ".message", attrName)
+        self.invalidate()
 
-    def get(self):
-        values = cmds.listConnections("{}".format(self.attr_name), source=True) or []
-        return map(self.field.cast_from_attr, values)
+    def _get(self):
+        plug = self.plug()
+        values = []
+        for index in plug.getExistingArrayAttributeIndices():
+            source = plug.elementByLogicalIndex(index).source()
+            if not source.isNull:
+                values.append(self._source_value(source))
+        return values
+
+    def _source_value(self, source):
+        mobj = source.node()
+        if mobj.hasFn(om2.MFn.kShape):
+            # like listConnections, return the transform of the shapes.
+            mobj = om2.MFnDagNode(mobj).parent(0)
+        return self.field.cast_from_attr(node_name(mobj))
 
     def set(self, value):
         self.clear()
@@ -143,20 +351,28 @@ class MessageMultiAttribute(MultiAttribute):
             casted_item = self.field.cast_to_attr(item)
             attrName = "{}[{}]".format(self.attr_name, index)
             cmds.connectAttr(casted_item + ".message", attrName)
+        self.invalidate()
 
     def __getitem__(self, index):
-        # not using logical indices since listConnections only returns
-        # existing connections
-        val = cmds.listConnections("{}".format(self.attr_name), source=True) or []
-        return self.field.cast_from_attr(val[index])
+        if isinstance(index, slice):
+            return self.get()[index]
+        plug = self.plug()
+        # only read the requested element, the existing elements
+        # are the connected ones, see `mop.core.schema.fix_object_list_fields`.
+        logical_index = plug.getExistingArrayAttributeIndices()[index]
+        source = plug.elementByLogicalIndex(logical_index).source()
+        if source.isNull:
+            return self.get()[index]
+        return self._source_value(source)
 
     def __len__(self):
-        return len(cmds.listConnections("{}".format(self.attr_name), source=True) or [])
+        return len(self.get())
 
     def insert(self, index, value):
         casted_item = self.field.cast_to_attr(value)
         attrName = "{}[{}]".format(self.attr_name, index)
         cmds.connectAttr(casted_item + ".message", attrName)
+        self.invalidate()
 
 
 class FieldContainerMeta(type):
@@ -240,6 +456,10 @@ class Field(object):
         """
         return value
 
+    def value_from_set(self, value):
+        """Return what getting the field returns after setting ``value``."""
+        return self.cast_from_attr(self.cast_to_attr(value))
+
 
 class IntField(Field):
     create_attr_args = {"attributeType": "long"}
@@ -300,6 +520,9 @@ class EnumField(Field):
         """
         return self.choices.index(value)
 
+    def value_from_set(self, value):
+        return value
+
 
 class JSONField(StringField):
     def cast_to_attr(self, value):
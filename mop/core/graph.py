@@ -0,0 +1,194 @@
+"""Cached graph of the rig modules.
+
+Listing the modules of a rig requires instantiating every module and
+querying the parent of each one of them. The resulting graph is cached
+and reused until it is invalidated, either explicitly with `invalidate`
+whenever the modules hierarchy is edited, or by the scene callbacks
+registered by `register_callbacks` when a scene is opened or when an
+operation is undone or redone.
+"""
+import logging
+import re
+from collections import defaultdict
+
+import maya.cmds as cmds
+import maya.api.OpenMaya as om2
+
+import mop.dag
+from mop.modules import all_rig_modules
+
+logger = logging.getLogger(__name__)
+
+_generation = 0
+_graph = None
+_callback_ids = []
+
+_MODULE_NAME_REGEX = re.compile(
+    r"^(?P<raw_name>[a-zA-Z]*)(?P<id>[0-9]*)_(?P<side>[^_]*)_mod$"
+)
+
+
+def invalidate(*args):
+    """Mark the cached module graph as outdated."""
+    global _generation
+    _generation += 1
+
+
+def generation():
+    """Return the current generation of the module graph."""
+    return _generation
+
+
+def _scene_changed(*args):
+    """Invalidate the caches holding the nodes of the previous scene."""
+    invalidate()
+    mop.dag.clear_reset_plugs_cache()
+
+
+def register_callbacks():
+    """Invalidate the module graph when the scene changes under our feet."""
+    if _callback_ids:
+        return
+    for message in (
+        om2.MSceneMessage.kAfterNew,
+        om2.MSceneMessage.kAfterOpen,
+        om2.MSceneMessage.kAfterImport,
+    ):
+        _callback_ids.append(om2.MSceneMessage.addCallback(message, _scene_changed))
+    for event in ("Undo", "Redo"):
+        _callback_ids.append(om2.MEventMessage.addEventCallback(event, invalidate))
+
+
+def unregister_callbacks():
+    """Remove the callbacks registered by `register_callbacks`."""
+    for callback_id in _callback_ids:
+        om2.MMessage.removeCallback(callback_id)
+    del _callback_ids[:]
+
+
+def get_graph(rig):
+    """Return the module graph of ``rig``, building it only when outdated."""
+    global _graph
+    register_callbacks()
+    modules_group = rig.modules_group.get()
+    if (
+        _graph is None
+        or _graph.generation != _generation
+        or _graph.modules_group != modules_group
+    ):
+        _graph = ModuleGraph(rig, modules_group)
+    return _graph
+
+
+class ModuleGraph(object):
+    """Modules of a rig with their parent and children, in build order."""
+
+    def __init__(self, rig, modules_group):
+        self.generation = _generation
+        self.modules_group = modules_group
+        self.by_name = {}
+        self._parents = {}
+        self._children = defaultdict(list)
+        self._highest_indices = None
+
+        modules = []
+        for node in cmds.listRelatives(modules_group) or []:
+            module_type = cmds.getAttr(node + ".module_type")
+            module = all_rig_modules[module_type](node, rig=rig)
+            modules.append(module)
+            self.by_name[node] = module
+
+        for module in modules:
+            self._add_parent(module)
+
+        self.modules = self._sort(modules)
+
+    def _add_parent(self, module):
+        parent = None
+        parent_joint = module.parent_joint.get()
+        if parent_joint:
+            parent_nodes = cmds.listConnections(parent_joint + ".module", source=True)
+            if parent_nodes:
+                parent = self.by_name.get(parent_nodes[0])
+        self._parents[module.node_name] = parent
+        if parent is not None:
+            self._children[parent.node_name].append(module)
+
+    def _sort(self, modules):
+        """Sort the modules so that every parent comes before its children.
+
+        Modules keep their original order unless one of their parents has
+        to be moved in front of them.
+        """
+        placed = set()
+        sorted_modules = []
+        for module in modules:
+            chain = []
+            while module is not None and module.node_name not in placed:
+                placed.add(module.node_name)
+                chain.append(module)
+                module = self._parents[module.node_name]
+            sorted_modules.extend(reversed(chain))
+        return sorted_modules
+
+    def __contains__(self, module_node_name):
+        return module_node_name in self.by_name
+
+    def __iter__(self):
+        return iter(self.modules)
+
+    def __len__(self):
+        return len(self.modules)
+
+    def get(self, module_node_name):
+        return self.by_name.get(module_node_name)
+
+    def parent(self, module):
+        return self._parents.get(str(module))
+
+    def children(self, module):
+        return list(self._children.get(str(module), []))
+
+    def descendants(self, module):
+        """Return all the modules below ``module``, in build order."""
+        descendants = []
+        to_visit = self.children(module)
+        while to_visit:
+            child = to_visit.pop(0)
+            descendants.append(child)
+            to_visit.extend(self._children.get(child.node_name, []))
+        order = {m.node_name: i for i, m in enumerate(self.modules)}
+        return sorted(descendants, key=lambda m: order[m.node_name])
+
+    def add(self, module):
+        """Register a module that was just created.
+
+        The module is added at the end of the build order,
+        which is valid as long as its parent is already in the graph.
+        """
+        self.by_name[module.node_name] = module
+        self._add_parent(module)
+        self.modules.append(module)
+        if self._highest_indices is not None:
+            self._register_index(module.node_name)
+
+    def highest_index(self, raw_name, side):
+        """Return the highest index of the modules named ``raw_name``.
+
+        The index of a module without digits is 0,
+        None is returned when no module uses this name and side.
+        """
+        if self._highest_indices is None:
+            self._highest_indices = {}
+            for module_node_name in self.by_name:
+                self._register_index(module_node_name)
+        return self._highest_indices.get((raw_name, side))
+
+    def _register_index(self, module_node_name):
+        match = _MODULE_NAME_REGEX.match(module_node_name)
+        if not match:
+            return
+        key = (match.group("raw_name"), match.group("side"))
+        index = int(match.group("id") or 0)
+        if index > self._highest_indices.get(key, -1):
+            self._highest_indices[key] = index
@@ -1,22 +1,27 @@
+import hashlib
 import json
 import logging
+from contextlib import contextmanager
 
 import maya.cmds as cmds
 import maya.api.OpenMaya as om2
 
 from mop.core.fields import (
     EnumField,
+    JSONField,
     ObjectField,
     StringField,
     ObjectListField,
     BoolField,
 )
 from mop.core.mopNode import MopNode
+from mop.core.graph import invalidate
 from mop.modules import all_rig_modules
 from mop.utils.dg import find_mirror_node
 import mop.attributes
 import mop.dag
 import mop.utils.dg as _dgutils
+import mop.utils.undo
 import mop.metadata
 import mop.config
 
@@ -25,6 +30,110 @@ from mop.vendor.shapeshifter import shapeshifter
 
 logger = logging.getLogger(__name__)
 
+# reflections of the guides by `RigModule.update_mirror`.
+# disable black formatting to keep the matrices 4x4
+# fmt: off
+_WORLD_REFLECTION = om2.MMatrix(
+    [
+        -1.0, -0.0, -0.0, 0.0,
+        0.0, 1.0, 0.0, 0.0,
+        0.0, 0.0, 1.0, 0.0,
+        0.0, 0.0, 0.0, 1.0,
+    ]
+)
+_LOCAL_REFLECTION = om2.MMatrix(
+    [
+        -1.0, 0.0, 0.0, 0.0,
+        0.0, -1.0, 0.0, 0.0,
+        0.0, 0.0, -1.0, 0.0,
+        0.0, 0.0, 0.0, 1.0,
+    ]
+)
+# fmt: on
+
+# shape types created under a transform by `RigModule.add_node`.
+_SHAPE_TYPES = ("locator", "follicle")
+
+# whether a node type is a dag node, as only those can be created
+# by ``MDagModifier.createNode``.
+_dag_types = {}
+
+
+def _is_dag_type(node_type):
+    if node_type not in _dag_types:
+        inherited = cmds.nodeType(node_type, isTypeName=True, inherited=True) or []
+        _dag_types[node_type] = "dagNode" in inherited
+    return _dag_types[node_type]
+
+
+class NodeBatch(object):
+    """Nodes of a module created by a single ``MDagModifier``.
+
+    Created by `RigModule.batch_nodes`, the names returned by `add_node`
+    are only valid once the batch has been applied.
+    """
+
+    def __init__(self, module):
+        self.module = module
+        self.names = []
+        self._modifier = om2.MDagModifier()
+
+        self._owned_nodes = module.owned_nodes.plug()
+        self._owner_message = om2.MFnDependencyNode(
+            self._owned_nodes.node()
+        ).findPlug("message", False)
+        indices = self._owned_nodes.getExistingArrayAttributeIndices()
+        self._next_index = max(indices) + 1 if indices else 0
+
+    def add_node(
+        self, node_type, role=None, object_id=None, description=None, parent=None
+    ):
+        """Queue the creation of a node, see `RigModule.add_node`.
+
+        :param parent: node under which the new node is created.
+        :type parent: str
+        :rtype: str
+        """
+        name = self.module._new_node_name(node_type, role, object_id, description)
+        if name in self.names:
+            raise ValueError("A node with the name `{}` already exists".format(name))
+
+        parent_obj = om2.MObject.kNullObj
+        if parent:
+            sel = om2.MSelectionList()
+            sel.add(parent)
+            parent_obj = sel.getDependNode(0)
+
+        modifier = self._modifier
+        if node_type in _SHAPE_TYPES:
+            node = modifier.createNode("transform", parent_obj)
+            shape = modifier.createNode(node_type, node)
+            modifier.renameNode(shape, name + "Shape")
+        elif parent or _is_dag_type(node_type):
+            node = modifier.createNode(node_type, parent_obj)
+        else:
+            node = om2.MDGModifier.createNode(modifier, node_type)
+        modifier.renameNode(node, name)
+
+        module_attr = om2.MFnMessageAttribute().create("module", "module")
+        modifier.addAttribute(node, module_attr)
+        modifier.connect(self._owner_message, om2.MPlug(node, module_attr))
+        modifier.connect(
+            om2.MFnDependencyNode(node).findPlug("message", False),
+            self._owned_nodes.elementByLogicalIndex(self._next_index),
+        )
+        self._next_index += 1
+
+        self.names.append(name)
+        return name
+
+    def apply(self):
+        """Create all the queued nodes in a single undoable operation."""
+        if not self.names:
+            return
+        mop.utils.undo.apply_modifier(self._modifier)
+        self.module.owned_nodes.invalidate()
+
 
 class RigModule(MopNode):
 
@@ -91,6 +200,17 @@ class RigModule(MopNode):
 
     guide_to_def_constraints = ObjectListField()
 
+    # hash of the module's guides and settings when it was last built.
+    build_hash = StringField()
+
+    # objectSet holding all the nodes created when building this module.
+    build_nodes_set = ObjectField()
+
+    # values of the persistent attributes of the built nodes, by node then
+    # attribute name, when `mop.config.persistent_attributes_storage` is "json".
+    # With the "attributes" storage, they are moved to the backups on build.
+    persistent_attributes = JSONField()
+
     def __init__(self, name, side="M", parent_joint=None, rig=None):
         if cmds.objExists(name):
             self.node_name = name
@@ -145,6 +265,49 @@ class RigModule(MopNode):
     def is_mirrored(self):
         return bool(self.module_mirror)
 
+    @property
+    def build_nodes(self):
+        """All the nodes created when building this module."""
+        build_nodes_set = self.build_nodes_set.get()
+        if build_nodes_set:
+            return cmds.sets(build_nodes_set, query=True) or []
+        return []
+
+    def compute_build_hash(self):
+        """Hash everything the build of this module depends on.
+
+        This covers the editable fields, the matrices of the guides
+        and the values of the persistent attributes.
+        The guides follow the module node, which follows the parent joint,
+        so their matrices are relative to the module node.
+        """
+        data = {"module_type": self.module_type.get()}
+        for field in self.fields:
+            if field.editable:
+                data[field.name] = getattr(self, field.name).get()
+        guides = self.guide_nodes.get()
+        matrices = mop.dag.world_matrices([self.node_name] + guides)
+        data["guides"] = [
+            [
+                round(v, 5) + 0.0
+                for v in mop.dag.offset_matrix(guide, self.node_name, matrices)
+            ]
+            for guide in guides
+        ]
+        persistent_attrs = cmds.listAttr(
+            self.node_name, category="persistent_attribute_backup"
+        )
+        for attr in sorted(persistent_attrs or []):
+            data[attr] = cmds.getAttr(self.node_name + "." + attr)
+        persistent_values = mop.attributes.get_persistent_values(
+            self.persistent_attributes.get() or {}
+        )
+        for node, values in persistent_values.iteritems():
+            for attr, value in values.iteritems():
+                data[node + "__" + attr] = value
+        content = json.dumps(data, sort_keys=True, default=str)
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
     def initialize(self):
         """Creation of all the needed placement nodes.
 
@@ -153,22 +316,19 @@ class RigModule(MopNode):
         Will be called automatically when creating the module.
         You need to overwrite this method in your subclasses.
         """
-        self.guide_group.set(
-            self.add_node(
+        with self.batch_nodes() as batch:
+            guide_group = batch.add_node(
                 "transform", "grp", description="guide", parent=self.node_name
             )
-        )
-        self.controls_group.set(
-            self.add_node(
+            controls_group = batch.add_node(
                 "transform", role="grp", description="controls", parent=self.node_name
             )
-        )
-
-        self.extras_group.set(
-            self.add_node(
+            extras_group = batch.add_node(
                 "transform", role="grp", description="extras", parent=self.node_name
             )
-        )
+        self.guide_group.set(guide_group)
+        self.controls_group.set(controls_group)
+        self.extras_group.set(extras_group)
         cmds.setAttr(self.extras_group.get() + ".visibility", False)
         self.create_guide_nodes()
         self.create_deform_joints()
@@ -217,17 +377,21 @@ class RigModule(MopNode):
                 self._update_node_name(node)
 
             # rename the persistent attributes
+            persistent_values = self.persistent_attributes.get()
+            if persistent_values:
+                self.persistent_attributes.set(
+                    {
+                        self._new_node_name_from(node): values
+                        for node, values in persistent_values.iteritems()
+                    }
+                )
             persistent_attrs = cmds.listAttr(
                 self.node_name, category="persistent_attribute_backup"
             )
             if persistent_attrs:
                 for attr in persistent_attrs:
                     old_node, attr_name = attr.split("__")
-
-                    metadata = mop.metadata.metadata_from_name(old_node)
-                    metadata["base_name"] = self.name.get()
-                    metadata["side"] = self.side.get()
-                    new_node = mop.metadata.name_from_metadata(metadata)
+                    new_node = self._new_node_name_from(old_node)
                     logger.debug(
                         "Renaming persistent attribute from {} to {}".format(
                             self.node_name + "." + attr,
@@ -245,11 +409,19 @@ class RigModule(MopNode):
         self.update_deform_joints()
         self._constraint_deforms_to_guides()
 
+        # the name and parent of the module may have changed.
+        invalidate()
+
     def update_parent_joint(self):
         """Snap and constraint the module's node to the parent_joint.
 
         This lets the module's owned DAG nodes be in the same space as its deform_joints.
         """
+        guide_matrices = []
+        for guide in self.guide_nodes:
+            mat = cmds.xform(guide, query=True, matrix=True, worldSpace=True)
+            guide_matrices.append(mat)
+
         # delete the old constraint
         old_constraint_nodes = []
 
@@ -264,13 +436,21 @@ class RigModule(MopNode):
             )
             old_constraint_nodes.extend(second_level_nodes)
 
+        # driven by the "offsetParentMatrix" constraint mode.
+        offset_parent_matrix = self.node_name + ".offsetParentMatrix"
+        has_offset_parent_matrix = cmds.objExists(offset_parent_matrix)
+        if has_offset_parent_matrix:
+            old_constraint_nodes.extend(
+                cmds.listConnections(
+                    offset_parent_matrix, source=True, destination=False
+                )
+                or []
+            )
+
         if old_constraint_nodes:
             cmds.delete(old_constraint_nodes)
-
-        guide_matrices = []
-        for guide in self.guide_nodes:
-            mat = cmds.xform(guide, query=True, matrix=True, worldSpace=True)
-            guide_matrices.append(mat)
+        if has_offset_parent_matrix:
+            cmds.setAttr(offset_parent_matrix, list(om2.MMatrix()), type="matrix")
 
         parent = self.parent_joint.get()
         if parent:
@@ -279,11 +459,15 @@ class RigModule(MopNode):
         for guide, matrix in zip(self.guide_nodes, guide_matrices):
             cmds.xform(guide, matrix=matrix, worldSpace=True)
 
-    def _update_node_name(self, node):
+    def _new_node_name_from(self, node):
+        """Return the name of ``node`` with the module's current name and side."""
         metadata = mop.metadata.metadata_from_name(node)
         metadata["base_name"] = self.name.get()
         metadata["side"] = self.side.get()
-        new_name = mop.metadata.name_from_metadata(metadata)
+        return mop.metadata.name_from_metadata(metadata)
+
+    def _update_node_name(self, node):
+        new_name = self._new_node_name_from(node)
         cmds.rename(node, new_name)
         return new_name
 
@@ -294,9 +478,91 @@ class RigModule(MopNode):
         everything is setup properly
         """
         cmds.delete(self.guide_to_def_constraints.get())
-        self.build()
+        values = self.persistent_attributes.get() or {}
+        backup = mop.config.persistent_attributes_storage != "json"
+        if not backup:
+            self._add_persistent_attribute_backups(values)
+        with mop.attributes.persistent_attributes_store(
+            self.node_name, values, backup=backup
+        ):
+            self.build()
+        if not backup:
+            self.persistent_attributes.set(values)
+        elif values:
+            # the values now live in the backup attributes.
+            self.persistent_attributes.set({})
         self.is_built.set(True)
 
+    def _add_persistent_attribute_backups(self, values):
+        """Add the values of the backup attributes missing from ``values``.
+
+        :param values: values by node then attribute name, updated in place.
+        :type values: dict
+        """
+        backup_attrs = cmds.listAttr(
+            self.node_name, category="persistent_attribute_backup"
+        )
+        for attr in backup_attrs or []:
+            node, attr_name = attr.split("__")
+            value = cmds.getAttr(self.node_name + "." + attr)
+            values.setdefault(node, {}).setdefault(attr_name, value)
+
+    def delete_persistent_attribute_backups(self):
+        """Move the backup attributes to the `persistent_attributes` field.
+
+        The backup attributes created by the "attributes"
+        `mop.config.persistent_attributes_storage` are deleted,
+        only call this once the "json" storage is used for good.
+        """
+        if self.is_built.get():
+            raise RuntimeError(
+                "Cannot delete the persistent attribute backups of a built module."
+            )
+        values = self.persistent_attributes.get() or {}
+        self._add_persistent_attribute_backups(values)
+        self.persistent_attributes.set(values)
+        backup_attrs = cmds.listAttr(
+            self.node_name, category="persistent_attribute_backup"
+        )
+        for attr in backup_attrs or []:
+            cmds.deleteAttr(self.node_name + "." + attr)
+
+    def get_persistent_values(self):
+        """Return the current values of the persistent attributes.
+
+        The values come from both storages, see
+        `mop.config.persistent_attributes_storage`. When the module is built,
+        the shapes and attributes state of the controllers are up to date.
+
+        :return: values by node then attribute name.
+        :rtype: dict
+        """
+        values = mop.attributes.get_persistent_values(
+            self.persistent_attributes.get() or {}
+        )
+        self._add_persistent_attribute_backups(values)
+        if self.is_built.get():
+            controllers = self.controllers.get()
+            shapes_data = shapeshifter.get_shapes_data(controllers, strict=False)
+            states = mop.attributes.get_attributes_states(controllers)
+            for ctl in controllers:
+                ctl_values = values.setdefault(ctl, {})
+                if ctl in shapes_data:
+                    ctl_values["shape_data"] = json.dumps(shapes_data[ctl])
+                ctl_values["attributes_state"] = json.dumps(states[ctl])
+        return values
+
+    def save_persistent_attributes(self):
+        """Store the current values of the persistent attributes.
+
+        Only used by the "json" `mop.config.persistent_attributes_storage`,
+        this must be called before deleting the built nodes.
+        """
+        values = self.persistent_attributes.get()
+        if values:
+            values = mop.attributes.get_persistent_values(values)
+            self.persistent_attributes.set(values)
+
     def build(self):
         """Actual rigging of the module.
 
@@ -330,6 +596,43 @@ class RigModule(MopNode):
         :param description: optional description for the node
         :type object_id: str
         """
+        name = self._new_node_name(node_type, role, object_id, description)
+        node = cmds.createNode(node_type, name=name, *args, **kwargs)
+        if node_type in _SHAPE_TYPES:
+            shape = node + "Shape"
+            cmds.rename(node, shape)
+            node = cmds.listRelatives(shape, parent=True)[0]
+            node = cmds.rename(node, name)
+
+        cmds.addAttr(node, longName="module", attributeType="message")
+        cmds.connectAttr(self.node_name + ".message", node + ".module")
+        self.owned_nodes.append(node)
+
+        return node
+
+    @contextmanager
+    def batch_nodes(self):
+        """Create the nodes added in the code block all at once.
+
+        The nodes are named, tagged and owned by this module exactly like
+        with `add_node` but created by a single ``MDagModifier``, in one
+        undo step, when the code block exits::
+
+            with self.batch_nodes() as batch:
+                reverse = batch.add_node("reverse", description="switch")
+            cmds.connectAttr(ctl + ".switch", reverse + ".inputX")
+
+        :rtype: NodeBatch
+        """
+        batch = NodeBatch(self)
+        yield batch
+        batch.apply()
+
+    def _new_node_name(self, node_type, role=None, object_id=None, description=None):
+        """Return the name of a new node of this module.
+
+        :raises ValueError: if a node with this name already exists.
+        """
         if not role:
             role = node_type
         metadata = {
@@ -343,19 +646,7 @@ class RigModule(MopNode):
 
         if cmds.objExists(name):
             raise ValueError("A node with the name `{}` already exists".format(name))
-
-        node = cmds.createNode(node_type, name=name, *args, **kwargs)
-        if node_type == "locator" or node_type == "follicle":
-            shape = node + "Shape"
-            cmds.rename(node, shape)
-            node = cmds.listRelatives(shape, parent=True)[0]
-            node = cmds.rename(node, name)
-
-        cmds.addAttr(node, longName="module", attributeType="message")
-        cmds.connectAttr(self.node_name + ".message", node + ".module")
-        self.owned_nodes.append(node)
-
-        return node
+        return name
 
     def add_deform_joint(self, parent=None, object_id=None, description=None):
         """Creates a new deform joint for this module.
@@ -414,9 +705,8 @@ class RigModule(MopNode):
         metadata["role"] = "guide"
         guide_name = mop.metadata.name_from_metadata(metadata)
 
-        guide = shapeshifter.create_controller_from_name(shape_type)
         color = mop.config.side_color[self.side.get()]
-        shapeshifter.change_controller_color(guide, color)
+        guide = shapeshifter.create_controller_from_name(shape_type, color)
         guide = cmds.rename(guide, guide_name)
         cmds.setAttr(guide + ".scale", lock=True)
 
@@ -444,10 +734,9 @@ class RigModule(MopNode):
         metadata["role"] = "ctl"
         ctl_name = mop.metadata.name_from_metadata(metadata)
 
-        ctl = shapeshifter.create_controller_from_name(shape_type)
-        ctl = cmds.rename(ctl, ctl_name)
         color = mop.config.side_color[self.side.get()]
-        shapeshifter.change_controller_color(ctl, color)
+        ctl = shapeshifter.create_controller_from_name(shape_type, color)
+        ctl = cmds.rename(ctl, ctl_name)
 
         # get the existing shape data if it exists
         mop.attributes.create_persistent_attribute(
@@ -511,22 +800,29 @@ class RigModule(MopNode):
 
         return non_mirrored_parents
 
-    def update_mirror(self):
+    def update_mirror(self, matrices=None):
+        """Match the fields and guides of this module with its mirror module.
+
+        :param matrices: world matrices of the mirror module's guides,
+            see `mop.dag.world_matrices`.
+        :type matrices: dict
+        """
+        mirror = self.module_mirror
 
         # update all the fields to match the mirror module
-        for field in self.module_mirror.fields:
+        for field in mirror.fields:
             if field.name in ["name", "side"]:
                 continue
             if field.editable:
                 value = None
                 if isinstance(field, ObjectField):
-                    orig_value = getattr(self.module_mirror, field.name).get()
+                    orig_value = getattr(mirror, field.name).get()
                     value = find_mirror_node(orig_value)
                 elif isinstance(field, ObjectListField):
-                    orig_value = getattr(self.module_mirror, field.name).get()
+                    orig_value = getattr(mirror, field.name).get()
                     value = [find_mirror_node(v) for v in orig_value]
                 else:
-                    value = getattr(self.module_mirror, field.name).get()
+                    value = getattr(mirror, field.name).get()
 
                 if value:
                     getattr(self, field.name).set(value)
@@ -534,47 +830,17 @@ class RigModule(MopNode):
         self.update()
 
         # mirror the nodes based on the mirror type
-        mirror_type = self.mirror_type.get()
-        for orig_node, new_node in zip(
-            self.module_mirror.guide_nodes, self.guide_nodes
-        ):
-            if mirror_type.lower() == "behavior":
-                # disable black formatting to keep the matrices 4x4
-                # fmt: off
-                world_reflexion_mat = om2.MMatrix(
-                    [
-                        -1.0, -0.0, -0.0, 0.0,
-                        0.0, 1.0, 0.0, 0.0,
-                        0.0, 0.0, 1.0, 0.0,
-                        0.0, 0.0, 0.0, 1.0,
-                    ]
-                )
-                local_reflexion_mat = om2.MMatrix(
-                    [
-                        -1.0, 0.0, 0.0, 0.0,
-                        0.0, -1.0, 0.0, 0.0,
-                        0.0, 0.0, -1.0, 0.0,
-                        0.0, 0.0, 0.0, 1.0,
-                    ]
-                )
-                # fmt: on
-                orig_node_mat = om2.MMatrix(cmds.getAttr(orig_node + ".worldMatrix"))
-                new_mat = local_reflexion_mat * orig_node_mat * world_reflexion_mat
+        mirror_type = self.mirror_type.get().lower()
+        orig_nodes = mirror.guide_nodes.get()
+        if matrices is None:
+            matrices = mop.dag.world_matrices(orig_nodes)
+        for orig_node, new_node in zip(orig_nodes, self.guide_nodes):
+            orig_node_mat = matrices[orig_node]
+            if mirror_type == "behavior":
+                new_mat = _LOCAL_REFLECTION * orig_node_mat * _WORLD_REFLECTION
                 cmds.xform(new_node, matrix=new_mat, worldSpace=True)
-            if mirror_type.lower() == "orientation":
-                # disable black formatting to keep the matrices 4x4
-                # fmt: off
-                world_reflexion_mat = om2.MMatrix(
-                    [
-                        -1.0, -0.0, -0.0, 0.0,
-                        0.0, 1.0, 0.0, 0.0,
-                        0.0, 0.0, 1.0, 0.0,
-                        0.0, 0.0, 0.0, 1.0,
-                    ]
-                )
-                # fmt: on
-                orig_node_mat = om2.MMatrix(cmds.getAttr(orig_node + ".worldMatrix"))
-                new_mat = orig_node_mat * world_reflexion_mat
+            if mirror_type == "orientation":
+                new_mat = orig_node_mat * _WORLD_REFLECTION
                 cmds.xform(new_node, matrix=new_mat, worldSpace=True)
                 cmds.setAttr(new_node + ".scale", 1, 1, 1)
                 orig_orient = cmds.xform(orig_node, q=True, rotation=True, ws=True)
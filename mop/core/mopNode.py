@@ -2,7 +2,8 @@ import weakref
 
 import maya.cmds as cmds
 
-from mop.core.fields import FieldContainerMeta, BoolField
+from mop.core.fields import FieldContainerMeta, BoolField, IntField
+import mop.core.schema
 import mop.metadata
 
 
@@ -14,6 +15,9 @@ class MopNode(object):
     is_built = BoolField(defaultValue=False)
     is_published = BoolField(defaultValue=False)
 
+    # version of the data stored on the node, see `mop.core.schema`.
+    schema_version = IntField(defaultValue=0)
+
     def __new__(cls, *args, **kwargs):
         if "instances" not in cls.__dict__:
             cls.instances = weakref.WeakSet()
@@ -31,12 +35,25 @@ class MopNode(object):
     def __init__(self, name):
         """Create the node if it doesn't already exist."""
         self.node_name = name
-        if not cmds.objExists(name):
+        exists = cmds.objExists(name)
+        if not exists:
             cmds.createNode("transform", name=name)
 
         for field in self.fields:
             field.ensure_maya_attr(self)
 
+        if not exists:
+            # a new node doesn't need any migration.
+            self.schema_version.set(mop.core.schema.current_version())
+
+    def migrate(self):
+        """Upgrade the node to the current schema version.
+
+        :return: whether any migration ran.
+        :rtype: bool
+        """
+        return mop.core.schema.migrate(self)
+
     def __repr__(self):
         return "%s(%s)" % (self.__class__.__name__, self.node_name)
 
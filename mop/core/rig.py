@@ -10,14 +10,96 @@ import maya.api.OpenMaya as om2
 from mop.core.mopNode import MopNode
 from mop.modules import all_rig_modules
 from mop.config import default_modules
-from mop.core.fields import ObjectField, ObjectListField
-from mop.utils.undo import undoable
-from mop.utils.dg import find_mirror_node
+from mop.core.fields import ObjectField, ObjectListField, cache_fields
+from mop.core.graph import get_graph, invalidate
+from mop.utils.undo import apply_modifier, undoable
+from mop.utils.dg import CatchCreatedNodes, deduplicate_nodes, find_mirror_node
+from mop.utils.profiler import phase
+import mop.config
+import mop.core.schema
 import mop.dag
+import mop.metadata
 from mop.vendor.shapeshifter import shapeshifter
 
 logger = logging.getLogger(__name__)
 
+# version of the files written by `Rig.export_template`.
+TEMPLATE_VERSION = 1
+
+# persistent attributes holding JSON, decoded in the templates.
+_JSON_PERSISTENT_ATTRIBUTES = ("shape_data", "attributes_state", "parent_space_data")
+
+
+def _remap_node_names(value, renames):
+    """Return ``value`` with the names of the nodes of renamed modules updated.
+
+    Lists and dicts are remapped recursively.
+
+    :param renames: new base name and side, by old base name and side.
+    :type renames: dict
+    """
+    if isinstance(value, list):
+        return [_remap_node_names(v, renames) for v in value]
+    if isinstance(value, dict):
+        return value.__class__(
+            (_remap_node_names(k, renames), _remap_node_names(v, renames))
+            for k, v in value.iteritems()
+        )
+    if not isinstance(value, basestring) or not re.match(r"^\w+_\w+_\w+$", value):
+        return value
+    metadata = mop.metadata.metadata_from_name(value)
+    key = (metadata["base_name"], metadata["side"])
+    if renames.get(key, key) == key:
+        return value
+    metadata["base_name"], metadata["side"] = renames[key]
+    return mop.metadata.name_from_metadata(metadata)
+
+
+def _decode_persistent_values(values):
+    """Return ``values`` with the JSON persistent attributes decoded.
+
+    The CVs of the shapes are rounded like the guides of the templates.
+
+    :param values: values by node then attribute name.
+    :type values: dict
+    :rtype: dict
+    """
+    decoded = {}
+    for node, attributes in values.iteritems():
+        node_values = decoded[node] = {}
+        for attr, value in attributes.iteritems():
+            if attr in _JSON_PERSISTENT_ATTRIBUTES and isinstance(value, basestring):
+                value = json.loads(value or "null", object_pairs_hook=OrderedDict)
+                if attr == "shape_data":
+                    for shape in value or []:
+                        shape["cvs"] = [
+                            [round(v, 6) + 0.0 for v in cv] for cv in shape["cvs"]
+                        ]
+            node_values[attr] = value
+    return decoded
+
+
+def _encode_persistent_values(values):
+    """Return ``values`` with the JSON persistent attributes encoded.
+
+    :param values: values by node then attribute name,
+        see `_decode_persistent_values`.
+    :type values: dict
+    :rtype: dict
+    """
+    encoded = {}
+    for node, attributes in values.iteritems():
+        node_values = encoded[node] = {}
+        for attr, value in attributes.iteritems():
+            if attr in _JSON_PERSISTENT_ATTRIBUTES and value is None:
+                value = ""
+            elif attr in _JSON_PERSISTENT_ATTRIBUTES and not isinstance(
+                value, basestring
+            ):
+                value = json.dumps(value)
+            node_values[attr] = value
+    return encoded
+
 
 class Rig(MopNode):
 
@@ -25,6 +107,9 @@ class Rig(MopNode):
     extras_group = ObjectField()
     skeleton_group = ObjectField()
 
+    # objectSet holding all the nodes created during the build.
+    build_nodes_set = ObjectField()
+
     def __init__(self):
         super(Rig, self).__init__("RIG")
 
@@ -34,27 +119,17 @@ class Rig(MopNode):
             self.is_initialized.set(True)
 
     @property
-    def rig_modules(self):
-        modules = []
-        for node in cmds.listRelatives(self.modules_group.get()) or []:
-            module_type = cmds.getAttr(node + ".module_type")
-            module = all_rig_modules[module_type](node, rig=self)
-            modules.append(module)
-
-        sorted_modules = []
-        while modules:
-            module = modules.pop(0)
-            self.sort_parent_module(module, modules, sorted_modules)
+    def module_graph(self):
+        """Cached graph of this rig's modules.
 
-        return sorted_modules
-
-    def sort_parent_module(self, module, modules, sorted_modules):
-        parent_module = module.parent_module
-        if parent_module in modules:
-            modules.remove(parent_module)
-            self.sort_parent_module(parent_module, modules, sorted_modules)
+        See `mop.core.graph` for how the graph is kept up to date.
+        """
+        return get_graph(self)
 
-        sorted_modules.append(module)
+    @property
+    def rig_modules(self):
+        """All the modules of the rig, parents first."""
+        return list(self.module_graph.modules)
 
     @property
     def skeleton(self):
@@ -68,6 +143,11 @@ class Rig(MopNode):
 
     @property
     def build_nodes(self):
+        build_nodes_set = self.build_nodes_set.get()
+        if build_nodes_set:
+            return cmds.sets(build_nodes_set, query=True) or []
+
+        # rigs built before the build nodes set existed tagged their nodes.
         all_nodes = cmds.ls("*")
         build_nodes = []
         for node in all_nodes:
@@ -111,39 +191,51 @@ class Rig(MopNode):
         match = re.match(regex, name)
         raw_name = match.group("raw_name")
 
-        # get the highest index from the modules with the same name and side
-        highest_index = None
-        for mod in self.rig_modules:
-            pattern = "^{}(?P<id>[0-9]*)_{}_mod".format(raw_name, side)
-            regex = re.compile(pattern)
-            match = re.match(regex, mod.node_name)
-            if match:
-                index = match.group("id")
-                index = int(index) if index else 0
-                if index > highest_index:
-                    highest_index = index
-
-        if highest_index is not None:
-            name = raw_name + str(highest_index + 1).zfill(2)
+        new_name = self._new_module_name(name, raw_name, side)
+        if cmds.objExists(self._module_node_name(new_name, side)):
+            # a module was renamed outside of mop, the cached graph is outdated.
+            invalidate()
+            new_name = self._new_module_name(name, raw_name, side)
+        node_name = self._module_node_name(new_name, side)
+        if cmds.objExists(node_name):
+            raise ValueError("A node named {} already exists.".format(node_name))
 
         # update the kwargs in case the values changed
         kwargs["rig"] = self
-        kwargs["name"] = name
+        kwargs["name"] = new_name
         kwargs["side"] = side
         new_module = all_rig_modules[module_type](*args, **kwargs)
+        self.module_graph.add(new_module)
 
         return new_module
 
+    def _new_module_name(self, name, raw_name, side):
+        """Return ``name`` indexed after the modules with the same name and side."""
+        highest_index = self.module_graph.highest_index(raw_name, side)
+        if highest_index is not None:
+            name = raw_name + str(highest_index + 1).zfill(2)
+        return name
+
+    @staticmethod
+    def _module_node_name(name, side):
+        return mop.metadata.name_from_metadata(
+            {"base_name": name, "side": side, "role": "mod"}
+        )
+
     def get_module(self, module_node_name):
         """Get a module instance from a node name.
 
         :param module_node_name: name of the module's node
         :type module_node_name: str
         """
-        for module in self.rig_modules:
-            if module.node_name == module_node_name:
-                return module
-        logger.warning("Found no module named {}.".format(module_node_name))
+        module = self.module_graph.get(module_node_name)
+        if module is None and cmds.objExists(module_node_name):
+            # the module may have been created since the graph was cached.
+            invalidate()
+            module = self.module_graph.get(module_node_name)
+        if module is None:
+            logger.warning("Found no module named {}.".format(module_node_name))
+        return module
 
     @undoable
     def delete_module(self, module_node_name):
@@ -158,105 +250,478 @@ class Rig(MopNode):
 
         module_to_del = self.get_module(module_node_name)
         deform_joints = module_to_del.deform_joints.get()
-        for module in self.rig_modules:
+        for module in self.module_graph.children(module_to_del):
             if module.parent_joint.get() in deform_joints:
                 new_parent_joint = module_to_del.parent_joint.get()
                 module.parent_joint.set(new_parent_joint)
                 module.update()
         cmds.delete(deform_joints)
+        module_set = module_to_del.build_nodes_set.get()
+        if module_set:
+            cmds.delete(module_set)
         cmds.delete(module_to_del.node_name)
+        invalidate()
 
     @undoable
+    @cache_fields
     def build(self):
-        self.fix_object_list_fields()
-        self.deactivate_move_joints_mode()
-        nodes_before_build = set(cmds.ls("*"))
-        for module in self.rig_modules:
-            logger.info("Building: " + module.node_name)
-            module._build()
+        with phase("Rig.build"):
+            modules = self.rig_modules
+            with phase("prepare"):
+                self.migrate_modules(modules)
+                self.deactivate_move_joints_mode(modules)
+            self._build_modules(modules)
 
-            # set the attributes state back to what it was before unbuilding
-            for ctl in module.controllers.get():
-                attributes_state = cmds.getAttr(ctl + ".attributes_state")
-                if attributes_state:
-                    attributes_state = json.loads(attributes_state)
-                    mop.attributes.set_attributes_state(ctl, attributes_state)
+        # make the deform joints selectable
+        cmds.setAttr(self.skeleton_group.get() + ".overrideEnabled", False)
+        cmds.setAttr(self.skeleton_group.get() + ".overrideDisplayType", 0)
+
+        self.is_built.set(True)
+
+    def _build_modules(self, modules):
+        """Build ``modules`` and register the nodes they create.
+
+        :param modules: modules to build, parents first.
+        :type modules: list
+        """
+        build_nodes = OrderedDict()
+        for module in modules:
+            logger.info("Building: " + module.node_name)
+            with CatchCreatedNodes() as module_nodes, phase(
+                module.node_name, module.module_type.get()
+            ):
+                module._build()
+
+                # set the attributes state back to what it was before unbuilding
+                attributes_states = {}
+                for ctl in module.controllers.get():
+                    attributes_state = cmds.getAttr(ctl + ".attributes_state")
+                    if attributes_state:
+                        attributes_states[ctl] = json.loads(attributes_state)
+                mop.attributes.set_attributes_states(attributes_states)
+            build_nodes[module] = module_nodes
             cmds.setAttr(module.guide_group.get() + ".visibility", False)
 
-        nodes_after_build = set(cmds.ls("*"))
-        build_nodes = list(nodes_after_build - nodes_before_build)
+        # parent spaces are restored once every module is built
+        # as they can be driven by controls of any module.
+        with phase("parent spaces", "parent spaces"):
+            spaces = OrderedDict(
+                (module, self._module_parent_spaces(module)) for module in modules
+            )
+            # query all the world matrices at once, creating the spaces
+            # keeps the controls and their drivers in place.
+            nodes = []
+            for module_spaces in spaces.itervalues():
+                for ctl, (space_type, drivers) in module_spaces.iteritems():
+                    nodes.append(ctl)
+                    if hasattr(drivers, "values"):
+                        drivers = drivers.values()
+                    nodes.extend(drivers)
+            matrices = mop.dag.world_matrices(nodes)
+            space_nodes = 0
+            for module, module_spaces in spaces.iteritems():
+                with CatchCreatedNodes() as ps_nodes:
+                    for ctl, (space_type, drivers) in module_spaces.iteritems():
+                        mop.dag.create_space_switching(
+                            ctl, drivers, space_type, matrices
+                        )
+                build_nodes[module].extend(ps_nodes)
+                space_nodes += len(ps_nodes)
+            self._log_space_groups(spaces, space_nodes)
 
-        for module in self.rig_modules:
-            for ctl in module.controllers.get():
-                parent_spaces = cmds.getAttr(ctl + ".parent_space_data")
-                if not parent_spaces:
-                    continue
+        if mop.config.deduplicate_build_nodes:
+            with phase("deduplicate nodes", "deduplicate nodes"):
+                self._deduplicate_build_nodes(build_nodes)
 
-                # Restore parent spaces.
-                # We use an OrderedDict to load saved data
-                # in order to preserve the parents ordering.
-                spaces = json.loads(parent_spaces, object_pairs_hook=OrderedDict)
-                if not hasattr(spaces, "get"):
-                    # In case serialized data is bad or serialization
-                    # changes along the way.
-                    continue
+        with phase("tag nodes for unbuild", "tag nodes for unbuild"):
+            for module, module_nodes in build_nodes.iteritems():
+                self._tag_nodes_for_unbuild(module_nodes, module)
+                # the persistent attributes backups only exist once built.
+                module.build_hash.set(module.compute_build_hash())
 
-                # TODO: Allow multiple types of spaces at the same type
-                parents = spaces.get("parent", [])
-                orients = spaces.get("orient", [])
-                points = spaces.get("point", [])
-                if parents:
-                    mop.dag.create_space_switching(ctl, parents, "parent")
-                elif orients:
-                    mop.dag.create_space_switching(ctl, orients, "orient")
-                elif points:
-                    mop.dag.create_space_switching(ctl, points, "point")
+    @staticmethod
+    def _deduplicate_build_nodes(build_nodes):
+        """Merge the duplicated utility nodes of every module.
 
-        self._tag_nodes_for_unbuild(build_nodes)
+        Nodes are only merged with nodes of the same module,
+        so each module can still be unbuilt on its own.
 
-        # make the deform joints selectable
-        cmds.setAttr(self.skeleton_group.get() + ".overrideEnabled", False)
-        cmds.setAttr(self.skeleton_group.get() + ".overrideDisplayType", 0)
+        :param build_nodes: nodes created by each module.
+        :type build_nodes: dict
+        :return: number of deleted nodes.
+        :rtype: int
+        """
+        count = 0
+        for module_nodes in build_nodes.itervalues():
+            duplicates = set(deduplicate_nodes(module_nodes))
+            module_nodes[:] = [n for n in module_nodes if n not in duplicates]
+            count += len(duplicates)
+        logger.info("Removed {} duplicated nodes.".format(count))
+        return count
 
-        self.is_built.set(True)
+    @staticmethod
+    def _log_space_groups(spaces, space_nodes):
+        """Log how many controls share the same space drivers.
+
+        The driver selection can't be shared between these controls as
+        each one switches with its own ``space`` attribute, and a choice
+        node only has a single selector.
+
+        :param spaces: parent spaces of every module,
+            see `_module_parent_spaces`.
+        :type spaces: dict
+        :param space_nodes: number of nodes created for the spaces.
+        :type space_nodes: int
+        """
+        groups = OrderedDict()
+        for module_spaces in spaces.itervalues():
+            for ctl, (space_type, drivers) in module_spaces.iteritems():
+                if hasattr(drivers, "values"):
+                    drivers = drivers.values()
+                groups.setdefault((space_type, tuple(drivers)), []).append(ctl)
+        controls = sum(len(ctls) for ctls in groups.itervalues())
+        if not controls:
+            return
+        logger.info(
+            "{} spaces with {} distinct driver sets, {} nodes.".format(
+                controls, len(groups), space_nodes
+            )
+        )
+        for (space_type, drivers), ctls in groups.iteritems():
+            if len(ctls) > 1:
+                logger.debug(
+                    "{} {} spaces driven by {}.".format(
+                        len(ctls), space_type, ", ".join(drivers)
+                    )
+                )
+
+    def _module_parent_spaces(self, module):
+        """Return the type and drivers of the parent space of every control.
+
+        :rtype: OrderedDict
+        """
+        module_spaces = OrderedDict()
+        for ctl in module.controllers.get():
+            spaces = self._parent_spaces(ctl)
+
+            # TODO: Allow multiple types of spaces at the same type
+            for space_type in ("parent", "orient", "point"):
+                drivers = spaces.get(space_type, [])
+                if drivers:
+                    module_spaces[ctl] = (space_type, drivers)
+                    break
+        return module_spaces
+
+    @staticmethod
+    def _parent_spaces(ctl):
+        """Return the parent spaces saved on ``ctl``."""
+        parent_spaces = cmds.getAttr(ctl + ".parent_space_data")
+        if not parent_spaces:
+            return {}
+
+        # We use an OrderedDict to load saved data
+        # in order to preserve the parents ordering.
+        spaces = json.loads(parent_spaces, object_pairs_hook=OrderedDict)
+        if not hasattr(spaces, "get"):
+            # In case serialized data is bad or serialization
+            # changes along the way.
+            return {}
+        return spaces
 
     @undoable
+    @cache_fields
     def unbuild(self):
         self.reset_pose()
+        self._unbuild_modules(self.rig_modules, self.skeleton, self.build_nodes)
 
-        for module in self.rig_modules:
-            for ctl in module.controllers.get():
-                try:
-                    shape_data = shapeshifter.get_shape_data(ctl)
+        # make the deform joints unselectable
+        cmds.setAttr(self.skeleton_group.get() + ".overrideEnabled", True)
+        cmds.setAttr(self.skeleton_group.get() + ".overrideDisplayType", 2)
+        self.activate_move_joints_mode()
+        self.is_built.set(False)
+
+    def _unbuild_modules(self, modules, joints, build_nodes):
+        """Delete the build of ``modules`` and constraint them back to their guides.
+
+        :param modules: modules to unbuild.
+        :type modules: list
+        :param joints: deform joints driven by the modules.
+        :type joints: list
+        :param build_nodes: nodes created when building the modules.
+        :type build_nodes: list
+        """
+        for module in modules:
+            controllers = module.controllers.get()
+            shapes_data = shapeshifter.get_shapes_data(controllers, strict=False)
+            attributes_states = mop.attributes.get_attributes_states(controllers)
+            for ctl in controllers:
+                if ctl in shapes_data:
                     cmds.setAttr(
-                        ctl + ".shape_data", json.dumps(shape_data), type="string"
+                        ctl + ".shape_data",
+                        json.dumps(shapes_data[ctl]),
+                        type="string",
                     )
-                except:
-                    pass
-                attributes_state = mop.attributes.get_attributes_state(ctl)
                 cmds.setAttr(
                     ctl + ".attributes_state",
-                    json.dumps(attributes_state),
+                    json.dumps(attributes_states[ctl]),
                     type="string",
                 )
+            module.save_persistent_attributes()
             cmds.setAttr(module.guide_group.get() + ".visibility", True)
 
-        for node in self.skeleton:
+        for node in joints:
             for attribute in [".translate", ".rotate", ".scale"]:
                 attr = node + attribute
                 input_attr = cmds.connectionInfo(attr, sourceFromDestination=True)
                 if input_attr:
                     cmds.disconnectAttr(input_attr, attr)
-        cmds.delete(self.build_nodes)
-        for module in self.rig_modules:
+            # driven by the "offsetParentMatrix" constraint mode.
+            attr = node + ".offsetParentMatrix"
+            if not cmds.objExists(attr):
+                continue
+            input_attr = cmds.connectionInfo(attr, sourceFromDestination=True)
+            if input_attr:
+                cmds.disconnectAttr(input_attr, attr)
+                cmds.setAttr(attr, list(om2.MMatrix()), type="matrix")
+        if build_nodes:
+            cmds.delete(build_nodes)
+        for module in modules:
             module._constraint_deforms_to_guides()
             module.is_built.set(False)
 
-        # make the deform joints unselectable
-        cmds.setAttr(self.skeleton_group.get() + ".overrideEnabled", True)
-        cmds.setAttr(self.skeleton_group.get() + ".overrideDisplayType", 2)
-        self.activate_move_joints_mode()
-        self.is_built.set(False)
+    @undoable
+    @cache_fields
+    def rebuild(self, incremental=True):
+        """Unbuild and build the rig again.
+
+        When ``incremental`` is True, only the modules that changed since
+        they were built are rebuilt, along with the modules depending on them.
+        Fields edited while the rig is built are applied to these modules.
+
+        :param incremental: only rebuild the modules that changed.
+        :type incremental: bool
+        :return: the rebuilt modules.
+        :rtype: list
+        """
+        if not self.is_built.get():
+            self.build()
+            return self.rig_modules
+
+        all_modules = self.rig_modules
+        if not incremental or not all(m.build_hash.get() for m in all_modules):
+            # modules built before the hashes existed can't be rebuilt alone.
+            self.unbuild()
+            self.build()
+            return self.rig_modules
+
+        # the hashes and the rebuilt modules must not depend on the pose.
+        self.reset_pose()
+        modules = self.dirty_modules()
+        if not modules:
+            logger.info("No module changed since the last build.")
+            return []
+
+        logger.info(
+            "Rebuilding {} of {} modules.".format(len(modules), len(all_modules))
+        )
+        joints = [j for m in modules for j in m.deform_joints.get()]
+        build_nodes = [n for m in modules for n in m.build_nodes]
+        self._unbuild_modules(modules, joints, build_nodes)
+        self.activate_move_joints_mode(modules)
+
+        # apply the changes made to the fields while the modules were built.
+        for module in modules:
+            module.update()
+
+        to_build = set(modules)
+        modules = [m for m in self.rig_modules if m in to_build]
+        self.migrate_modules(modules)
+        self.deactivate_move_joints_mode(modules)
+        self._build_modules(modules)
+        return modules
+
+    def dirty_modules(self):
+        """Return the modules to rebuild, in build order.
+
+        A module is dirty if its build hash changed since it was built.
+        The children of a dirty module and the modules with a parent space
+        driven by one of its build nodes are dirty as well.
+        """
+        graph = self.module_graph
+        dirty = set(
+            m
+            for m in graph
+            if not m.is_built.get() or m.build_hash.get() != m.compute_build_hash()
+        )
+
+        spaces_drivers = {}
+        for module in graph:
+            drivers = set()
+            for ctl in module.controllers.get():
+                for space_drivers in self._parent_spaces(ctl).values():
+                    if hasattr(space_drivers, "values"):
+                        space_drivers = space_drivers.values()
+                    drivers.update(space_drivers)
+            if drivers:
+                spaces_drivers[module] = drivers
+
+        to_visit = list(dirty)
+        while to_visit:
+            module = to_visit.pop()
+            dependents = graph.descendants(module)
+            build_nodes = set(module.build_nodes)
+            for other, drivers in spaces_drivers.iteritems():
+                if drivers & build_nodes:
+                    dependents.append(other)
+            for dependent in dependents:
+                if dependent not in dirty:
+                    dirty.add(dependent)
+                    to_visit.append(dependent)
+
+        return [m for m in graph if m in dirty]
+
+    @cache_fields
+    def export_template(self, path):
+        """Write the modules of the rig to a template file.
+
+        The file starts with a header line, followed by one JSON line
+        per module, parents first. It can be read one module at a time
+        by `import_template` and diffed as text.
+
+        :param path: path of the template file.
+        :type path: str
+        """
+        modules = self.rig_modules
+        matrices = mop.dag.world_matrices(
+            [guide for module in modules for guide in module.guide_nodes.get()]
+        )
+        header = {"format": "mop_template", "version": TEMPLATE_VERSION}
+        with open(path, "w") as f:
+            f.write(json.dumps(header, sort_keys=True) + "\n")
+            for module in modules:
+                data = self._module_template(module, matrices)
+                f.write(json.dumps(data, sort_keys=True, separators=(",", ":")))
+                f.write("\n")
+
+    @staticmethod
+    def _module_template(module, matrices):
+        fields = {}
+        for field in module.fields:
+            if field.editable and field.name not in ["name", "side"]:
+                fields[field.name] = getattr(module, field.name).get()
+        return {
+            "node": module.node_name,
+            "type": module.module_type.get(),
+            "name": module.name.get(),
+            "side": module.side.get(),
+            "mirror": module._module_mirror.get(),
+            "fields": fields,
+            "guides": [
+                [round(v, 6) + 0.0 for v in matrices[guide]]
+                for guide in module.guide_nodes.get()
+            ],
+            "persistent_attributes": _decode_persistent_values(
+                module.get_persistent_values()
+            ),
+        }
+
+    @undoable
+    def import_template(self, path):
+        """Create the modules of a template file written by `export_template`.
+
+        A module with the same node and type as a template module is
+        updated instead of being created, like the default modules.
+        The nodes of the modules created with another name are renamed
+        in the parent joints, fields and parent spaces of the template.
+
+        :param path: path of the template file.
+        :type path: str
+        :return: the created or updated modules, parents first.
+        :rtype: list
+        """
+        if self.is_built.get():
+            raise RuntimeError("Cannot import a template when the rig is built.")
+
+        renames = {}
+        mirrors = OrderedDict()
+        modules = []
+        with open(path) as f:
+            header = json.loads(next(f))
+            if header.get("format") != "mop_template":
+                raise ValueError("{} is not a rig template".format(path))
+            if header.get("version", 0) > TEMPLATE_VERSION:
+                raise ValueError(
+                    "Unsupported version {} of the rig template {}".format(
+                        header.get("version"), path
+                    )
+                )
+            for line in f:
+                if not line.strip():
+                    continue
+                data = json.loads(line, object_pairs_hook=OrderedDict)
+                module = self._import_module_template(data, renames)
+                if data.get("mirror"):
+                    mirrors[module] = data["mirror"]
+                modules.append(module)
+
+        for module, mirror in mirrors.iteritems():
+            mirror = _remap_node_names(mirror, renames)
+            if cmds.objExists(mirror):
+                module.module_mirror = mirror
+        return modules
+
+    def _import_module_template(self, data, renames):
+        """Create or update the module of a template line.
+
+        :param renames: renamed modules of the template, updated in place.
+        :type renames: dict
+        :rtype: RigModule
+        """
+        fields = _remap_node_names(data["fields"], renames)
+        module = self.module_graph.get(data["node"])
+        if module is None or module.module_type.get() != data["type"]:
+            module = self.add_module(
+                data["type"],
+                name=data["name"],
+                side=data["side"],
+                parent_joint=fields.get("parent_joint"),
+            )
+        old_metadata = mop.metadata.metadata_from_name(data["node"])
+        new_metadata = mop.metadata.metadata_from_name(module.node_name)
+        renames[(old_metadata["base_name"], old_metadata["side"])] = (
+            new_metadata["base_name"],
+            new_metadata["side"],
+        )
+
+        changed = False
+        for field_name, value in fields.iteritems():
+            field = next((f for f in module.fields if f.name == field_name), None)
+            if field is None or not field.editable:
+                logger.warning(
+                    "{} has no editable field {}".format(module.node_name, field_name)
+                )
+                continue
+            attribute = getattr(module, field_name)
+            if attribute.get() == value:
+                continue
+            try:
+                attribute.set(value)
+            except ValueError as e:
+                logger.warning(
+                    "Cannot set {}.{}: {}".format(module.node_name, field_name, e)
+                )
+            else:
+                changed = True
+        if changed:
+            module.update()
+
+        mop.dag.set_world_matrices(dict(zip(module.guide_nodes.get(), data["guides"])))
+
+        values = _remap_node_names(data.get("persistent_attributes", {}), renames)
+        values = _encode_persistent_values(values)
+        if values:
+            module.persistent_attributes.set(values)
+        return module
 
     def publish(self):
         cmds.setAttr(self.skeleton_group.get() + ".visibility", False)
@@ -264,21 +729,32 @@ class Rig(MopNode):
             logger.info("Publishing: " + module.node_name)
             module.publish()
 
-    @staticmethod
     @undoable
-    def reset_pose():
-        for control in cmds.ls("*_ctl"):
-            mop.dag.reset_node(control)
+    def reset_pose(self):
+        """Reset the controllers of every module to their default values."""
+        mop.dag.reset_nodes([c for m in self.rig_modules for c in m.controllers.get()])
 
-    def _tag_nodes_for_unbuild(self, nodes):
-        """Tag the nodes created during the build.
+    def _tag_nodes_for_unbuild(self, nodes, module=None):
+        """Register the nodes created during the build.
 
-        this will allow to delete them easily later on.
+        They are all added to the build nodes set in one go
+        so they can be deleted easily later on.
+        When a module is specified, the nodes are added to its own set too
+        so the module can be unbuilt on its own.
         """
-        for node in nodes:
-            cmds.addAttr(
-                node, longName="is_build_node", attributeType="bool", defaultValue=True
-            )
+        build_nodes_set = self.build_nodes_set.get()
+        if not build_nodes_set:
+            build_nodes_set = cmds.sets(empty=True, name="BUILD_NODES")
+            self.build_nodes_set.set(build_nodes_set)
+        if not nodes:
+            return
+        cmds.sets(nodes, add=build_nodes_set)
+        if module is not None:
+            module_set = module.build_nodes_set.get()
+            if not module_set:
+                module_set = module.add_node("objectSet", role="buildNodes")
+                module.build_nodes_set.set(module_set)
+            cmds.sets(nodes, add=module_set)
 
     def mirror_module(self, module):
         """Mirrors the specified rig module."""
@@ -299,104 +775,282 @@ class Rig(MopNode):
                 self.mirror_module(parent)
 
         new_side = "R" if orig_side == "L" else "L"
-        orig_name = module.name.get()
-        orig_type = module.module_type.get()
+        new_module = self._add_mirror_module(module, new_side)
+        new_module.update_mirror()
 
+        return new_module
+
+    @undoable
+    def mirror_side(self, side="L"):
+        """Mirror all the modules of ``side`` that aren't mirrored yet.
+
+        The mirror modules are created parents first and their guides
+        are placed from a single read of the world matrices.
+
+        :param side: side to mirror, "L" or "R".
+        :type side: str
+        :return: the new modules, parents first.
+        :rtype: list
+        """
+        if side not in ("L", "R"):
+            raise ValueError("Cannot mirror the side {}".format(side))
+        new_side = "R" if side == "L" else "L"
+
+        modules = [
+            m
+            for m in self.rig_modules
+            if m.side.get() == side and not m.is_mirrored
+        ]
+        matrices = mop.dag.world_matrices(
+            [guide for module in modules for guide in module.guide_nodes.get()]
+        )
+
+        # joints of the other side, including the ones of the new modules.
+        other_side_joints = set(
+            joint
+            for module in self.rig_modules
+            if module.side.get() != side
+            for joint in module.deform_joints.get()
+        )
+
+        new_modules = []
+        for module in modules:
+            new_module = self._add_mirror_module(module, new_side, other_side_joints)
+            new_module.update_mirror(matrices)
+            other_side_joints.update(new_module.deform_joints.get())
+            new_modules.append(new_module)
+        return new_modules
+
+    def _add_mirror_module(self, module, new_side, joints=None):
+        """Add the mirror module of ``module`` on ``new_side``.
+
+        :param joints: existing joints the mirror parent joint is looked up in,
+            look it up in the scene if None.
+        :type joints: set
+        :rtype: RigModule
+        """
         orig_parent_joint = module.parent_joint.get()
         metadata = mop.metadata.metadata_from_name(orig_parent_joint)
         metadata["side"] = new_side
         new_parent_joint = mop.metadata.name_from_metadata(metadata)
-        if not cmds.objExists(new_parent_joint):
+        if joints is None:
+            parent_joint_exists = cmds.objExists(new_parent_joint)
+        else:
+            parent_joint_exists = new_parent_joint in joints
+        if not parent_joint_exists:
             new_parent_joint = orig_parent_joint
 
         new_module = self.add_module(
-            orig_type, name=orig_name, side=new_side, parent_joint=new_parent_joint
+            module.module_type.get(),
+            name=module.name.get(),
+            side=new_side,
+            parent_joint=new_parent_joint,
         )
 
         module.module_mirror = new_module.node_name
         new_module.module_mirror = module.node_name
-
-        new_module.update_mirror()
-
         return new_module
 
     @undoable
     def duplicate_module(self, module):
         """Duplicate the specified rig module"""
-        module_type = module.module_type.get()
-        name = module.name.get()
-        side = module.side.get()
-        new_module = module.rig.add_module(
-            module_type, name=name, side=side, parent_joint=module.parent_joint.get()
-        )
-        for field in module.fields:
-            if field.name in ["name", "side"]:
-                continue
-            if field.editable:
-                value = getattr(module, field.name).get()
-                getattr(new_module, field.name).set(value)
-        new_module.update()
+        mapping = self.duplicate_modules(module)
+        return self.get_module(mapping[module.node_name])
+
+    @undoable
+    def duplicate_modules(self, module, children=False):
+        """Duplicate ``module`` and optionally all the modules below it.
+
+        The duplicated modules below ``module`` are parented to the new joints,
+        and the fields pointing to duplicated nodes point to their copies.
+
+        :param module: module to duplicate.
+        :type module: RigModule
+        :param children: duplicate the child modules too.
+        :type children: bool
+        :return: the new module, guide and deform joint of each original one,
+            by original node.
+        :rtype: OrderedDict
+        """
+        modules = [module]
+        if children:
+            modules.extend(self.module_graph.descendants(module))
+
+        mapping = OrderedDict()
+        for orig_module in modules:
+            new_module = self.add_module(
+                orig_module.module_type.get(),
+                name=orig_module.name.get(),
+                side=orig_module.side.get(),
+                parent_joint=self._mapped_value(
+                    orig_module.parent_joint.get(), mapping
+                ),
+            )
+            for field in orig_module.fields:
+                if field.name in ["name", "side"] or not field.editable:
+                    continue
+                value = self._mapped_value(
+                    getattr(orig_module, field.name).get(), mapping
+                )
+                attribute = getattr(new_module, field.name)
+                if attribute.get() != value:
+                    attribute.set(value)
+            new_module.update()
+
+            orig_guides = orig_module.guide_nodes.get()
+            new_guides = new_module.guide_nodes.get()
+            self._copy_local_transforms(orig_guides, new_guides)
+
+            mapping[orig_module.node_name] = new_module.node_name
+            mapping.update(zip(orig_guides, new_guides))
+            mapping.update(
+                zip(orig_module.deform_joints.get(), new_module.deform_joints.get())
+            )
+        return mapping
+
+    @staticmethod
+    def _mapped_value(value, mapping):
+        if isinstance(value, list):
+            return [mapping.get(v, v) for v in value]
+        if isinstance(value, basestring):
+            return mapping.get(value, value)
+        return value
 
-        for orig_node, new_node in zip(module.guide_nodes, new_module.guide_nodes):
+    @staticmethod
+    def _copy_local_transforms(orig_nodes, new_nodes):
+        """Copy the translate and rotate of ``orig_nodes`` to ``new_nodes``.
+
+        All the values are set by a single undoable modifier,
+        the locked and connected attributes are left untouched.
+        """
+        modifier = om2.MDGModifier()
+        has_values = False
+        for orig_node, new_node in zip(orig_nodes, new_nodes):
+            sel = om2.MSelectionList()
+            sel.add(orig_node)
+            sel.add(new_node)
+            orig_fn = om2.MFnDependencyNode(sel.getDependNode(0))
+            new_fn = om2.MFnDependencyNode(sel.getDependNode(1))
             for attr in ["translate", "rotate"]:
                 for axis in "XYZ":
                     attr_name = attr + axis
-                    if not cmds.attributeQuery(attr_name, node=orig_node, exists=True):
+                    if not orig_fn.hasAttribute(attr_name):
                         continue
-                    value = cmds.getAttr(orig_node + "." + attr_name)
-                    cmds.setAttr(new_node + "." + attr_name, value)
-        return new_module
-
-    def activate_move_joints_mode(self):
-        for module in self.rig_modules:
-            for joint in module.deform_joints:
-                plugs = cmds.listConnections(
-                    joint + ".worldMatrix[0]", type="skinCluster", plugs=True
-                )
-                if not plugs:
+                    # both plugs are in internal units.
+                    value = orig_fn.findPlug(attr_name, False).asDouble()
+                    plug = new_fn.findPlug(attr_name, False)
+                    if plug.isLocked or plug.isDestination:
+                        continue
+                    if plug.asDouble() != value:
+                        modifier.newPlugValueDouble(plug, value)
+                        has_values = True
+        if has_values:
+            apply_modifier(modifier)
+
+    def activate_move_joints_mode(self, modules=None):
+        if modules is None:
+            modules = self.rig_modules
+        joints = [j for module in modules for j in module.deform_joints.get()]
+        modifier = om2.MDGModifier()
+        connected = False
+        for joint_obj, bind_pre_matrix in self._skin_cluster_influences(joints):
+            if bind_pre_matrix.isDestination:
+                continue
+            world_inverse_matrix = self._world_inverse_matrix_plug(joint_obj)
+            modifier.connect(world_inverse_matrix, bind_pre_matrix)
+            connected = True
+        if connected:
+            apply_modifier(modifier)
+
+    def deactivate_move_joints_mode(self, modules=None):
+        if modules is None:
+            modules = self.rig_modules
+        joints = [j for module in modules for j in module.deform_joints.get()]
+        modifier = om2.MDGModifier()
+        moved_joints = []
+        for joint_obj, bind_pre_matrix in self._skin_cluster_influences(joints):
+            world_inverse_matrix = self._world_inverse_matrix_plug(joint_obj)
+            if bind_pre_matrix.source() != world_inverse_matrix:
+                continue
+            modifier.disconnect(world_inverse_matrix, bind_pre_matrix)
+            matrix = om2.MDagPath.getAPathTo(joint_obj).inclusiveMatrix().inverse()
+            modifier.newPlugValue(bind_pre_matrix, om2.MFnMatrixData().create(matrix))
+            if joint_obj not in moved_joints:
+                moved_joints.append(joint_obj)
+        if not moved_joints:
+            return
+        apply_modifier(modifier)
+
+        # reset each bind pose once with all of its moved joints.
+        bind_poses = OrderedDict()
+        for joint_obj in moved_joints:
+            fn = om2.MFnDependencyNode(joint_obj)
+            for destination in fn.findPlug("message", False).destinations():
+                pose = om2.MFnDependencyNode(destination.node())
+                if pose.typeName != "dagPose":
                     continue
-                for plug in plugs:
-                    regex = re.match("(.*)\.matrix\[([0-9]*)\]", plug)
-                    node, index = regex.groups()
-                    cmds.connectAttr(
-                        joint + ".worldInverseMatrix[0]",
-                        node + ".bindPreMatrix[{}]".format(index),
-                    )
+                if not pose.findPlug("bindPose", False).asBool():
+                    continue
+                bind_poses.setdefault(pose.name(), []).append(fn.name())
+        for bind_pose, pose_joints in bind_poses.iteritems():
+            cmds.dagPose(pose_joints, reset=True, name=bind_pose)
 
-    def deactivate_move_joints_mode(self):
-        for module in self.rig_modules:
-            for joint in module.deform_joints:
-                plugs = cmds.listConnections(
-                    joint + ".worldInverseMatrix[0]", type="skinCluster", plugs=True
-                )
-                if not plugs:
+    @staticmethod
+    def _skin_cluster_influences(joints):
+        """Return the skinCluster influences driven by ``joints``.
+
+        The ``matrix`` array of every skinCluster is read once.
+
+        :param joints: joints to find the influences of.
+        :type joints: list
+        :return: the joint and the ``bindPreMatrix`` plug of each influence.
+        :rtype: list
+        """
+        skin_clusters = cmds.ls(type="skinCluster")
+        if not skin_clusters or not joints:
+            return []
+        joints = set(joints)
+        sel = om2.MSelectionList()
+        for skin_cluster in skin_clusters:
+            sel.add(skin_cluster)
+
+        influences = []
+        for i in range(sel.length()):
+            fn = om2.MFnDependencyNode(sel.getDependNode(i))
+            matrix = fn.findPlug("matrix", False)
+            bind_pre_matrix = fn.findPlug("bindPreMatrix", False)
+            for index in matrix.getExistingArrayAttributeIndices():
+                source = matrix.elementByLogicalIndex(index).source()
+                if source.isNull:
                     continue
-                for plug in plugs:
-                    regex = re.match("(.*)\.bindPreMatrix\[([0-9]*)\]", plug)
-                    node, index = regex.groups()
-                    cmds.disconnectAttr(
-                        joint + ".worldInverseMatrix[0]",
-                        node + ".bindPreMatrix[{}]".format(index),
-                    )
-                    mat = cmds.getAttr(joint + ".worldInverseMatrix[0]")
-                    cmds.setAttr(
-                        node + ".bindPreMatrix[{}]".format(index), mat, type="matrix"
-                    )
+                joint_obj = source.node()
+                if om2.MFnDependencyNode(joint_obj).name() not in joints:
+                    continue
+                influences.append(
+                    (joint_obj, bind_pre_matrix.elementByLogicalIndex(index))
+                )
+        return influences
 
-                bind_poses = cmds.dagPose(joint, bindPose=True, q=True)
-                for bind_pose in bind_poses:
-                    cmds.dagPose(joint, reset=True, n=bind_pose)
+    @staticmethod
+    def _world_inverse_matrix_plug(joint_obj):
+        plug = om2.MFnDependencyNode(joint_obj).findPlug("worldInverseMatrix", False)
+        return plug.elementByLogicalIndex(0)
 
-    def fix_object_list_fields(self):
-        for module in self.rig_modules:
-            for field in module.fields:
-                if field.__class__.__name__ == 'ObjectListField':
-                    values = getattr(module, field.name).get()
-                    cmds.deleteAttr(module.node_name, attribute=field.name)
-                    cmds.addAttr(module.node_name, longName=field.name, attributeType='message', multi=True)
-                    for i, val in enumerate(values):
-                        cmds.connectAttr(
-                            val + '.message',
-                            '{}.{}[{}]'.format(module.node_name, field.name, i)
-                        )
+    def migrate_modules(self, modules=None):
+        """Upgrade the rig and ``modules`` to the current schema version.
+
+        Only the schema version of the nodes is checked
+        once they are up to date.
+        """
+        if modules is None:
+            modules = self.rig_modules
+        self.migrate()
+        for module in modules:
+            module.migrate()
+
+    def fix_object_list_fields(self, modules=None):
+        if modules is None:
+            modules = self.rig_modules
+        for module in modules:
+            mop.core.schema.fix_object_list_fields(module)
 
@@ -0,0 +1,82 @@
+"""Versioning of the data stored on the `MopNode`.
+
+Every `MopNode` is stamped with the schema version it was created or last
+migrated with. The migrations registered here upgrade an older node to the
+current version, they only run once per node.
+"""
+import logging
+
+import maya.cmds as cmds
+
+logger = logging.getLogger(__name__)
+
+# functions upgrading a node to a schema version, by version.
+_migrations = {}
+
+
+def migration(version):
+    """Register the decorated function as the migration to ``version``.
+
+    The function receives the `MopNode` to migrate.
+
+    :param version: schema version the function upgrades to.
+    :type version: int
+    """
+
+    def decorator(func):
+        if version in _migrations:
+            raise ValueError(
+                "A migration to version {} is already registered".format(version)
+            )
+        _migrations[version] = func
+        return func
+
+    return decorator
+
+
+def current_version():
+    """Return the schema version of the newly created nodes."""
+    return max(_migrations) if _migrations else 0
+
+
+def migrate(node):
+    """Run the migrations ``node`` is missing and stamp it with the current version.
+
+    :param node: node to migrate.
+    :type node: MopNode
+    :return: whether any migration ran.
+    :rtype: bool
+    """
+    version = node.schema_version.get()
+    latest = current_version()
+    if version >= latest:
+        return False
+    for next_version in range(version + 1, latest + 1):
+        logger.debug(
+            "Migrating {} to schema version {}".format(node.node_name, next_version)
+        )
+        _migrations[next_version](node)
+    node.schema_version.set(latest)
+    return True
+
+
+@migration(1)
+def fix_object_list_fields(node):
+    """Recreate the `ObjectListField` attributes of ``node`` as message multis.
+
+    The attributes are reconnected without any gap between the indices.
+    """
+    for field in node.fields:
+        if field.__class__.__name__ != "ObjectListField":
+            continue
+        attribute = getattr(node, field.name)
+        values = attribute.get()
+        cmds.deleteAttr(node.node_name, attribute=field.name)
+        cmds.addAttr(
+            node.node_name, longName=field.name, attributeType="message", multi=True
+        )
+        for i, val in enumerate(values):
+            cmds.connectAttr(
+                val + ".message", "{}.{}[{}]".format(node.node_name, field.name, i)
+            )
+        attribute.invalidate(plug=True)
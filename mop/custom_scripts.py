@@ -5,6 +5,8 @@ import os
 import config
 import maya.cmds as cmds
 
+from mop.utils.profiler import phase
+
 logger = logging.getLogger(__name__)
 
 
@@ -44,7 +46,8 @@ def run_scripts_from_path(scripts_path):
                 or asset_type in mod.__dict__.get("target_asset_type", [])
             ):
                 logger.info("Running script: {}".format(module_name))
-                mod.run()
+                with phase(module_name, "custom scripts"):
+                    mod.run()
 
 
 def get_scripts_dir(level="asset"):
@@ -1,6 +1,152 @@
 import maya.cmds as cmds
+import maya.api.OpenMaya as om2
+
+import mop.attributes
+import mop.config
 import mop.metadata
 import mop.utils.dg as _dgutils
+import mop.utils.undo
+
+# ways `matrix_constraint` can build a constraint, see `mop.config.constraint_mode`.
+CONSTRAINT_MODES = ("decompose", "offsetParentMatrix")
+
+# plugs reset by `reset_nodes` along with their default value, by node name.
+_reset_plugs = {}
+
+# how the values of the attribute types are set, see `mop.attributes.set_plug_value`.
+_attribute_type_units = {
+    "doubleAngle": "angle",
+    "doubleLinear": "distance",
+    "bool": "bool",
+    "enum": "int",
+    "long": "int",
+    "short": "int",
+    "byte": "int",
+    "char": "int",
+}
+
+
+def world_matrices(nodes):
+    """Return the world matrices of ``nodes`` without evaluating any utility node.
+
+    Pass the result to the functions taking a ``matrices`` argument
+    to reuse them across many calls.
+
+    :param nodes: dag nodes to get the world matrix of.
+    :type nodes: list
+    :rtype: dict
+    """
+    matrices = {}
+    for node in nodes:
+        if node not in matrices:
+            sel = om2.MSelectionList()
+            sel.add(node)
+            matrices[node] = sel.getDagPath(0).inclusiveMatrix()
+    return matrices
+
+
+def _world_matrix(node, matrices=None):
+    if matrices and node in matrices:
+        return matrices[node]
+    return world_matrices([node])[node]
+
+
+def offset_matrix(driven, driver, matrices=None):
+    """Return the world matrix of ``driven`` relative to ``driver``.
+
+    :param matrices: world matrices to reuse, see `world_matrices`.
+    :type matrices: dict
+    :rtype: list
+    """
+    driven_mat = _world_matrix(driven, matrices)
+    driver_mat = _world_matrix(driver, matrices)
+    return list(driven_mat * driver_mat.inverse())
+
+
+def set_world_matrices(matrices):
+    """Move each node to its world matrix of ``matrices`` in a single undo step.
+
+    The translate, rotate and scale are set by one modifier,
+    the locked and connected attributes are left untouched.
+    Children follow the matrices given to their parents.
+
+    :param matrices: world matrices by dag node.
+    :type matrices: dict
+    """
+    modifier = om2.MDGModifier()
+    has_values = False
+    paths = {}
+    for node, matrix in matrices.iteritems():
+        sel = om2.MSelectionList()
+        sel.add(node)
+        dag_path = sel.getDagPath(0)
+        paths[dag_path.fullPathName()] = (dag_path, om2.MMatrix(matrix))
+
+    for full_path, (dag_path, matrix) in paths.iteritems():
+        node_fn = om2.MFnDependencyNode(dag_path.node())
+        offset_plug = node_fn.findPlug("offsetParentMatrix", False)
+        parent_matrix = (
+            om2.MFnMatrixData(offset_plug.asMObject()).matrix()
+            * dag_path.exclusiveMatrix()
+        )
+        # the nearest ancestor also being moved carries its new matrix down.
+        ancestor = full_path.rpartition("|")[0]
+        while ancestor:
+            if ancestor in paths:
+                ancestor_path, ancestor_matrix = paths[ancestor]
+                parent_matrix = (
+                    parent_matrix
+                    * ancestor_path.inclusiveMatrix().inverse()
+                    * ancestor_matrix
+                )
+                break
+            ancestor = ancestor.rpartition("|")[0]
+
+        local = om2.MTransformationMatrix(matrix * parent_matrix.inverse())
+        rotation = local.rotation()
+        if node_fn.hasAttribute("jointOrient"):
+            joint_orient = om2.MEulerRotation(
+                [
+                    node_fn.findPlug("jointOrient" + a, False).asMAngle().value
+                    for a in "XYZ"
+                ]
+            )
+            rotation = om2.MTransformationMatrix(
+                rotation.asMatrix() * joint_orient.asMatrix().inverse()
+            ).rotation()
+        rotation = rotation.reorder(node_fn.findPlug("rotateOrder", False).asInt())
+        # the values are in internal units.
+        values = [
+            ("translate", local.translation(om2.MSpace.kTransform), om2.MDistance),
+            ("rotate", rotation, om2.MAngle),
+            ("scale", local.scale(om2.MSpace.kTransform), None),
+        ]
+        for attr, vector, unit in values:
+            for axis, value in zip("XYZ", vector):
+                plug = node_fn.findPlug(attr + axis, False)
+                if plug.isLocked or plug.isDestination:
+                    continue
+                if unit is om2.MAngle:
+                    current = plug.asMAngle().value
+                    set_value = modifier.newPlugValueMAngle
+                elif unit is om2.MDistance:
+                    current = plug.asMDistance().value
+                    set_value = modifier.newPlugValueMDistance
+                else:
+                    current = plug.asDouble()
+                    set_value = modifier.newPlugValueDouble
+                if abs(current - value) > 1e-10:
+                    set_value(plug, unit(value) if unit else value)
+                    has_values = True
+    if has_values:
+        mop.utils.undo.apply_modifier(modifier)
+
+
+def _point_offset_matrix(driven, driver, matrices=None):
+    # the point networks multiply the offset the other way around.
+    driven_mat = _world_matrix(driven, matrices)
+    driver_mat = _world_matrix(driver, matrices)
+    return list(driver_mat.inverse() * driven_mat)
 
 
 def hierarchy_to_dict(parent, tree, nodes=[]):
@@ -50,25 +196,84 @@ def dict_to_hierarchy(tree, create_nodes=True, node_type="transform"):
 
 
 def matrix_constraint(
-    driver, driven, translate=True, rotate=True, scale=True, maintain_offset=False
+    driver,
+    driven,
+    translate=True,
+    rotate=True,
+    scale=True,
+    maintain_offset=False,
+    mode=None,
 ):
+    """Make ``driven`` follow the world matrix of ``driver``.
+
+    :param mode: how the constraint is built, ``"decompose"`` drives the
+        transform attributes through a ``decomposeMatrix`` network while
+        ``"offsetParentMatrix"`` drives the offsetParentMatrix through a
+        single ``multMatrix``.
+        Defaults to ``mop.config.constraint_mode``.
+    :type mode: str
+    :return: the nodes created for the constraint.
+    :rtype: list
+    """
     if not cmds.objExists(driver):
         raise ValueError("{} driver does not exist".format(driver))
     if not cmds.objExists(driven):
         raise ValueError("{} driven does not exist".format(driven))
 
+    if mode is None:
+        mode = mop.config.constraint_mode
+    if mode not in CONSTRAINT_MODES:
+        raise ValueError("Unknown constraint mode `{}`".format(mode))
+    if (
+        mode == "offsetParentMatrix"
+        and translate
+        and rotate
+        and scale
+        and cmds.attributeQuery("offsetParentMatrix", node=driven, exists=True)
+    ):
+        return _offset_parent_matrix_constraint(driver, driven, maintain_offset)
+
+    # the offsetParentMatrix can't drive a subset of the transform attributes.
+    return _decompose_matrix_constraint(
+        driver, driven, translate, rotate, scale, maintain_offset
+    )
+
+
+def _offset_parent_matrix_constraint(driver, driven, maintain_offset=False):
+    """Drive the offsetParentMatrix of ``driven`` with one ``multMatrix``.
+
+    The inverse of the driven's own matrix is the first input, which
+    cancels its transform attributes and joint orient out.
+    """
+    inputs = [driven + ".inverseMatrix"]
+    if maintain_offset:
+        inputs.append(offset_matrix(driven, driver))
+    inputs.append(driver + ".worldMatrix[0]")
+    inputs.append(driven + ".parentInverseMatrix[0]")
+
+    mult_mat = cmds.createNode("multMatrix")
+    for index, matrix in enumerate(inputs):
+        plug = "{}.matrixIn[{}]".format(mult_mat, index)
+        if isinstance(matrix, list):
+            cmds.setAttr(plug, matrix, type="matrix")
+        else:
+            cmds.connectAttr(matrix, plug)
+    cmds.connectAttr(
+        mult_mat + ".matrixSum", driven + ".offsetParentMatrix", force=True
+    )
+    return [mult_mat]
+
+
+def _decompose_matrix_constraint(
+    driver, driven, translate=True, rotate=True, scale=True, maintain_offset=False
+):
     mult_mat = cmds.createNode("multMatrix")
     decompose_mat = cmds.createNode("decomposeMatrix")
+    nodes = [mult_mat, decompose_mat]
 
     if maintain_offset:
-        mult_mat_offset = cmds.createNode("multMatrix")
-        cmds.connectAttr(driven + ".worldMatrix[0]", mult_mat_offset + ".matrixIn[0]")
-        cmds.connectAttr(
-            driver + ".worldInverseMatrix[0]", mult_mat_offset + ".matrixIn[1]"
-        )
-        offset_mat = cmds.getAttr(mult_mat_offset + ".matrixSum")
+        offset_mat = offset_matrix(driven, driver)
         cmds.setAttr(mult_mat + ".matrixIn[0]", offset_mat, type="matrix")
-        cmds.delete(mult_mat_offset)
     else:
         identity_mat = [1, 0, 0, 0, 0, 1, 0, 0, 0, 0, 1, 0, 0, 0, 0, 1]
         cmds.setAttr(mult_mat + ".matrixIn[0]", identity_mat, type="matrix")
@@ -87,6 +292,7 @@ def matrix_constraint(
             quat_invert = cmds.createNode("quatInvert")
             quat_prod = cmds.createNode("quatProd")
             quat_to_euler = cmds.createNode("quatToEuler")
+            nodes.extend([euler_to_quat, quat_invert, quat_prod, quat_to_euler])
 
             cmds.connectAttr(driven + ".jointOrient", euler_to_quat + ".inputRotate")
             cmds.connectAttr(euler_to_quat + ".outputQuat", quat_invert + ".inputQuat")
@@ -98,6 +304,7 @@ def matrix_constraint(
             cmds.connectAttr(decompose_mat + ".outputRotate", driven + ".rotate")
     if scale:
         cmds.connectAttr(decompose_mat + ".outputScale", driven + ".scale")
+    return nodes
 
 
 def point_constraint(driver, driven, maintain_offset=False):
@@ -112,14 +319,8 @@ def point_constraint(driver, driven, maintain_offset=False):
     cmds.connectAttr(driver + ".worldMatrix[0]", mult_mat + ".matrixIn[0]")
 
     if maintain_offset:
-        mult_mat_offset = cmds.createNode("multMatrix")
-        cmds.connectAttr(
-            driver + ".worldInverseMatrix[0]", mult_mat_offset + ".matrixIn[0]"
-        )
-        cmds.connectAttr(driven + ".worldMatrix[0]", mult_mat_offset + ".matrixIn[1]")
-        offset_mat = cmds.getAttr(mult_mat_offset + ".matrixSum")
+        offset_mat = _point_offset_matrix(driven, driver)
         cmds.setAttr(mult_mat + ".matrixIn[1]", offset_mat, type="matrix")
-        cmds.delete(mult_mat_offset)
     else:
         identity_mat = [1, 0, 0, 0, 0, 1, 0, 0, 0, 0, 1, 0, 0, 0, 0, 1]
         cmds.setAttr(mult_mat + ".matrixIn[1]", identity_mat, type="matrix")
@@ -152,30 +353,88 @@ def snap_first_to_last(source, target):
 
 
 def reset_node(node):
-    for attribute in ["translate", "rotate", "scale"]:
-        for axis in "XYZ":
-            attr = node + "." + attribute + axis
-            if attribute == "scale":
-                value = 1
-            else:
-                value = 0
-            try:
-                cmds.setAttr(attr, value)
-            except:
-                pass
-    attrs_to_reset = cmds.listAttr(node, category="should_reset")
-    if attrs_to_reset:
-        for attribute in attrs_to_reset:
-            defaultValue = cmds.addAttr(
-                node + "." + attribute, query=True, defaultValue=True
-            )
-            try:
-                cmds.setAttr(node + "." + attribute, defaultValue)
-            except:
-                pass
+    reset_nodes([node])
+
+
+def reset_nodes(nodes):
+    """Set the transforms and the "should_reset" attributes back to their default.
 
+    Locked attributes and attributes driven by anything but an animation
+    curve are skipped. All the values are set by a single undoable modifier.
 
-def create_parent_space(driven, drivers, translate=True, rotate=True):
+    :param nodes: nodes to reset.
+    :type nodes: list
+    """
+    modifier = om2.MDGModifier()
+    has_values = False
+    for node in nodes:
+        for plug, unit, default, lock_plugs in _get_reset_plugs(node):
+            if any(p.isLocked for p in lock_plugs):
+                continue
+            if plug.isDestination and not plug.source().node().hasFn(
+                om2.MFn.kAnimCurve
+            ):
+                continue
+            if mop.attributes.get_plug_value(plug, unit) == default:
+                continue
+            mop.attributes.set_plug_value(modifier, plug, unit, default)
+            has_values = True
+    if has_values:
+        mop.utils.undo.apply_modifier(modifier)
+
+
+def clear_reset_plugs_cache(*args):
+    """Forget the plugs cached by `reset_nodes`, see `mop.core.graph`."""
+    _reset_plugs.clear()
+
+
+def _get_reset_plugs(node):
+    """Return the plugs of ``node`` reset by `reset_nodes`.
+
+    The plugs are cached until the node is deleted, renamed
+    or gets its attributes changed.
+
+    :rtype: list
+    """
+    cached = _reset_plugs.get(node)
+    if cached:
+        handle, attribute_count, reset_plugs = cached
+        if handle.isValid():
+            fn = om2.MFnDependencyNode(handle.object())
+            if fn.name() == node and fn.attributeCount() == attribute_count:
+                return reset_plugs
+
+    sel = om2.MSelectionList()
+    sel.add(node)
+    mobj = sel.getDependNode(0)
+    fn = om2.MFnDependencyNode(mobj)
+    reset_plugs = []
+    for attribute, unit, default in [
+        ("translate", "distance", 0.0),
+        ("rotate", "angle", 0.0),
+        ("scale", "double", 1.0),
+    ]:
+        if not fn.hasAttribute(attribute):
+            continue
+        parent_plug = fn.findPlug(attribute, False)
+        for axis in "XYZ":
+            plug = fn.findPlug(attribute + axis, False)
+            reset_plugs.append((plug, unit, default, (plug, parent_plug)))
+    for attribute in cmds.listAttr(node, category="should_reset") or []:
+        attr_name = node + "." + attribute
+        default = cmds.addAttr(attr_name, query=True, defaultValue=True)
+        if default is None:
+            continue
+        attribute_type = cmds.attributeQuery(attribute, node=node, attributeType=True)
+        unit = _attribute_type_units.get(attribute_type, "double")
+        plug = fn.findPlug(attribute, False)
+        reset_plugs.append((plug, unit, default, (plug,)))
+
+    _reset_plugs[node] = (om2.MObjectHandle(mobj), fn.attributeCount(), reset_plugs)
+    return reset_plugs
+
+
+def create_parent_space(driven, drivers, translate=True, rotate=True, matrices=None):
     if translate and rotate:
         short_name = "Space"
     elif not translate and rotate:
@@ -209,18 +468,11 @@ def create_parent_space(driven, drivers, translate=True, rotate=True):
     cmds.connectAttr(driven + ".space", offset_choice + ".selector")
     cmds.connectAttr(driven + ".space", driver_choice + ".selector")
 
-    todel = []
     for i, driver in enumerate(drivers):
         if not cmds.attributeQuery(driver + "_offset", node=driven, exists=True):
             cmds.addAttr(driven, longName=driver + "_offset", attributeType="matrix")
         # get the offset between the driven and driver
-        mult_mat_offset = cmds.createNode("multMatrix")
-        todel.append(mult_mat_offset)
-        cmds.connectAttr(driven + ".worldMatrix[0]", mult_mat_offset + ".matrixIn[0]")
-        cmds.connectAttr(
-            driver + ".worldInverseMatrix[0]", mult_mat_offset + ".matrixIn[1]"
-        )
-        offset_mat = cmds.getAttr(mult_mat_offset + ".matrixSum")
+        offset_mat = offset_matrix(driven, driver, matrices)
 
         cmds.setAttr(driven + "." + driver + "_offset", offset_mat, type="matrix")
         cmds.connectAttr(
@@ -243,10 +495,9 @@ def create_parent_space(driven, drivers, translate=True, rotate=True):
         )
     if rotate:
         cmds.connectAttr(decompose_mat + ".outputRotate", driven_parent + ".rotate")
-    cmds.delete(todel)
 
 
-def create_point_space(driven, drivers):
+def create_point_space(driven, drivers, matrices=None):
     if cmds.attributeQuery("space", node=driven, exists=True):
         cmds.deleteAttr(attribute="space", name=driven)
 
@@ -273,17 +524,10 @@ def create_point_space(driven, drivers):
     cmds.connectAttr(driven + ".space", offset_choice + ".selector")
     cmds.connectAttr(driven + ".space", driver_choice + ".selector")
 
-    todel = []
     for i, driver in enumerate(drivers):
         cmds.addAttr(driven_parent, longName=driver + "_offset", attributeType="matrix")
         # get the offset between the driven and driver
-        mult_mat_offset = cmds.createNode("multMatrix")
-        todel.append(mult_mat_offset)
-        cmds.connectAttr(
-            driver + ".worldInverseMatrix[0]", mult_mat_offset + ".matrixIn[0]"
-        )
-        cmds.connectAttr(driven + ".worldMatrix[0]", mult_mat_offset + ".matrixIn[1]")
-        offset_mat = cmds.getAttr(mult_mat_offset + ".matrixSum")
+        offset_mat = _point_offset_matrix(driven, driver, matrices)
 
         cmds.setAttr(
             driven_parent + "." + driver + "_offset", offset_mat, type="matrix"
@@ -305,21 +549,28 @@ def create_point_space(driven, drivers):
     cmds.connectAttr(mult_mat + ".matrixSum", decompose_mat + ".inputMatrix")
 
     cmds.connectAttr(decompose_mat + ".outputTranslate", driven + ".translate")
-    cmds.delete(todel)
 
 
-def create_orient_space(driven, drivers):
-    create_parent_space(driven, drivers, translate=False, rotate=True)
+def create_orient_space(driven, drivers, matrices=None):
+    create_parent_space(
+        driven, drivers, translate=False, rotate=True, matrices=matrices
+    )
+
 
+def create_space_switching(driven, drivers, space_type, matrices=None):
+    """Create the parent space of ``driven``.
 
-def create_space_switching(driven, drivers, space_type):
+    :param matrices: world matrices of the driven and drivers,
+        see `world_matrices`. They are queried when not given.
+    :type matrices: dict
+    """
     with _dgutils.CatchCreatedNodes() as ps_nodes:
         if space_type == "parent":
-            create_parent_space(driven, drivers)
+            create_parent_space(driven, drivers, matrices=matrices)
         elif space_type == "point":
-            create_point_space(driven, drivers)
+            create_point_space(driven, drivers, matrices=matrices)
         elif space_type == "orient":
-            create_orient_space(driven, drivers)
+            create_orient_space(driven, drivers, matrices=matrices)
     if ps_nodes:
         if not cmds.attributeQuery("ps_nodes", node=driven, exists=True):
             cmds.addAttr(
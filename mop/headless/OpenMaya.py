@@ -0,0 +1,1311 @@
+"""Headless implementation of the ``maya.api.OpenMaya`` classes used by `mop`."""
+
+import copy
+import math
+
+from mop.headless import scene as _scene
+from mop.headless.scene import NODE_TYPES, AttrDef, split_path
+
+
+def _scn():
+    return _scene.current()
+
+
+# ---------------------------------------------------------------------------
+# Math
+# ---------------------------------------------------------------------------
+
+
+class MSpace(object):
+    kInvalid = 0
+    kTransform = 1
+    kPreTransform = 2
+    kPostTransform = 3
+    kWorld = 4
+    kObject = kPreTransform
+
+
+class MVector(object):
+    def __init__(self, *args):
+        if len(args) == 1:
+            args = tuple(args[0])
+        if not args:
+            args = (0.0, 0.0, 0.0)
+        self.x, self.y, self.z = (float(v) for v in args[:3])
+
+    def __iter__(self):
+        return iter((self.x, self.y, self.z))
+
+    def __len__(self):
+        return 3
+
+    def __getitem__(self, index):
+        return (self.x, self.y, self.z)[index]
+
+    def __add__(self, other):
+        return type(self)(self.x + other[0], self.y + other[1], self.z + other[2])
+
+    def __sub__(self, other):
+        return MVector(self.x - other[0], self.y - other[1], self.z - other[2])
+
+    def __neg__(self):
+        return type(self)(-self.x, -self.y, -self.z)
+
+    def __mul__(self, other):
+        if isinstance(other, MMatrix):
+            return type(self)(*other._transform(list(self), 0.0))
+        if isinstance(other, (MVector, MPoint)):
+            return self.x * other[0] + self.y * other[1] + self.z * other[2]
+        return type(self)(self.x * other, self.y * other, self.z * other)
+
+    __rmul__ = __mul__
+
+    def __div__(self, other):
+        return type(self)(self.x / other, self.y / other, self.z / other)
+
+    __truediv__ = __div__
+
+    def __xor__(self, other):
+        return MVector(
+            self.y * other[2] - self.z * other[1],
+            self.z * other[0] - self.x * other[2],
+            self.x * other[1] - self.y * other[0],
+        )
+
+    def __eq__(self, other):
+        return self.isEquivalent(other, 0.0)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return "{}({}, {}, {})".format(type(self).__name__, self.x, self.y, self.z)
+
+    def isEquivalent(self, other, tolerance=1e-10):
+        return all(abs(a - b) <= tolerance for a, b in zip(self, other))
+
+    def length(self):
+        return math.sqrt(self.x**2 + self.y**2 + self.z**2)
+
+    def normal(self):
+        length = self.length() or 1.0
+        return MVector(self.x / length, self.y / length, self.z / length)
+
+    def normalize(self):
+        length = self.length() or 1.0
+        self.x, self.y, self.z = self.x / length, self.y / length, self.z / length
+        return self
+
+
+class MPoint(MVector):
+    def __init__(self, *args):
+        if len(args) == 1:
+            args = tuple(args[0])
+        super(MPoint, self).__init__(*args[:3])
+        self.w = float(args[3]) if len(args) > 3 else 1.0
+
+    def __mul__(self, other):
+        if isinstance(other, MMatrix):
+            return MPoint(*other._transform(list(self), 1.0))
+        return super(MPoint, self).__mul__(other)
+
+    def __sub__(self, other):
+        return MVector(self.x - other[0], self.y - other[1], self.z - other[2])
+
+
+class MMatrix(object):
+    kIdentity = None
+
+    def __init__(self, values=None):
+        if values is None:
+            values = _scene.IDENTITY
+        elif isinstance(values, MMatrix):
+            values = values._values
+        else:
+            flat = []
+            for value in values:
+                if isinstance(value, (list, tuple)):
+                    flat.extend(value)
+                else:
+                    flat.append(value)
+            values = flat
+        self._values = [float(v) for v in values]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return 16
+
+    def __getitem__(self, index):
+        return self._values[index]
+
+    def __setitem__(self, index, value):
+        self._values[index] = float(value)
+
+    def __mul__(self, other):
+        return MMatrix(_scene.mat_mult(self._values, MMatrix(other)._values))
+
+    def __eq__(self, other):
+        return self.isEquivalent(other, 0.0)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return "MMatrix({})".format(self._values)
+
+    def _transform(self, vector, w):
+        m = self._values
+        return [
+            vector[0] * m[c]
+            + vector[1] * m[4 + c]
+            + vector[2] * m[8 + c]
+            + w * m[12 + c]
+            for c in range(3)
+        ]
+
+    def getElement(self, row, column):
+        return self._values[row * 4 + column]
+
+    def setElement(self, row, column, value):
+        self._values[row * 4 + column] = float(value)
+
+    def inverse(self):
+        return MMatrix(_scene.mat_inverse(self._values))
+
+    def transpose(self):
+        return MMatrix([self._values[c * 4 + r] for r in range(4) for c in range(4)])
+
+    def isEquivalent(self, other, tolerance=1e-10):
+        return all(abs(a - b) <= tolerance for a, b in zip(self, MMatrix(other)))
+
+
+MMatrix.kIdentity = MMatrix()
+
+
+class MEulerRotation(object):
+    kXYZ = 0
+
+    def __init__(self, x=0.0, y=0.0, z=0.0, order=0):
+        if isinstance(x, (list, tuple, MVector)):
+            x, y, z = x
+        self.x, self.y, self.z = float(x), float(y), float(z)
+        self.order = order
+
+    def __iter__(self):
+        return iter((self.x, self.y, self.z))
+
+    def __getitem__(self, index):
+        return (self.x, self.y, self.z)[index]
+
+    def reorder(self, order):
+        # the fake scene only evaluates the xyz rotate order.
+        if order != self.order:
+            raise NotImplementedError("Only the xyz rotate order is supported.")
+        return MEulerRotation(self.x, self.y, self.z, order)
+
+    def asMatrix(self):
+        degrees = [math.degrees(v) for v in self]
+        return MMatrix(_scene.euler_to_matrix(degrees))
+
+
+class MTransformationMatrix(object):
+    def __init__(self, matrix=None):
+        matrix = MMatrix(matrix)
+        self._translate, rotate, self._scale = _scene.decompose(list(matrix))
+        self._rotate = [math.radians(v) for v in rotate]
+
+    def translation(self, space=MSpace.kTransform):
+        return MVector(self._translate)
+
+    def setTranslation(self, vector, space=MSpace.kTransform):
+        self._translate = list(vector)
+        return self
+
+    def rotation(self, asQuaternion=False):
+        return MEulerRotation(*self._rotate)
+
+    def setRotation(self, rotation):
+        self._rotate = list(rotation)
+        return self
+
+    def scale(self, space=MSpace.kTransform):
+        return list(self._scale)
+
+    def setScale(self, scale, space=MSpace.kTransform):
+        self._scale = list(scale)
+        return self
+
+    def asMatrix(self):
+        rotate = [math.degrees(v) for v in self._rotate]
+        return MMatrix(_scene.compose(self._translate, rotate, self._scale))
+
+
+# ---------------------------------------------------------------------------
+# Objects
+# ---------------------------------------------------------------------------
+
+
+class MFn(object):
+    kInvalid = 0
+    kBase = 1
+    kDependencyNode = 4
+    kAnimCurve = 7
+    kDagNode = 107
+    kTransform = 110
+    kJoint = 121
+    kShape = 248
+    kWorld = 258
+    kNurbsCurve = 267
+    kLocator = 281
+    kSet = 460
+    kMesh = 296
+    kSkinClusterFilter = 682
+
+    _inherited = {
+        kAnimCurve: "animCurve",
+        kDagNode: "dagNode",
+        kTransform: "transform",
+        kJoint: "joint",
+        kShape: "shape",
+        kWorld: "world",
+        kNurbsCurve: "nurbsCurve",
+        kLocator: "locator",
+        kSet: "objectSet",
+        kMesh: "mesh",
+        kSkinClusterFilter: "skinCluster",
+    }
+
+
+class MObject(object):
+    kNullObj = None
+
+    def __init__(self, node=None):
+        if isinstance(node, MObject):
+            node = node._node
+        self._node = node
+
+    def __eq__(self, other):
+        return isinstance(other, MObject) and self._node is other._node
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return id(self._node)
+
+    def isNull(self):
+        return self._node is None
+
+    def hasFn(self, fn):
+        if self._node is None:
+            return False
+        if fn in (MFn.kBase, MFn.kDependencyNode):
+            return True
+        return MFn._inherited.get(fn) in self._node.inherited
+
+    @property
+    def apiTypeStr(self):
+        if self._node is None:
+            return "kInvalid"
+        return "k" + self._node.type[0].upper() + self._node.type[1:]
+
+
+MObject.kNullObj = MObject()
+
+
+class MObjectHandle(object):
+    def __init__(self, obj=None):
+        self._node = obj._node if obj is not None else None
+
+    def isValid(self):
+        return self._node is not None and self._node.alive
+
+    isAlive = isValid
+
+    def object(self):
+        if not self.isValid():
+            return MObject()
+        return MObject(self._node)
+
+    def hashCode(self):
+        return self._node.id if self._node is not None else 0
+
+    def __eq__(self, other):
+        return isinstance(other, MObjectHandle) and self._node is other._node
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return self.hashCode()
+
+
+class MDagPath(object):
+    def __init__(self, other=None):
+        self._node = other._node if other is not None else None
+
+    @staticmethod
+    def getAPathTo(obj):
+        path = MDagPath()
+        path._node = obj._node
+        return path
+
+    def isValid(self):
+        return self._node is not None and self._node.alive
+
+    def node(self):
+        return MObject(self._node)
+
+    def transform(self):
+        if self._node.is_shape:
+            return MObject(self._node.parent)
+        return MObject(self._node)
+
+    def extendToShape(self):
+        shapes = [c for c in self._node.children if c.is_shape]
+        if not shapes:
+            raise RuntimeError("(kFailure): No shape below {}".format(self._node.name))
+        self._node = shapes[0]
+        return self
+
+    def childCount(self):
+        return len(self._node.children)
+
+    def child(self, index):
+        return MObject(self._node.children[index])
+
+    def fullPathName(self):
+        names = []
+        node = self._node
+        while node is not None:
+            names.append(node.name)
+            node = node.parent
+        return "|" + "|".join(reversed(names))
+
+    def partialPathName(self):
+        return self._node.name
+
+    def inclusiveMatrix(self):
+        return MMatrix(_scn().world_matrix(self._node))
+
+    def exclusiveMatrix(self):
+        return MMatrix(_scn().parent_world_matrix(self._node))
+
+    def hasFn(self, fn):
+        return MObject(self._node).hasFn(fn)
+
+
+class MSelectionList(object):
+    def __init__(self, other=None):
+        self._items = list(other._items) if other is not None else []
+
+    def add(self, item):
+        if isinstance(item, MDagPath):
+            self._items.append((item._node, None))
+            return self
+        if isinstance(item, MObject):
+            self._items.append((item._node, None))
+            return self
+        if isinstance(item, MPlug):
+            self._items.append((item._node, item._path))
+            return self
+        node_name, _, path = item.partition(".")
+        node = _scn().get(node_name)
+        if node is None or (path and not _scn().plug_exists(item)):
+            raise RuntimeError("(kInvalidParameter): Object does not exist")
+        self._items.append((node, _scn().normalize(node, path) if path else None))
+        return self
+
+    def length(self):
+        return len(self._items)
+
+    def isEmpty(self):
+        return not self._items
+
+    def clear(self):
+        self._items = []
+
+    def getDependNode(self, index):
+        return MObject(self._items[index][0])
+
+    def getDagPath(self, index):
+        node = self._items[index][0]
+        if not node.is_dag:
+            raise TypeError("(kInvalidParameter): Object is not a DAG node")
+        path = MDagPath()
+        path._node = node
+        return path
+
+    def getPlug(self, index):
+        node, path = self._items[index]
+        if path is None:
+            raise TypeError("(kInvalidParameter): Object is not a plug")
+        return MPlug(node, path)
+
+    def getSelectionStrings(self):
+        return [n.name if p is None else n.name + "." + p for n, p in self._items]
+
+
+class MGlobal(object):
+    kReplaceList = 0
+    kAddToList = 2
+
+    @staticmethod
+    def getActiveSelectionList():
+        selection = MSelectionList()
+        selection._items = [(n, None) for n in _scn().selection]
+        return selection
+
+    @staticmethod
+    def setActiveSelectionList(selection, mode=0):
+        nodes = [n for n, _ in selection._items]
+        if mode == MGlobal.kReplaceList:
+            _scn().selection = nodes
+        else:
+            _scn().selection.extend(nodes)
+
+    @staticmethod
+    def displayInfo(message):
+        return
+
+    displayWarning = displayError = displayInfo
+
+
+# ---------------------------------------------------------------------------
+# Plugs and function sets
+# ---------------------------------------------------------------------------
+
+
+class _Data(object):
+    """Stand-in for the data MObjects returned by ``MPlug.asMObject``."""
+
+    def __init__(self, value=None):
+        self.value = value
+
+    def isNull(self):
+        return self.value is None
+
+
+class _CurveData(_Data):
+    """Stand-in for the ``kNurbsCurveData`` objects of ``MFnNurbsCurveData``."""
+
+    def __init__(self):
+        super(_CurveData, self).__init__(value=True)
+        self.cvs = []
+        self.knots = []
+        self.degree = 1
+        self.form = 1
+
+
+class MFnNurbsCurveData(object):
+    def __init__(self, data=None):
+        self._data = data
+
+    def create(self):
+        self._data = _CurveData()
+        return self._data
+
+
+class MFnMatrixData(object):
+    def __init__(self, data=None):
+        self._data = data
+
+    def create(self, matrix):
+        self._data = _Data(list(MMatrix(matrix)))
+        return self._data
+
+    def matrix(self):
+        return MMatrix(self._data.value)
+
+
+class MPlug(object):
+    def __init__(self, node=None, path=None):
+        if isinstance(node, MPlug):
+            node, path = node._node, node._path
+        elif isinstance(node, MObject):
+            node = node._node
+        if isinstance(path, _AttributeObject):
+            path = path._attr_def.name
+        self._node = node
+        self._path = path
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, MPlug)
+            and self._node is other._node
+            and self._path == other._path
+        )
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((id(self._node), self._path))
+
+    def __str__(self):
+        return self.name()
+
+    def __repr__(self):
+        return "MPlug({})".format(self.name() if not self.isNull else None)
+
+    @property
+    def _attr(self):
+        return _scn().attr_of(self._node, self._path)
+
+    @property
+    def isNull(self):
+        return self._node is None or not self._node.alive
+
+    @property
+    def isArray(self):
+        return self._attr.multi and split_path(self._path)[-1][1] is None
+
+    @property
+    def isElement(self):
+        return split_path(self._path)[-1][1] is not None
+
+    @property
+    def isCompound(self):
+        return self._attr.type == "compound"
+
+    @property
+    def isChild(self):
+        return bool(self._attr.parent)
+
+    @property
+    def isConnected(self):
+        return self.isDestination or self.isSource
+
+    @property
+    def isDestination(self):
+        return self._path in self._node.inputs
+
+    @property
+    def isSource(self):
+        return bool(self._node.outputs.get(self._path))
+
+    @property
+    def isLocked(self):
+        return _scn().is_locked(self._node, self._path)
+
+    @isLocked.setter
+    def isLocked(self, value):
+        self._node.locks[self._path] = bool(value)
+
+    @property
+    def isKeyable(self):
+        return _scn().get_flag(self._node, self._path, "keyable")
+
+    @isKeyable.setter
+    def isKeyable(self, value):
+        _scn().set_flag(self._node, self._path, "keyable", value)
+
+    @property
+    def isChannelBox(self):
+        return _scn().get_flag(self._node, self._path, "channelBox")
+
+    @isChannelBox.setter
+    def isChannelBox(self, value):
+        _scn().set_flag(self._node, self._path, "channelBox", value)
+
+    @property
+    def isDynamic(self):
+        return self._attr.dynamic
+
+    def name(self):
+        return self._node.name + "." + self._path
+
+    def partialName(self, includeNodeName=False, **kwargs):
+        if includeNodeName:
+            return self.name()
+        return self._path
+
+    def node(self):
+        return MObject(self._node)
+
+    def attribute(self):
+        return MObject(self._node)
+
+    def logicalIndex(self):
+        return split_path(self._path)[-1][1]
+
+    def array(self):
+        segments = split_path(self._path)
+        return MPlug(
+            self._node, _scene.join_path(segments[:-1] + [(segments[-1][0], None)])
+        )
+
+    def parent(self):
+        attr = self._attr
+        if not attr.parent:
+            raise RuntimeError("(kFailure): Plug is not a child")
+        segments = split_path(self._path)
+        return MPlug(
+            self._node, _scene.join_path(segments[:-1] + [(attr.parent, None)])
+        )
+
+    def numChildren(self):
+        return len(self._attr.children)
+
+    def child(self, index):
+        return MPlug(
+            self._node, _scene.child_path(self._path, self._attr.children[index])
+        )
+
+    def elementByLogicalIndex(self, index):
+        return MPlug(self._node, "{}[{}]".format(self._path, index))
+
+    def elementByPhysicalIndex(self, index):
+        indices = self.getExistingArrayAttributeIndices()
+        return self.elementByLogicalIndex(indices[index])
+
+    def getExistingArrayAttributeIndices(self):
+        return _scn().elements(self._node, self._path)
+
+    def numElements(self):
+        return len(self.getExistingArrayAttributeIndices())
+
+    evaluateNumElements = numElements
+
+    def source(self):
+        src = self._node.inputs.get(self._path)
+        if src is None:
+            return MPlug()
+        return MPlug(*src)
+
+    def destinations(self):
+        return [MPlug(*dst) for dst in self._node.outputs.get(self._path, [])]
+
+    def connectedTo(self, asDst, asSrc):
+        plugs = []
+        if asDst and self.isDestination:
+            plugs.append(self.source())
+        if asSrc:
+            plugs.extend(self.destinations())
+        return plugs
+
+    def _get(self):
+        return _scn().get_value(self._node, self._path)
+
+    def _set(self, value):
+        if self.isLocked:
+            raise RuntimeError("(kFailure): Plug {} is locked".format(self.name()))
+        _scn().set_value(self._node, self._path, value)
+
+    def asDouble(self):
+        return float(self._get() or 0.0)
+
+    asFloat = asDouble
+
+    def asMAngle(self):
+        return MAngle(math.radians(self.asDouble()))
+
+    def asMDistance(self):
+        return MDistance(self.asDouble())
+
+    def asInt(self):
+        return int(self._get() or 0)
+
+    asShort = asLong = asChar = asInt
+
+    def asBool(self):
+        return bool(self._get())
+
+    def asString(self):
+        value = self._get()
+        return "" if value is None else value
+
+    def asMObject(self):
+        return _Data(self._get())
+
+    def setDouble(self, value):
+        self._set(value)
+
+    setFloat = setDouble
+
+    def setMAngle(self, angle):
+        self._set(math.degrees(angle.value))
+
+    def setMDistance(self, distance):
+        self._set(distance.value)
+
+    def setInt(self, value):
+        self._set(value)
+
+    setShort = setLong = setChar = setInt
+
+    def setBool(self, value):
+        self._set(value)
+
+    def setString(self, value):
+        self._set(value)
+
+    def setMObject(self, data):
+        self._set(data.value)
+
+
+class MAngle(object):
+    kRadians = 1
+    kDegrees = 2
+
+    def __init__(self, value=0.0, unit=1):
+        if unit == MAngle.kDegrees:
+            value = math.radians(value)
+        self.value = value
+
+    @staticmethod
+    def uiUnit():
+        return MAngle.kDegrees
+
+    def asUnits(self, unit):
+        if unit == MAngle.kDegrees:
+            return self.asDegrees()
+        return self.value
+
+    def asDegrees(self):
+        return math.degrees(self.value)
+
+    def asRadians(self):
+        return self.value
+
+
+class MDistance(object):
+    kCentimeters = 6
+
+    def __init__(self, value=0.0, unit=None):
+        self.value = value
+
+    @staticmethod
+    def uiUnit():
+        return MDistance.kCentimeters
+
+    def asUnits(self, unit):
+        return self.value
+
+    def asCentimeters(self):
+        return self.value
+
+
+class MFnBase(object):
+    def __init__(self, obj=None):
+        self._node = None
+        if obj is not None:
+            self.setObject(obj)
+
+    def setObject(self, obj):
+        self._node = obj._node
+        return self
+
+    def object(self):
+        return MObject(self._node)
+
+
+class _AttributeObject(MObject):
+    """Attribute created by an ``MFnAttribute``, not yet added to a node."""
+
+    def __init__(self, attr_def):
+        super(_AttributeObject, self).__init__()
+        self._attr_def = attr_def
+
+    def isNull(self):
+        return False
+
+    def hasFn(self, fn):
+        return False
+
+
+class MFnAttribute(MFnBase):
+    _type = None
+
+    def setObject(self, obj):
+        self._attr_def = obj._attr_def
+        return self
+
+    def create(self, longName, shortName):
+        self._attr_def = AttrDef(
+            longName, self._type, short_name=shortName, dynamic=True
+        )
+        return _AttributeObject(self._attr_def)
+
+    @property
+    def name(self):
+        return self._attr_def.name
+
+
+class MFnMessageAttribute(MFnAttribute):
+    _type = "message"
+
+
+class MFnDependencyNode(MFnBase):
+    @property
+    def typeName(self):
+        return self._node.type
+
+    @property
+    def isShared(self):
+        return False
+
+    def name(self):
+        return self._node.name
+
+    def setName(self, name):
+        return _scn().rename(self._node, name)
+
+    def attributeCount(self):
+        return len(self._node.attrs)
+
+    def hasAttribute(self, name):
+        node = self._node
+        utility = not node.is_dag and node.type not in NODE_TYPES
+        if utility and node.find_attr(name) is None:
+            # like with cmds, the attributes of the utility nodes are created on use.
+            node.ensure_attr(name)
+        return node.find_attr(name) is not None
+
+    def getAliasList(self):
+        return []
+
+    def attribute(self, name):
+        if not self.hasAttribute(name):
+            raise RuntimeError("(kInvalidParameter): No attribute {}".format(name))
+        return name
+
+    def findPlug(self, attribute, wantNetworkedPlug=False):
+        if isinstance(attribute, MObject):
+            raise TypeError("findPlug expects an attribute name")
+        if not self.hasAttribute(split_path(attribute)[0][0]):
+            raise RuntimeError(
+                "(kInvalidParameter): No plug {}.{}".format(self._node.name, attribute)
+            )
+        return MPlug(self._node, _scn().normalize(self._node, attribute))
+
+    def getConnections(self):
+        keys = set(self._node.inputs) | set(self._node.outputs)
+        return [MPlug(self._node, key) for key in sorted(keys)]
+
+    def uuid(self):
+        return self._node.id
+
+
+class MFnDagNode(MFnDependencyNode):
+    def setObject(self, obj):
+        if isinstance(obj, MDagPath):
+            self._node = obj._node
+            return self
+        return super(MFnDagNode, self).setObject(obj)
+
+    def fullPathName(self):
+        return MDagPath.getAPathTo(MObject(self._node)).fullPathName()
+
+    def partialPathName(self):
+        return self._node.name
+
+    def getPath(self):
+        return MDagPath.getAPathTo(MObject(self._node))
+
+    def parentCount(self):
+        return 0 if self._node is _scn().world else 1
+
+    def parent(self, index):
+        if self._node is _scn().world:
+            raise RuntimeError("(kInvalidParameter): Index not in valid range")
+        if self._node.parent is None:
+            return MObject(_scn().world)
+        return MObject(self._node.parent)
+
+    def childCount(self):
+        return len(self._node.children)
+
+    def child(self, index):
+        return MObject(self._node.children[index])
+
+    def transformationMatrix(self):
+        return MMatrix(_scn().local_matrix(self._node))
+
+
+class MFnTransform(MFnDagNode):
+    def transformation(self):
+        return MTransformationMatrix(_scn().local_matrix(self._node))
+
+    def setTransformation(self, transformation):
+        _scn().set_local_matrix(self._node, list(transformation.asMatrix()))
+
+
+class MFnNurbsCurve(MFnDagNode):
+    kOpen = 1
+    kClosed = 2
+    kPeriodic = 3
+
+    def setObject(self, obj):
+        super(MFnNurbsCurve, self).setObject(obj)
+        if self._node is not None and not self._node.is_shape:
+            shapes = [c for c in self._node.children if c.type == "nurbsCurve"]
+            if shapes:
+                self._node = shapes[0]
+        return self
+
+    @property
+    def numCVs(self):
+        return len(self._node.cvs)
+
+    @property
+    def degree(self):
+        return _scn().get_value(self._node, "degree")
+
+    @property
+    def form(self):
+        return _scn().get_value(self._node, "form") + 1
+
+    def knots(self):
+        return list(self._node.knots)
+
+    def cvPositions(self, space=MSpace.kObject):
+        points = [MPoint(cv) for cv in self._node.cvs]
+        if space == MSpace.kWorld:
+            matrix = MMatrix(_scn().world_matrix(self._node))
+            points = [p * matrix for p in points]
+        return points
+
+    def cvPosition(self, index, space=MSpace.kObject):
+        return self.cvPositions(space)[index]
+
+    def setCVPositions(self, points, space=MSpace.kObject):
+        if space == MSpace.kWorld:
+            inverse = MMatrix(_scn().world_matrix(self._node)).inverse()
+            points = [MPoint(p) * inverse for p in points]
+        self._node.cvs = [[p[0], p[1], p[2]] for p in points]
+        _scn().emit("attribute_changed", self._node, self._node, "local")
+
+    def updateCurve(self):
+        return
+
+    def create(self, cvs, knots, degree, form, is2D, rational, parent=None):
+        if isinstance(parent, _CurveData):
+            parent.cvs = [[p[0], p[1], p[2]] for p in cvs]
+            parent.knots = list(knots)
+            parent.degree, parent.form = degree, form
+            return parent
+        scene = _scn()
+        transform = None
+        if parent is None or parent.isNull():
+            transform = scene.create_node("transform", name="curve1")
+            parent_node = transform
+        else:
+            parent_node = parent._node
+        shape = scene.create_node(
+            "nurbsCurve", name=parent_node.name + "Shape", parent=parent_node
+        )
+        shape.cvs = [[p[0], p[1], p[2]] for p in cvs]
+        shape.knots = list(knots)
+        scene.set_value(shape, "degree", degree)
+        scene.set_value(shape, "form", form - 1)
+        self._node = shape
+        return MObject(transform or shape)
+
+
+# ---------------------------------------------------------------------------
+# Modifiers
+# ---------------------------------------------------------------------------
+
+
+class MDGModifier(object):
+    """Queue of operations applied by :meth:`doIt`.
+
+    Nodes are created immediately so the returned ``MObject`` is usable,
+    every other operation is deferred.
+    """
+
+    def __init__(self):
+        self._operations = []
+        self._undo = []
+
+    def createNode(self, node_type):
+        node = _scn().create_node(node_type)
+        self._undo.append(lambda: _scn().delete(node))
+        return MObject(node)
+
+    def renameNode(self, obj, name):
+        self._operations.append(lambda: self._rename(obj._node, name))
+        return self
+
+    def _rename(self, node, name):
+        old_name = node.name
+        _scn().rename(node, name)
+        self._undo.append(lambda: _scn().rename(node, old_name))
+
+    def connect(self, src, dst):
+        self._operations.append(lambda: self._connect(src, dst))
+        return self
+
+    def _connect(self, src, dst):
+        src, dst = (src._node, src._path), (dst._node, dst._path)
+        _scn().connect(src, dst)
+        self._undo.append(lambda: _scn().disconnect(src, dst))
+
+    def disconnect(self, src, dst):
+        self._operations.append(lambda: self._disconnect(src, dst))
+        return self
+
+    def _disconnect(self, src, dst):
+        src, dst = (src._node, src._path), (dst._node, dst._path)
+        _scn().disconnect(src, dst)
+        self._undo.append(lambda: _scn().connect(src, dst))
+
+    def deleteNode(self, obj):
+        self._operations.append(lambda: _scn().delete(obj._node))
+        return self
+
+    def addAttribute(self, node, attribute):
+        self._operations.append(lambda: self._add_attribute(node._node, attribute))
+        return self
+
+    def _add_attribute(self, node, attribute):
+        attr_def = copy.copy(attribute._attr_def)
+        if node.find_attr(attr_def.name) is not None:
+            raise RuntimeError(
+                "(kFailure): Attribute {}.{} already exists".format(
+                    node.name, attr_def.name
+                )
+            )
+        node.add_attr(attr_def)
+        _scn().emit("attribute_changed", node, node, attr_def.name)
+        self._undo.append(lambda: node.remove_attr(attr_def.name))
+
+    def _new_value(self, plug, value):
+        self._operations.append(lambda: self._set_value(plug, value))
+        return self
+
+    def _set_value(self, plug, value):
+        old_value = plug._get()
+        plug._set(value)
+        self._undo.append(lambda: plug._set(old_value))
+
+    def newPlugValueDouble(self, plug, value):
+        return self._new_value(plug, value)
+
+    newPlugValueFloat = newPlugValueInt = newPlugValueBool = newPlugValueDouble
+    newPlugValueShort = newPlugValueChar = newPlugValueString = newPlugValueDouble
+
+    def newPlugValueMAngle(self, plug, angle):
+        return self._new_value(plug, math.degrees(angle.value))
+
+    def newPlugValueMDistance(self, plug, distance):
+        return self._new_value(plug, distance.value)
+
+    def newPlugValue(self, plug, data):
+        if isinstance(data, _CurveData):
+            self._operations.append(lambda: self._set_curve(plug._node, data))
+            return self
+        return self._new_value(plug, data.value)
+
+    def _set_curve(self, node, data):
+        scene = _scn()
+        old = (
+            node.cvs,
+            node.knots,
+            scene.get_value(node, "degree"),
+            scene.get_value(node, "form"),
+        )
+
+        def set_curve(cvs, knots, degree, form):
+            node.cvs, node.knots = [list(cv) for cv in cvs], list(knots)
+            scene.set_value(node, "degree", degree)
+            scene.set_value(node, "form", form)
+            scene.emit("attribute_changed", node, node, "local")
+
+        set_curve(data.cvs, data.knots, data.degree, data.form - 1)
+        self._undo.append(lambda: set_curve(*old))
+
+    def doIt(self):
+        operations, self._operations = self._operations, []
+        for operation in operations:
+            operation()
+        return self
+
+    def undoIt(self):
+        undo, self._undo = self._undo, []
+        for operation in reversed(undo):
+            operation()
+        return self
+
+
+class MDagModifier(MDGModifier):
+    def createNode(self, node_type, parent=None):
+        scene = _scn()
+        parent_node = None
+        if parent is not None and not parent.isNull():
+            parent_node = parent._node
+        _, is_dag, is_shape = _scene.type_info(node_type)
+        result = None
+        if is_shape and parent_node is None:
+            parent_node = scene.create_node("transform", name=node_type + "1")
+            result = parent_node
+        node = scene.create_node(node_type, parent=parent_node)
+        created = result or node
+        self._undo.append(lambda: scene.delete(created))
+        return MObject(created)
+
+    def reparentNode(self, obj, newParent=None):
+        self._operations.append(lambda: self._reparent(obj._node, newParent))
+        return self
+
+    def _reparent(self, node, parent):
+        old_parent = node.parent
+        new_parent = (
+            parent._node if parent is not None and not parent.isNull() else None
+        )
+        _scn().reparent(node, new_parent)
+        self._undo.append(lambda: _scn().reparent(node, old_parent))
+
+
+# ---------------------------------------------------------------------------
+# Plugins
+# ---------------------------------------------------------------------------
+
+
+class MArgList(object):
+    def __init__(self, args=None):
+        self._args = list(args or [])
+
+    def __len__(self):
+        return len(self._args)
+
+
+class MPxCommand(object):
+    """Commands registered by headless plugins are executed right away.
+
+    There is no undo queue outside of Maya, the command is dropped once
+    its ``doIt`` returns.
+    """
+
+    def doIt(self, args):
+        pass
+
+    def isUndoable(self):
+        return False
+
+
+class MFnPlugin(MFnBase):
+    def __init__(self, obj=None, vendor="", version="", apiVersion="Any"):
+        self._node = None
+
+    def registerCommand(self, name, creator, syntax=None):
+        from mop.headless import cmds
+
+        def command(*args, **kwargs):
+            return creator().doIt(MArgList(args))
+
+        command.__name__ = name
+        setattr(cmds, name, command)
+
+    def deregisterCommand(self, name):
+        from mop.headless import cmds
+
+        delattr(cmds, name)
+
+
+# ---------------------------------------------------------------------------
+# Messages
+# ---------------------------------------------------------------------------
+
+
+class MMessage(object):
+    @staticmethod
+    def removeCallback(callback_id):
+        _scn().remove_callback(callback_id)
+
+    @staticmethod
+    def removeCallbacks(callback_ids):
+        for callback_id in callback_ids:
+            _scn().remove_callback(callback_id)
+
+
+class MDGMessage(MMessage):
+    @staticmethod
+    def addNodeAddedCallback(function, nodeType="dependNode", clientData=None):
+        def _callback(node):
+            if nodeType in ("dependNode", node.type) or nodeType in node.inherited:
+                function(MObject(node), clientData)
+
+        return _scn().add_callback("node_added", _callback)
+
+    @staticmethod
+    def addNodeRemovedCallback(function, nodeType="dependNode", clientData=None):
+        def _callback(node):
+            if nodeType in ("dependNode", node.type) or nodeType in node.inherited:
+                function(MObject(node), clientData)
+
+        return _scn().add_callback("node_removed", _callback)
+
+
+class MNodeMessage(MMessage):
+    kConnectionMade = 0x01
+    kConnectionBroken = 0x02
+    kAttributeEval = 0x04
+    kAttributeSet = 0x08
+    kAttributeLocked = 0x10
+    kAttributeUnlocked = 0x20
+    kAttributeAdded = 0x40
+    kAttributeRemoved = 0x80
+    kAttributeRenamed = 0x100
+
+    @staticmethod
+    def addAttributeChangedCallback(node, function, clientData=None):
+        def _callback(changed_node, path, made=None):
+            if made is None:
+                msg = MNodeMessage.kAttributeSet
+            elif made:
+                msg = MNodeMessage.kConnectionMade
+            else:
+                msg = MNodeMessage.kConnectionBroken
+            function(msg, MPlug(changed_node, path), MPlug(), clientData)
+
+        return _scn().add_callback(
+            ("attribute_changed", "connection"), _callback, key=node._node
+        )
+
+    @staticmethod
+    def addNameChangedCallback(node, function, clientData=None):
+        def _callback(renamed_node, old_name):
+            function(MObject(renamed_node), old_name, clientData)
+
+        return _scn().add_callback("node_renamed", _callback, key=node._node)
+
+
+class MSceneMessage(MMessage):
+    kSceneUpdate = 0
+    kBeforeNew = 1
+    kAfterNew = 2
+    kBeforeImport = 3
+    kAfterImport = 4
+    kBeforeOpen = 5
+    kAfterOpen = 6
+
+    _events = {
+        kBeforeNew: "beforeNew",
+        kAfterNew: "afterNew",
+        kBeforeOpen: "beforeOpen",
+        kAfterOpen: "afterOpen",
+    }
+
+    @staticmethod
+    def addCallback(message, function, clientData=None):
+        event = MSceneMessage._events.get(message)
+
+        def _callback(name):
+            if name == event:
+                function(clientData)
+
+        return _scn().add_callback("scene", _callback)
+
+
+class MEventMessage(MMessage):
+    @staticmethod
+    def addEventCallback(event, function, clientData=None):
+        def _callback(name):
+            if name == event:
+                function(clientData)
+
+        return _scn().add_callback("event", _callback)
@@ -0,0 +1,50 @@
+"""In-memory stand-in for the parts of Maya used by `mop`.
+
+Setting the ``MOP_HEADLESS`` environment variable before importing `mop`
+installs it in place of the ``maya`` package, so rigs can be built and
+benchmarked outside of a Maya session::
+
+    MOP_HEADLESS=1 python -c "import mop; from mop.core.rig import Rig; Rig()"
+
+Only the commands and flags `mop` relies on are implemented. Transform
+matrices and the matrix utility nodes used by `mop` are evaluated, other
+nodes, constraints included, do not drive their outputs.
+"""
+
+import sys
+import types
+
+from mop.headless import scene
+
+
+def install():
+    """Register the headless modules as ``maya``, ``maya.cmds`` and friends."""
+    if "maya" in sys.modules and not getattr(sys.modules["maya"], "headless", False):
+        return
+    from mop.headless import cmds, mel, OpenMaya
+
+    maya = types.ModuleType("maya")
+    maya.headless = True
+    maya.__path__ = []
+    api = types.ModuleType("maya.api")
+    api.__path__ = []
+    api.OpenMaya = OpenMaya
+    maya.cmds = cmds
+    maya.mel = mel
+    maya.api = api
+    sys.modules.update(
+        {
+            "maya": maya,
+            "maya.cmds": cmds,
+            "maya.mel": mel,
+            "maya.api": api,
+            "maya.api.OpenMaya": OpenMaya,
+        }
+    )
+    # the deferred commands run in __main__, where userSetup.py imports cmds.
+    vars(sys.modules["__main__"]).setdefault("cmds", cmds)
+
+
+def new_scene():
+    """Start a new empty headless scene."""
+    return scene.new_scene()
@@ -0,0 +1,1016 @@
+"""Headless implementation of the ``maya.cmds`` commands used by `mop`.
+
+Only the flags `mop` relies on are implemented. Unsupported commands
+raise a :class:`NotImplementedError` to make missing coverage obvious.
+"""
+
+import functools
+import imp
+import os
+import re
+import sys
+
+from mop.headless import OpenMaya
+from mop.headless import scene as _scene
+from mop.headless.scene import AttrDef, split_path
+
+try:
+    basestring
+except NameError:
+    basestring = str
+
+
+_CV_REGEX = re.compile(r"^(?P<shape>[^.]+)\.cv\[(?P<index>\d+|\*)\]$")
+
+
+def _flag(kwargs, long_name, short_name=None, default=None):
+    if long_name in kwargs:
+        return kwargs[long_name]
+    if short_name is not None and short_name in kwargs:
+        return kwargs[short_name]
+    return default
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    if not isinstance(value, basestring) and hasattr(value, "__iter__"):
+        result = []
+        for item in value:
+            result.extend(_as_list(item))
+        return result
+    return [value]
+
+
+def _scn():
+    return _scene.current()
+
+
+def _names(nodes):
+    return [n.name for n in nodes] or None
+
+
+def _plug_name(node, path):
+    return node.name + "." + path
+
+
+# ---------------------------------------------------------------------------
+# Nodes
+# ---------------------------------------------------------------------------
+
+
+def createNode(node_type, name=None, parent=None, skipSelect=True, **kwargs):
+    scene = _scn()
+    name = name or kwargs.get("n")
+    parent = parent or kwargs.get("p")
+    parent_node = scene.node_or_raise(parent) if parent else None
+    _, is_dag, is_shape = _scene.type_info(node_type)
+    if is_shape and parent_node is None:
+        parent_node = scene.create_node("transform", name=node_type + "1")
+    node = scene.create_node(node_type, name=name, parent=parent_node)
+    return node.name
+
+
+def objExists(name):
+    scene = _scn()
+    if not name:
+        return False
+    if "." in name:
+        return scene.plug_exists(name)
+    return scene.get(name) is not None
+
+
+def ls(*patterns, **kwargs):
+    scene = _scn()
+    if _flag(kwargs, "selection", "sl"):
+        nodes = list(scene.selection)
+        return [n.name for n in nodes]
+    patterns = _as_list(patterns)
+    components = []
+    node_patterns = []
+    for pattern in patterns:
+        match = _CV_REGEX.match(pattern)
+        if match:
+            shape = scene.node_or_raise(match.group("shape"))
+            if match.group("index") == "*":
+                indices = range(len(shape.cvs))
+            else:
+                indices = [int(match.group("index"))]
+            components.extend("{}.cv[{}]".format(shape.name, i) for i in indices)
+        else:
+            node_patterns.append(pattern)
+    if components and not node_patterns:
+        return components
+    node_type = _flag(kwargs, "type", "typ")
+    if patterns and not node_patterns:
+        return components
+    nodes = scene.ls(node_patterns or None, node_type)
+    return components + [n.name for n in nodes]
+
+
+def delete(*nodes, **kwargs):
+    scene = _scn()
+    to_delete = []
+    for name in _as_list(nodes):
+        if "." in name:
+            continue
+        node = scene.get(name)
+        if node is None:
+            raise ValueError("No object matches name: {}".format(name))
+        to_delete.append(node)
+    for node in to_delete:
+        scene.delete(node)
+
+
+def rename(*args, **kwargs):
+    scene = _scn()
+    if len(args) == 1:
+        node = scene.selection[0]
+        new_name = args[0]
+    else:
+        node = scene.node_or_raise(args[0])
+        new_name = args[1]
+    old_name = node.name
+    new_name = scene.rename(node, new_name)
+    if not _flag(kwargs, "ignoreShape", "is"):
+        # like maya, rename the shapes named after their transform.
+        for child in node.children:
+            if child.is_shape and child.name.startswith(old_name + "Shape"):
+                scene.rename(child, new_name + child.name[len(old_name) :])
+    return new_name
+
+
+def nodeType(name, inherited=False, isTypeName=False, **kwargs):
+    if isTypeName:
+        inherited_types, _, _ = _scene.type_info(name)
+        return inherited_types if inherited else name
+    node = _scn().node_or_raise(name.split(".")[0])
+    if inherited:
+        return list(node.inherited)
+    return node.type
+
+
+def objectType(name, isType=None, isAType=None, **kwargs):
+    node = _scn().node_or_raise(name)
+    if isType is not None:
+        return node.type == isType
+    if isAType is not None:
+        return node.type == isAType or isAType in node.inherited
+    return node.type
+
+
+def select(*nodes, **kwargs):
+    scene = _scn()
+    if _flag(kwargs, "clear", "cl"):
+        scene.selection = []
+        return
+    selection = [scene.node_or_raise(n) for n in _as_list(nodes)]
+    if _flag(kwargs, "add"):
+        scene.selection.extend(n for n in selection if n not in scene.selection)
+    else:
+        scene.selection = selection
+
+
+def lockNode(*args, **kwargs):
+    return
+
+
+def hide(*args, **kwargs):
+    for name in _as_list(args):
+        setAttr(name + ".visibility", False)
+
+
+# ---------------------------------------------------------------------------
+# DAG
+# ---------------------------------------------------------------------------
+
+
+def listRelatives(*nodes, **kwargs):
+    scene = _scn()
+    names = _as_list(nodes) or [n.name for n in scene.selection]
+    node_type = _flag(kwargs, "type", "typ")
+    result = []
+    for name in names:
+        node = scene.node_or_raise(name)
+        if _flag(kwargs, "parent", "p"):
+            related = [node.parent] if node.parent is not None else []
+        elif _flag(kwargs, "allDescendents", "ad"):
+            related = list(reversed(scene.descendants(node)))
+        else:
+            related = list(node.children)
+        if _flag(kwargs, "shapes", "s"):
+            related = [n for n in related if n.is_shape]
+        if node_type:
+            types = _as_list(node_type)
+            related = [n for n in related if set(types) & set(n.inherited)]
+        for rel in related:
+            if rel not in result:
+                result.append(rel)
+    return _names(result)
+
+
+def parent(*args, **kwargs):
+    scene = _scn()
+    names = _as_list(args)
+    world = _flag(kwargs, "world", "w")
+    relative = _flag(kwargs, "relative", "r")
+    shape = _flag(kwargs, "shape", "s")
+    if world:
+        children, new_parent = names, None
+    else:
+        children, new_parent = names[:-1], scene.node_or_raise(names[-1])
+    result = []
+    for name in children:
+        node = scene.node_or_raise(name)
+        if node.parent is new_parent:
+            raise RuntimeError(
+                "Object '{}' is already a child of '{}'.".format(
+                    node.name, new_parent.name if new_parent else "world"
+                )
+            )
+        if node.is_shape and not shape and new_parent is not None:
+            raise RuntimeError("Use the -shape flag to parent shapes.")
+        scene.reparent(node, new_parent, keep_world=not relative)
+        result.append(node.name)
+    return result
+
+
+def duplicate(*nodes, **kwargs):
+    scene = _scn()
+    originals = [scene.node_or_raise(n) for n in _as_list(nodes)]
+    parent_only = _flag(kwargs, "parentOnly", "po")
+    new_nodes = {}
+    result = []
+    for orig in originals:
+        new = scene.create_node(orig.type, name=orig.name)
+        for name, attr in orig.attrs.items():
+            if name not in new.attrs:
+                new.attrs[name] = attr.copy()
+        new.values = dict(orig.values)
+        # connections are not duplicated, keep their evaluated values.
+        for key in orig.inputs:
+            attr = scene.attr_of(orig, key)
+            value = scene.get_value(orig, key)
+            if attr.type == "compound":
+                for child, child_value in zip(attr.children, value):
+                    new.values[_scene.child_path(key, child)] = child_value
+            elif attr.type != "message":
+                new.values[key] = value
+        new.locks = dict(orig.locks)
+        new.flags = dict(orig.flags)
+        new.cvs = [list(cv) for cv in orig.cvs]
+        new.knots = list(orig.knots)
+        new_nodes[orig] = new
+        result.append(new.name)
+    for orig in originals:
+        new = new_nodes[orig]
+        new_parent = new_nodes.get(orig.parent, orig.parent)
+        if new_parent is not None:
+            scene.reparent(new, new_parent)
+        if not parent_only:
+            for child in orig.children:
+                if child not in new_nodes:
+                    result.extend(duplicate(child.name))
+                    scene.reparent(scene.get(result[-1]), new)
+    return result
+
+
+def xform(*nodes, **kwargs):
+    scene = _scn()
+    names = _as_list(nodes) or [n.name for n in scene.selection]
+    query = _flag(kwargs, "query", "q")
+    world = _flag(kwargs, "worldSpace", "ws")
+    matrix = _flag(kwargs, "matrix", "m")
+    translation = _flag(kwargs, "translation", "t")
+    rotation = _flag(kwargs, "rotation", "ro")
+    scale = _flag(kwargs, "scale", "s")
+
+    if query:
+        name = names[0]
+        cv_match = _CV_REGEX.match(name)
+        if cv_match:
+            shape = scene.node_or_raise(cv_match.group("shape"))
+            return list(shape.cvs[int(cv_match.group("index"))])
+        node = scene.node_or_raise(name)
+        if world:
+            mat = scene.world_matrix(node)
+        else:
+            mat = scene.local_matrix(node)
+        if matrix:
+            return mat
+        if translation:
+            return mat[12:15]
+        if rotation:
+            if world:
+                return _scene.decompose(mat)[1]
+            return list(scene.get_value(node, "rotate"))
+        if scale:
+            return _scene.decompose(mat)[2]
+        raise NotImplementedError("Unsupported xform query: {}".format(kwargs))
+
+    for name in names:
+        node = scene.node_or_raise(name)
+        if matrix is not None:
+            mat = [float(v) for v in matrix]
+            if world:
+                scene.set_world_matrix(node, mat)
+            else:
+                scene.set_local_matrix(node, mat)
+            continue
+        if world:
+            current = scene.world_matrix(node)
+        else:
+            current = scene.local_matrix(node)
+        translate, rotate, scl = _scene.decompose(current)
+        if translation is not None:
+            translate = list(translation)
+        if rotation is not None:
+            rotate = list(rotation)
+        if scale is not None:
+            scl = list(scale)
+        new_mat = _scene.compose(translate, rotate, scl)
+        if world:
+            scene.set_world_matrix(node, new_mat)
+        else:
+            scene.set_local_matrix(node, new_mat)
+
+
+def makeIdentity(*nodes, **kwargs):
+    scene = _scn()
+    for name in _as_list(nodes):
+        node = scene.node_or_raise(name)
+        for desc in [node] + scene.descendants(node):
+            if desc.type != "joint" or not _flag(kwargs, "rotate", "r"):
+                continue
+            local = _scene.compose(
+                [0, 0, 0],
+                scene.get_value(desc, "rotate"),
+                [1, 1, 1],
+                scene.get_value(desc, "jointOrient"),
+            )
+            scene.set_value(desc, "jointOrient", _scene.matrix_to_euler(local))
+            scene.set_value(desc, "rotate", (0.0, 0.0, 0.0))
+
+
+def spaceLocator(name=None, **kwargs):
+    scene = _scn()
+    name = name or kwargs.get("n") or "locator1"
+    transform = scene.create_node("transform", name=name)
+    scene.create_node("locator", name=transform.name + "Shape", parent=transform)
+    return [transform.name]
+
+
+def curve(degree=1, point=None, **kwargs):
+    scene = _scn()
+    degree = kwargs.get("d", degree)
+    points = point or kwargs.get("p") or []
+    transform = scene.create_node("transform", name=kwargs.get("name", "curve1"))
+    shape = scene.create_node("nurbsCurve", name="curveShape1", parent=transform)
+    shape.cvs = [[float(v) for v in p] for p in points]
+    shape.knots = [float(i) for i in range(len(points) + degree - 1)]
+    scene.set_value(shape, "degree", degree)
+    return transform.name
+
+
+def ikHandle(startJoint=None, endEffector=None, **kwargs):
+    scene = _scn()
+    start = scene.node_or_raise(startJoint or kwargs.get("sj"))
+    end = scene.node_or_raise(endEffector or kwargs.get("ee"))
+    effector = scene.create_node("ikEffector", name="effector1", parent=end.parent)
+    handle = scene.create_node("ikHandle", name=kwargs.get("name", "ikHandle1"))
+    scene.set_world_matrix(handle, scene.world_matrix(end))
+    scene.connect((start, "message"), (handle, "startJoint"))
+    scene.connect((effector, "message"), (handle, "endEffector"))
+    return [handle.name, effector.name]
+
+
+def _constraint(constraint_type, args, kwargs):
+    scene = _scn()
+    names = _as_list(args)
+    driven = scene.node_or_raise(names[-1])
+    node = scene.create_node(
+        constraint_type,
+        name="{}_{}1".format(driven.name, constraint_type),
+        parent=driven,
+    )
+    for index, driver in enumerate(names[:-1]):
+        driver = scene.node_or_raise(driver)
+        target = "target[{}]".format(index)
+        scene.add_element(node, target)
+        scene.connect((driver, "message"), (node, target))
+    return [node.name]
+
+
+def pointConstraint(*args, **kwargs):
+    return _constraint("pointConstraint", args, kwargs)
+
+
+def parentConstraint(*args, **kwargs):
+    return _constraint("parentConstraint", args, kwargs)
+
+
+def poleVectorConstraint(*args, **kwargs):
+    return _constraint("poleVectorConstraint", args, kwargs)
+
+
+def dagPose(*nodes, **kwargs):
+    scene = _scn()
+    names = _as_list(nodes)
+    if _flag(kwargs, "query", "q"):
+        poses = []
+        for name in names:
+            node = scene.node_or_raise(name)
+            for dst_node, dst_path in node.outputs.get("message", []):
+                if dst_node.type == "dagPose" and dst_node.name not in poses:
+                    poses.append(dst_node.name)
+        return poses or None
+    if _flag(kwargs, "reset", "rs"):
+        return
+    raise NotImplementedError("Unsupported dagPose call: {}".format(kwargs))
+
+
+def sets(*nodes, **kwargs):
+    scene = _scn()
+    names = _as_list(nodes)
+    if _flag(kwargs, "query", "q"):
+        obj_set = scene.node_or_raise(names[0])
+        return _names(list(obj_set.set_members))
+    add = _flag(kwargs, "add", "add") or _flag(kwargs, "include", "include")
+    remove = _flag(kwargs, "remove", "rm")
+    if add or remove:
+        obj_set = scene.node_or_raise(add or remove)
+        next_indices = {}
+        for name in names:
+            node = scene.node_or_raise(name)
+            attr = "dagSetMembers" if node.is_dag else "dnSetMembers"
+            if add and node not in obj_set.set_members:
+                index = next_indices.get(attr)
+                if index is None:
+                    index = len(scene.elements(obj_set, attr))
+                while "{}[{}]".format(attr, index) in obj_set.inputs:
+                    index += 1
+                scene.connect(
+                    (node, "message"), (obj_set, "{}[{}]".format(attr, index))
+                )
+                next_indices[attr] = index + 1
+            elif remove and node in obj_set.set_members:
+                for key, src in list(obj_set.inputs.items()):
+                    if src[0] is node:
+                        scene.disconnect(src, (obj_set, key))
+        return
+    name = _flag(kwargs, "name", "n") or "set1"
+    obj_set = scene.create_node("objectSet", name=name)
+    if names and not _flag(kwargs, "empty", "em"):
+        sets(names, add=obj_set.name)
+    return obj_set.name
+
+
+# ---------------------------------------------------------------------------
+# Attributes
+# ---------------------------------------------------------------------------
+
+
+_ADD_ATTR_TYPES = {
+    "double": "double",
+    "float": "float",
+    "bool": "bool",
+    "long": "long",
+    "short": "short",
+    "byte": "byte",
+    "enum": "enum",
+    "message": "message",
+    "matrix": "matrix",
+    "doubleLinear": "doubleLinear",
+    "doubleAngle": "doubleAngle",
+}
+
+
+def addAttr(*args, **kwargs):
+    scene = _scn()
+    if _flag(kwargs, "query", "q") or _flag(kwargs, "edit", "e"):
+        node, path = scene.resolve(args[0])
+        attr = scene.attr_of(node, path)
+        if _flag(kwargs, "edit", "e"):
+            default = _flag(kwargs, "defaultValue", "dv")
+            if default is not None:
+                attr.default = default
+            return
+        if _flag(kwargs, "defaultValue", "dv"):
+            return attr.default
+        if _flag(kwargs, "dataType", "dt"):
+            return [attr.data_type] if attr.data_type else None
+        if _flag(kwargs, "attributeType", "at"):
+            return attr.type
+        raise NotImplementedError("Unsupported addAttr query: {}".format(kwargs))
+
+    names = _as_list(args) or [n.name for n in scene.selection]
+    long_name = _flag(kwargs, "longName", "ln")
+    short_name = _flag(kwargs, "shortName", "sn")
+    attr_type = _flag(kwargs, "attributeType", "at")
+    data_type = _flag(kwargs, "dataType", "dt")
+    category = _as_list(_flag(kwargs, "category", "ct"))
+    for name in names:
+        node = scene.node_or_raise(name)
+        if node.find_attr(long_name) is not None:
+            raise RuntimeError(
+                "Found attribute {}.{} already exists.".format(node.name, long_name)
+            )
+        if data_type:
+            resolved_type = "matrix" if data_type == "matrix" else "string"
+        else:
+            resolved_type = _ADD_ATTR_TYPES.get(attr_type, attr_type or "double")
+        attr = AttrDef(
+            long_name,
+            resolved_type,
+            short_name=short_name,
+            default=_flag(kwargs, "defaultValue", "dv"),
+            multi=bool(_flag(kwargs, "multi", "m")),
+            keyable=bool(_flag(kwargs, "keyable", "k")),
+            dynamic=True,
+            category=category,
+            enum_names=_flag(kwargs, "enumName", "en"),
+            data_type=data_type,
+            index_matters=_flag(kwargs, "indexMatters", "im", True),
+            nice_name=_flag(kwargs, "niceName", "nn"),
+        )
+        attr.min_value = _flag(kwargs, "minValue", "min")
+        attr.max_value = _flag(kwargs, "maxValue", "max")
+        if resolved_type in ("double3", "float3"):
+            child_type = resolved_type[:-1]
+            attr.type = "compound"
+            attr.children = [long_name + axis for axis in "XYZ"]
+            node.add_attr(attr)
+            for child in attr.children:
+                node.add_attr(
+                    AttrDef(child, child_type, parent=long_name, dynamic=True)
+                )
+        else:
+            node.add_attr(attr)
+        scene.emit("attribute_changed", node, node, long_name)
+
+
+def deleteAttr(*args, **kwargs):
+    scene = _scn()
+    attribute = _flag(kwargs, "attribute", "at")
+    if attribute:
+        node_name = _flag(kwargs, "name", "n") or args[0]
+        node = scene.node_or_raise(node_name)
+        path = attribute
+    else:
+        node, path = scene.resolve(args[0])
+    attr = node.find_attr(path)
+    if attr is None or not attr.dynamic:
+        raise RuntimeError("Cannot delete attribute {}.{}".format(node.name, path))
+    node.remove_attr(attr.name)
+    scene.emit("attribute_changed", node, node, attr.name)
+
+
+def renameAttr(plug, new_name):
+    scene = _scn()
+    node, path = scene.resolve(plug)
+    attr = node.attrs.pop(path)
+    old = attr.name
+    attr.name = new_name
+    attr.short_name = new_name
+    node.attrs[new_name] = attr
+    scene.dirty()
+
+    def _renamed(key):
+        if key == old or key.startswith(old + "[") or key.startswith(old + "."):
+            return new_name + key[len(old) :]
+        return key
+
+    for store_name in ("values", "locks", "elements"):
+        store = getattr(node, store_name)
+        setattr(node, store_name, {_renamed(k): v for k, v in store.items()})
+    node.flags = {(_renamed(k[0]), k[1]): v for k, v in node.flags.items()}
+    for key in list(node.inputs):
+        new_key = _renamed(key)
+        if new_key != key:
+            src = node.inputs.pop(key)
+            node.inputs[new_key] = src
+            outputs = src[0].outputs[src[1]]
+            outputs[outputs.index((node, key))] = (node, new_key)
+    for key in list(node.outputs):
+        new_key = _renamed(key)
+        if new_key != key:
+            dsts = node.outputs.pop(key)
+            node.outputs[new_key] = dsts
+            for dst_node, dst_path in dsts:
+                dst_node.inputs[dst_path] = (node, new_key)
+    return new_name
+
+
+def attributeQuery(name, node=None, exists=False, **kwargs):
+    scene = _scn()
+    target = scene.get(node)
+    if exists:
+        if target is None:
+            return False
+        return target.find_attr(name) is not None
+    if target is None:
+        raise ValueError("No object matches name: {}".format(node))
+    attr = target.find_attr(name)
+    if attr is None:
+        raise RuntimeError("No attribute named {}".format(name))
+    if _flag(kwargs, "listEnum", "le"):
+        return [attr.enum_names or ""]
+    if _flag(kwargs, "keyable", "k"):
+        return attr.keyable
+    if _flag(kwargs, "channelBox", "cb"):
+        return attr.channel_box
+    if _flag(kwargs, "multi", "m"):
+        return attr.multi
+    if _flag(kwargs, "attributeType", "at"):
+        return attr.type
+    if _flag(kwargs, "listDefault", "ld"):
+        return [attr.default]
+    raise NotImplementedError("Unsupported attributeQuery: {}".format(kwargs))
+
+
+def listAttr(*nodes, **kwargs):
+    scene = _scn()
+    names = _as_list(nodes)
+    category = _flag(kwargs, "category", "ct")
+    user_defined = _flag(kwargs, "userDefined", "ud")
+    keyable = _flag(kwargs, "keyable", "k")
+    multi = _flag(kwargs, "multi", "m")
+    write = _flag(kwargs, "write", "w")
+    has_data = _flag(kwargs, "hasData", "hd")
+    result = []
+    for name in names:
+        node, path = (
+            scene.resolve(name) if "." in name else (scene.node_or_raise(name), None)
+        )
+        for attr in node.attrs.values():
+            if path is not None and attr.name != path:
+                continue
+            if category and category not in attr.category:
+                continue
+            if user_defined and not attr.dynamic:
+                continue
+            if keyable and not scene.get_flag(node, attr.name, "keyable"):
+                continue
+            if write and not attr.writable:
+                continue
+            if has_data and attr.type == "message":
+                continue
+            if multi and attr.multi and not attr.parent:
+                result.extend(
+                    "{}[{}]".format(attr.name, index)
+                    for index in scene.elements(node, attr.name)
+                )
+                continue
+            result.append(attr.name)
+    return result or None
+
+
+def getAttr(plug, **kwargs):
+    scene = _scn()
+    node_name, _, path = plug.partition(".")
+    node = scene.node_or_raise(node_name)
+    segments = split_path(path)
+    if segments[-1][1] == "*":
+        multi_path = scene.normalize(
+            node, _scene.join_path(segments[:-1] + [(segments[-1][0], None)])
+        )
+        return [
+            scene.get_value(node, "{}[{}]".format(multi_path, i))
+            for i in scene.elements(node, multi_path)
+        ]
+    path = scene.normalize(node, path)
+    attr = scene.attr_of(node, path)
+
+    if _flag(kwargs, "size", "s"):
+        if not attr.multi:
+            return 0
+        return len(scene.elements(node, path))
+    if _flag(kwargs, "lock", "l"):
+        return scene.is_locked(node, path)
+    if _flag(kwargs, "keyable", "k"):
+        return scene.get_flag(node, path, "keyable")
+    if _flag(kwargs, "channelBox", "cb"):
+        return scene.get_flag(node, path, "channelBox")
+    if _flag(kwargs, "type", "typ"):
+        return attr.data_type or attr.type
+
+    if attr.multi and split_path(path)[-1][1] is None:
+        if attr.name in (
+            "worldMatrix",
+            "worldInverseMatrix",
+            "parentMatrix",
+            "parentInverseMatrix",
+        ):
+            return scene.get_value(node, path + "[0]")
+        return [
+            scene.get_value(node, "{}[{}]".format(path, i))
+            for i in scene.elements(node, path)
+        ]
+    value = scene.get_value(node, path)
+    if attr.type == "compound":
+        return [value]
+    if attr.type == "enum" and _flag(kwargs, "asString", "asString"):
+        names = (attr.enum_names or "").rstrip(":").split(":")
+        names = [n.split("=")[0] for n in names]
+        return names[value] if 0 <= value < len(names) else None
+    if attr.unit and attr.type == "doubleAngle":
+        return float(value)
+    return value
+
+
+def setAttr(plug, *values, **kwargs):
+    scene = _scn()
+    node, path = scene.resolve(plug)
+    attr = scene.attr_of(node, path)
+    flags = False
+    lock = _flag(kwargs, "lock", "l")
+    if lock is not None:
+        node.locks[path] = bool(lock)
+        flags = True
+    keyable = _flag(kwargs, "keyable", "k")
+    if keyable is not None:
+        scene.set_flag(node, path, "keyable", keyable)
+        flags = True
+    channel_box = _flag(kwargs, "channelBox", "cb")
+    if channel_box is not None:
+        scene.set_flag(node, path, "channelBox", channel_box)
+        flags = True
+    if not values:
+        if flags:
+            return
+        raise RuntimeError("setAttr: No value given for {}".format(plug))
+    if lock is None and scene.is_locked(node, path):
+        raise RuntimeError(
+            "setAttr: The attribute '{}' is locked or connected "
+            "and cannot be modified.".format(plug)
+        )
+    if path in node.inputs:
+        raise RuntimeError(
+            "setAttr: The attribute '{}' is locked or connected "
+            "and cannot be modified.".format(plug)
+        )
+    data_type = _flag(kwargs, "type", "typ")
+    if len(values) == 1:
+        value = values[0]
+        if (
+            attr.type == "compound"
+            and isinstance(value, (list, tuple))
+            and value
+            and isinstance(value[0], (list, tuple))
+        ):
+            value = value[0]
+    else:
+        value = values
+    if data_type == "matrix" or attr.type == "matrix":
+        value = [float(v) for v in value]
+    elif data_type == "string" and value is not None:
+        value = str(value)
+    scene.set_value(node, path, value)
+
+
+def connectAttr(src, dst, force=False, nextAvailable=False, **kwargs):
+    scene = _scn()
+    force = force or kwargs.get("f", False)
+    nextAvailable = nextAvailable or kwargs.get("na", False)
+    src_node, src_path = scene.resolve(src)
+    dst_node, dst_path = scene.resolve(dst)
+    attr = scene.attr_of(dst_node, dst_path)
+    if nextAvailable and attr.multi and split_path(dst_path)[-1][1] is None:
+        index = 0
+        while "{}[{}]".format(dst_path, index) in dst_node.inputs:
+            index += 1
+        dst_path = "{}[{}]".format(dst_path, index)
+    scene.connect((src_node, src_path), (dst_node, dst_path), force=force)
+
+
+def disconnectAttr(src, dst, **kwargs):
+    scene = _scn()
+    src_node, src_path = scene.resolve(src)
+    dst_node, dst_path = scene.resolve(dst)
+    scene.disconnect((src_node, src_path), (dst_node, dst_path))
+
+
+def isConnected(src, dst, **kwargs):
+    scene = _scn()
+    src_node, src_path = scene.resolve(src)
+    dst_node, dst_path = scene.resolve(dst)
+    return dst_node.inputs.get(dst_path) == (src_node, src_path)
+
+
+def connectionInfo(
+    plug, sourceFromDestination=False, destinationFromSource=False, **kwargs
+):
+    scene = _scn()
+    node, path = scene.resolve(plug)
+    if sourceFromDestination or kwargs.get("sfd"):
+        src = node.inputs.get(path)
+        return _plug_name(*src) if src else ""
+    if destinationFromSource or kwargs.get("dfs"):
+        return [_plug_name(*d) for d in node.outputs.get(path, [])]
+    if kwargs.get("isDestination") or kwargs.get("id"):
+        return path in node.inputs
+    if kwargs.get("isSource") or kwargs.get("is"):
+        return bool(node.outputs.get(path))
+    raise NotImplementedError("Unsupported connectionInfo: {}".format(kwargs))
+
+
+def _matches_path(key, path):
+    return (
+        path is None
+        or key == path
+        or key.startswith(path + "[")
+        or key.startswith(path + ".")
+    )
+
+
+def listConnections(*args, **kwargs):
+    scene = _scn()
+    names = _as_list(args)
+    source = _flag(kwargs, "source", "s")
+    destination = _flag(kwargs, "destination", "d")
+    if source is None and destination is None:
+        source = destination = True
+    source = bool(source) if source is not None else not destination
+    destination = bool(destination) if destination is not None else not source
+    plugs = _flag(kwargs, "plugs", "p")
+    connections = _flag(kwargs, "connections", "c")
+    shapes = _flag(kwargs, "shapes", "sh")
+    node_type = _flag(kwargs, "type", "t")
+
+    result = []
+    for name in names:
+        if "." in name:
+            node, path = scene.resolve(name)
+        else:
+            node, path = scene.node_or_raise(name), None
+        found = []
+        if source:
+            for key in sorted(node.inputs, key=_sort_key):
+                if _matches_path(key, path):
+                    found.append((key, node.inputs[key]))
+        if destination:
+            for key in sorted(node.outputs, key=_sort_key):
+                if _matches_path(key, path):
+                    for dst in node.outputs[key]:
+                        found.append((key, dst))
+        for key, (other, other_path) in found:
+            if node_type and node_type not in other.inherited:
+                continue
+            if plugs:
+                other_name = _plug_name(other, other_path)
+            else:
+                target = other
+                if other.is_shape and not shapes and other.parent is not None:
+                    target = other.parent
+                other_name = target.name
+            if connections:
+                result.append(_plug_name(node, key))
+            result.append(other_name)
+    return result or None
+
+
+def _sort_key(key):
+    parts = re.split(r"\[(\d+)\]", key)
+    return [int(p) if p.isdigit() else p for p in parts]
+
+
+def removeMultiInstance(plug, b=False, allChildren=False, **kwargs):
+    scene = _scn()
+    node, path = scene.resolve(plug)
+    if split_path(path)[-1][1] is None:
+        for index in scene.elements(node, path):
+            scene.remove_element(node, "{}[{}]".format(path, index))
+        return
+    if not b:
+        for key in list(node.inputs):
+            if _matches_path(key, path):
+                raise RuntimeError("Cannot remove connected element {}".format(plug))
+    scene.remove_element(node, path)
+
+
+# ---------------------------------------------------------------------------
+# Misc
+# ---------------------------------------------------------------------------
+
+
+def undoInfo(*args, **kwargs):
+    scene = _scn()
+    if _flag(kwargs, "openChunk", "ock"):
+        scene.undo_chunks += 1
+    elif _flag(kwargs, "closeChunk", "cck"):
+        scene.undo_chunks -= 1
+    elif _flag(kwargs, "query", "q"):
+        return True
+
+
+def file(*args, **kwargs):
+    scene = _scn()
+    if _flag(kwargs, "query", "q"):
+        if _flag(kwargs, "sceneName", "sn") or _flag(kwargs, "location", "l"):
+            return scene.scene_name
+        return None
+    if _flag(kwargs, "rename", "rn"):
+        scene.scene_name = _flag(kwargs, "rename", "rn")
+        return scene.scene_name
+    if _flag(kwargs, "new", "f"):
+        _scene.new_scene()
+        return
+    if _flag(kwargs, "save", "s"):
+        return scene.scene_name
+
+
+def error(message):
+    raise RuntimeError(message)
+
+
+def warning(message):
+    return
+
+
+def evalDeferred(command, **kwargs):
+    if callable(command):
+        command()
+    else:
+        # like maya, run in the globals of __main__, see `mop.headless.install`.
+        exec(command, sys.modules["__main__"].__dict__)
+
+
+def scriptJob(**kwargs):
+    if _flag(kwargs, "kill", "k") is not None:
+        return
+    return 1
+
+
+_plugins = {}
+
+
+def _plugin_name(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def pluginInfo(*args, **kwargs):
+    if args and (_flag(kwargs, "loaded", "l") or _flag(kwargs, "registered", "r")):
+        return _plugin_name(args[0]) in _plugins
+    return False
+
+
+def loadPlugin(*args, **kwargs):
+    """Load the python plugins given by path, other plugins are ignored."""
+    loaded = []
+    for path in _as_list(args):
+        name = _plugin_name(path)
+        if not path.endswith(".py") or not os.path.isfile(path):
+            continue
+        if name not in _plugins:
+            plugin = imp.load_source("_headless_plugin_" + name, path)
+            plugin.initializePlugin(OpenMaya.MObject())
+            _plugins[name] = plugin
+        loaded.append(name)
+    return loaded or None
+
+
+def unloadPlugin(*args, **kwargs):
+    for path in _as_list(args):
+        plugin = _plugins.pop(_plugin_name(path), None)
+        if plugin is not None:
+            plugin.uninitializePlugin(OpenMaya.MObject())
+
+
+def setKeyframe(*args, **kwargs):
+    return 0
+
+
+def keyframe(*args, **kwargs):
+    return None
+
+
+def playbackOptions(*args, **kwargs):
+    return 0.0
+
+
+def refresh(*args, **kwargs):
+    return
+
+
+def currentTime(*args, **kwargs):
+    return args[0] if args else 0.0
+
+
+def _accept_plugs(func):
+    """Like maya, accept the `OpenMaya.MPlug` arguments as plug names."""
+
+    @functools.wraps(func)
+    def wrapped(*args, **kwargs):
+        args = [str(arg) if isinstance(arg, OpenMaya.MPlug) else arg for arg in args]
+        return func(*args, **kwargs)
+
+    return wrapped
+
+
+for _name, _func in list(globals().items()):
+    if (
+        not _name.startswith("_")
+        and callable(_func)
+        and getattr(_func, "__module__", None) == __name__
+    ):
+        globals()[_name] = _accept_plugs(_func)
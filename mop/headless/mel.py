@@ -0,0 +1,6 @@
+"""Headless implementation of ``maya.mel``."""
+
+
+def eval(command):
+    """MEL is not available headless, commands are ignored."""
+    return None
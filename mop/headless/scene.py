@@ -0,0 +1,1308 @@
+"""In-memory dependency graph used by the headless backend.
+
+The scene only models what `mop` needs to run: nodes and DAG
+parenting, static and dynamic attributes, multi attributes,
+connections and transform matrices.
+
+Plugs are pulled on demand through their input connections and the
+results are cached until the scene is edited. Transform matrices and the
+multMatrix, inverseMatrix, decomposeMatrix, composeMatrix and choice nodes are
+computed, the outputs of any other node keep their default values.
+"""
+
+import fnmatch
+import itertools
+import math
+import re
+from collections import OrderedDict
+
+IDENTITY = [
+    1.0,
+    0.0,
+    0.0,
+    0.0,
+    0.0,
+    1.0,
+    0.0,
+    0.0,
+    0.0,
+    0.0,
+    1.0,
+    0.0,
+    0.0,
+    0.0,
+    0.0,
+    1.0,
+]
+
+_ELEMENT_REGEX = re.compile(r"^(?P<name>[^\[\]]+)(?:\[(?P<index>-?\d+|\*)\])?$")
+_TRAILING_DIGITS = re.compile(r"^(?P<base>.*?)(?P<digits>\d*)$")
+_UNSET = object()
+
+
+# ---------------------------------------------------------------------------
+# Matrix helpers. Matrices are flat lists of 16 floats, row major, using
+# Maya's row vector convention (``child_world = local * parent_world``).
+# ---------------------------------------------------------------------------
+
+
+def mat_mult(a, b):
+    res = [0.0] * 16
+    for row in range(4):
+        for col in range(4):
+            res[row * 4 + col] = (
+                a[row * 4] * b[col]
+                + a[row * 4 + 1] * b[4 + col]
+                + a[row * 4 + 2] * b[8 + col]
+                + a[row * 4 + 3] * b[12 + col]
+            )
+    return res
+
+
+def mat_inverse(m):
+    size = 4
+    aug = [
+        list(m[row * 4 : row * 4 + 4]) + IDENTITY[row * 4 : row * 4 + 4]
+        for row in range(size)
+    ]
+    for col in range(size):
+        pivot = max(range(col, size), key=lambda r: abs(aug[r][col]))
+        if abs(aug[pivot][col]) < 1e-12:
+            return list(IDENTITY)
+        aug[col], aug[pivot] = aug[pivot], aug[col]
+        factor = aug[col][col]
+        aug[col] = [v / factor for v in aug[col]]
+        for row in range(size):
+            if row == col:
+                continue
+            factor = aug[row][col]
+            if factor:
+                aug[row] = [v - factor * p for v, p in zip(aug[row], aug[col])]
+    res = []
+    for row in range(size):
+        res.extend(aug[row][size:])
+    return res
+
+
+def euler_to_matrix(rotation):
+    """Rotation matrix of ``rotation`` (degrees, xyz rotate order)."""
+    x, y, z = [math.radians(v) for v in rotation]
+    cx, sx = math.cos(x), math.sin(x)
+    cy, sy = math.cos(y), math.sin(y)
+    cz, sz = math.cos(z), math.sin(z)
+    return [
+        cy * cz,
+        cy * sz,
+        -sy,
+        0.0,
+        sx * sy * cz - cx * sz,
+        sx * sy * sz + cx * cz,
+        sx * cy,
+        0.0,
+        cx * sy * cz + sx * sz,
+        cx * sy * sz - sx * cz,
+        cx * cy,
+        0.0,
+        0.0,
+        0.0,
+        0.0,
+        1.0,
+    ]
+
+
+def matrix_to_euler(m):
+    """Euler rotation (degrees, xyz rotate order) of an orthonormal matrix."""
+    sy = max(-1.0, min(1.0, -m[2]))
+    y = math.asin(sy)
+    if abs(math.cos(y)) > 1e-8:
+        x = math.atan2(m[6], m[10])
+        z = math.atan2(m[1], m[0])
+    else:
+        x = math.atan2(-m[9], m[5])
+        z = 0.0
+    return [math.degrees(x), math.degrees(y), math.degrees(z)]
+
+
+def compose(translate, rotate, scale, joint_orient=None):
+    scale_mat = [
+        scale[0],
+        0.0,
+        0.0,
+        0.0,
+        0.0,
+        scale[1],
+        0.0,
+        0.0,
+        0.0,
+        0.0,
+        scale[2],
+        0.0,
+        0.0,
+        0.0,
+        0.0,
+        1.0,
+    ]
+    rot = euler_to_matrix(rotate)
+    if joint_orient is not None:
+        rot = mat_mult(rot, euler_to_matrix(joint_orient))
+    res = mat_mult(scale_mat, rot)
+    res[12], res[13], res[14] = translate
+    return res
+
+
+def decompose(m):
+    """Return the translate, rotate and scale of ``m``."""
+    translate = [m[12], m[13], m[14]]
+    rows = [m[0:3], m[4:7], m[8:11]]
+    scale = [math.sqrt(sum(v * v for v in row)) for row in rows]
+    det = (
+        rows[0][0] * (rows[1][1] * rows[2][2] - rows[1][2] * rows[2][1])
+        - rows[0][1] * (rows[1][0] * rows[2][2] - rows[1][2] * rows[2][0])
+        + rows[0][2] * (rows[1][0] * rows[2][1] - rows[1][1] * rows[2][0])
+    )
+    if det < 0:
+        scale[0] = -scale[0]
+    rot = list(IDENTITY)
+    for i, row in enumerate(rows):
+        for j in range(3):
+            rot[i * 4 + j] = row[j] / scale[i] if scale[i] else 0.0
+    return translate, matrix_to_euler(rot), scale
+
+
+# ---------------------------------------------------------------------------
+# Attributes
+# ---------------------------------------------------------------------------
+
+
+class AttrDef(object):
+    """Definition of an attribute on a node."""
+
+    def __init__(
+        self,
+        name,
+        attr_type="double",
+        short_name=None,
+        default=None,
+        multi=False,
+        children=None,
+        parent=None,
+        keyable=False,
+        channel_box=False,
+        dynamic=False,
+        category=None,
+        enum_names=None,
+        data_type=None,
+        index_matters=True,
+        readable=True,
+        writable=True,
+        nice_name=None,
+    ):
+        self.name = name
+        self.type = attr_type
+        self.short_name = short_name or name
+        if default is None:
+            default = _TYPE_DEFAULTS.get(attr_type)
+        self.default = default
+        self.multi = multi
+        self.children = list(children or [])
+        self.parent = parent
+        self.keyable = keyable
+        self.channel_box = channel_box
+        self.dynamic = dynamic
+        self.category = list(category or [])
+        self.enum_names = enum_names
+        self.data_type = data_type
+        self.index_matters = index_matters
+        self.readable = readable
+        self.writable = writable
+        self.nice_name = nice_name
+        self.min_value = None
+        self.max_value = None
+
+    @property
+    def unit(self):
+        if self.type == "doubleAngle":
+            return "angle"
+        if self.type == "doubleLinear":
+            return "distance"
+        return None
+
+    def copy(self):
+        new = AttrDef.__new__(AttrDef)
+        new.__dict__.update(self.__dict__)
+        new.children = list(self.children)
+        new.category = list(self.category)
+        return new
+
+
+_TYPE_DEFAULTS = {
+    "double": 0.0,
+    "doubleLinear": 0.0,
+    "doubleAngle": 0.0,
+    "float": 0.0,
+    "bool": False,
+    "long": 0,
+    "short": 0,
+    "byte": 0,
+    "enum": 0,
+    "matrix": IDENTITY,
+    "fltMatrix": IDENTITY,
+    "string": None,
+    "message": None,
+    "generic": 0.0,
+}
+
+
+def _compound(name, child_type, suffixes="XYZ", default=0.0, short=None, **kwargs):
+    children = [name + s for s in suffixes]
+    defs = [AttrDef(name, "compound", short_name=short, children=children, **kwargs)]
+    for child in children:
+        defs.append(AttrDef(child, child_type, default=default, parent=name, **kwargs))
+    return defs
+
+
+_LIMITS = []
+for _kind, _type in (
+    ("Trans", "doubleLinear"),
+    ("Rot", "doubleAngle"),
+    ("Scale", "double"),
+):
+    for _axis in "XYZ":
+        for _side in ("max", "min"):
+            _LIMITS.append(AttrDef("{}{}{}Limit".format(_side, _kind, _axis), _type))
+            _LIMITS.append(
+                AttrDef("{}{}{}LimitEnable".format(_side, _kind, _axis), "bool")
+            )
+
+
+def _base_attrs():
+    return [
+        AttrDef("message", "message", short_name="msg"),
+        AttrDef("caching", "bool"),
+        AttrDef("nodeState", "enum"),
+        AttrDef("isHistoricallyInteresting", "byte", default=2),
+    ]
+
+
+def _dag_attrs():
+    attrs = [
+        AttrDef("visibility", "bool", short_name="v", default=True, keyable=True),
+        AttrDef("overrideEnabled", "bool"),
+        AttrDef("overrideDisplayType", "enum"),
+        AttrDef("overrideRGBColors", "bool"),
+        AttrDef("overrideColor", "byte"),
+        AttrDef("worldMatrix", "matrix", short_name="wm", multi=True, writable=False),
+        AttrDef(
+            "worldInverseMatrix", "matrix", short_name="wim", multi=True, writable=False
+        ),
+        AttrDef("parentMatrix", "matrix", short_name="pm", multi=True, writable=False),
+        AttrDef(
+            "parentInverseMatrix",
+            "matrix",
+            short_name="pim",
+            multi=True,
+            writable=False,
+        ),
+        AttrDef("instObjGroups", "message", short_name="iog", multi=True),
+        AttrDef("offsetParentMatrix", "matrix", short_name="opm"),
+    ]
+    rgb = AttrDef(
+        "overrideColorRGB",
+        "compound",
+        children=["overrideColorR", "overrideColorG", "overrideColorB"],
+    )
+    attrs.append(rgb)
+    attrs.extend(AttrDef(c, "float", parent=rgb.name) for c in rgb.children)
+    return attrs
+
+
+def _transform_attrs():
+    attrs = []
+    attrs.extend(_compound("translate", "doubleLinear", short="t", keyable=True))
+    attrs.extend(_compound("rotate", "doubleAngle", short="r", keyable=True))
+    attrs.extend(_compound("scale", "double", default=1.0, short="s", keyable=True))
+    attrs.extend(_compound("shear", "double", suffixes=["XY", "XZ", "YZ"]))
+    attrs.extend(_compound("rotatePivot", "doubleLinear"))
+    attrs.extend(_compound("scalePivot", "doubleLinear"))
+    attrs.extend(
+        [
+            AttrDef("rotateOrder", "enum", short_name="ro"),
+            AttrDef("matrix", "matrix", short_name="m", writable=False),
+            AttrDef("inverseMatrix", "matrix", short_name="im", writable=False),
+            AttrDef("inheritsTransform", "bool", default=True),
+            AttrDef("displayHandle", "bool"),
+        ]
+    )
+    attrs.extend(a.copy() for a in _LIMITS)
+    return attrs
+
+
+def _joint_attrs():
+    attrs = _compound("jointOrient", "doubleAngle", short="jo")
+    attrs.extend(
+        [
+            AttrDef("segmentScaleCompensate", "bool", default=True),
+            AttrDef("radius", "double", default=1.0),
+            AttrDef("bindPose", "message"),
+            AttrDef("drawStyle", "enum"),
+        ]
+    )
+    return attrs
+
+
+def _curve_attrs():
+    return [
+        AttrDef("degree", "long", default=1),
+        AttrDef("spans", "long"),
+        AttrDef("form", "enum"),
+        AttrDef("create", "generic"),
+        AttrDef("local", "generic"),
+        AttrDef("worldSpace", "generic", multi=True),
+    ]
+
+
+def _surface_attrs():
+    return [
+        AttrDef("local", "generic"),
+        AttrDef("worldSpace", "generic", multi=True),
+    ]
+
+
+def _mesh_attrs():
+    return [
+        AttrDef("inMesh", "generic"),
+        AttrDef("outMesh", "generic"),
+        AttrDef("worldMesh", "generic", multi=True),
+    ]
+
+
+def _locator_attrs():
+    attrs = _compound("localPosition", "doubleLinear")
+    attrs.extend(_compound("worldPosition", "doubleLinear"))
+    return attrs
+
+
+def _follicle_attrs():
+    attrs = _compound("outTranslate", "doubleLinear")
+    attrs.extend(_compound("outRotate", "doubleAngle"))
+    attrs.extend(
+        [
+            AttrDef("inputMesh", "generic"),
+            AttrDef("inputSurface", "generic"),
+            AttrDef("inputWorldMatrix", "matrix"),
+            AttrDef("parameterU", "double"),
+            AttrDef("parameterV", "double"),
+        ]
+    )
+    return attrs
+
+
+def _skin_attrs():
+    return [
+        AttrDef("matrix", "matrix", multi=True),
+        AttrDef("bindPreMatrix", "matrix", multi=True),
+        AttrDef("bindPose", "message"),
+    ]
+
+
+def _set_attrs():
+    return [
+        AttrDef("dagSetMembers", "message", multi=True, index_matters=False),
+        AttrDef("dnSetMembers", "message", multi=True, index_matters=False),
+    ]
+
+
+def _constraint_attrs():
+    return [AttrDef("target", "message", multi=True)]
+
+
+def _ik_handle_attrs():
+    attrs = _compound("poleVector", "double")
+    attrs.extend(
+        [
+            AttrDef("startJoint", "message"),
+            AttrDef("endEffector", "message"),
+            AttrDef("twist", "doubleAngle", keyable=True),
+        ]
+    )
+    # ramp of the spring solver.
+    ramp = "springAngleBias"
+    children = [ramp + "_Position", ramp + "_FloatValue", ramp + "_Interp"]
+    attrs.append(AttrDef(ramp, "compound", multi=True, children=children))
+    attrs.append(AttrDef(children[0], "float", parent=ramp))
+    attrs.append(AttrDef(children[1], "float", parent=ramp))
+    attrs.append(AttrDef(children[2], "enum", parent=ramp))
+    return attrs
+
+
+#: node type: (inherited types, is dag, is shape, attribute builders)
+NODE_TYPES = {
+    "transform": (
+        ["containerBase", "entity", "dagNode", "transform"],
+        [_dag_attrs, _transform_attrs],
+    ),
+    "joint": (
+        ["containerBase", "entity", "dagNode", "transform", "joint"],
+        [_dag_attrs, _transform_attrs, _joint_attrs],
+    ),
+    "ikHandle": (
+        ["containerBase", "entity", "dagNode", "transform", "ikHandle"],
+        [_dag_attrs, _transform_attrs, _ik_handle_attrs],
+    ),
+    "ikEffector": (
+        ["containerBase", "entity", "dagNode", "transform", "ikEffector"],
+        [_dag_attrs, _transform_attrs],
+    ),
+    "pointConstraint": (
+        [
+            "containerBase",
+            "entity",
+            "dagNode",
+            "transform",
+            "constraint",
+            "pointConstraint",
+        ],
+        [_dag_attrs, _transform_attrs, _constraint_attrs],
+    ),
+    "parentConstraint": (
+        [
+            "containerBase",
+            "entity",
+            "dagNode",
+            "transform",
+            "constraint",
+            "parentConstraint",
+        ],
+        [_dag_attrs, _transform_attrs, _constraint_attrs],
+    ),
+    "poleVectorConstraint": (
+        [
+            "containerBase",
+            "entity",
+            "dagNode",
+            "transform",
+            "constraint",
+            "pointConstraint",
+            "poleVectorConstraint",
+        ],
+        [_dag_attrs, _transform_attrs, _constraint_attrs],
+    ),
+    "locator": (
+        ["dagNode", "shape", "geometryShape", "locator"],
+        [_dag_attrs, _locator_attrs],
+    ),
+    "follicle": (["dagNode", "shape", "follicle"], [_dag_attrs, _follicle_attrs]),
+    "nurbsCurve": (
+        [
+            "dagNode",
+            "shape",
+            "geometryShape",
+            "deformableShape",
+            "controlPoint",
+            "curveShape",
+            "nurbsCurve",
+        ],
+        [_dag_attrs, _curve_attrs],
+    ),
+    "nurbsSurface": (
+        [
+            "dagNode",
+            "shape",
+            "geometryShape",
+            "deformableShape",
+            "controlPoint",
+            "surfaceShape",
+            "nurbsSurface",
+        ],
+        [_dag_attrs, _surface_attrs],
+    ),
+    "mesh": (
+        [
+            "dagNode",
+            "shape",
+            "geometryShape",
+            "deformableShape",
+            "controlPoint",
+            "surfaceShape",
+            "mesh",
+        ],
+        [_dag_attrs, _mesh_attrs],
+    ),
+    "skinCluster": (["geometryFilter", "skinCluster"], [_skin_attrs]),
+    "objectSet": (["entity", "objectSet"], [_set_attrs]),
+    "dagPose": (
+        ["dagPose"],
+        [
+            lambda: [
+                AttrDef("members", "message", multi=True),
+                AttrDef("bindPose", "bool"),
+            ]
+        ],
+    ),
+}
+
+
+# compound attributes of the utility nodes as ``(suffixes, multi)``, by node
+# type then attribute name. The other attributes of the utility nodes are
+# plain values created on use.
+UTILITY_COMPOUNDS = {
+    "angleBetween": {
+        "vector1": ("XYZ", False),
+        "vector2": ("XYZ", False),
+        "axis": ("XYZ", False),
+    },
+    "condition": {
+        "colorIfTrue": ("RGB", False),
+        "colorIfFalse": ("RGB", False),
+        "outColor": ("RGB", False),
+    },
+    "multiplyDivide": {
+        "input1": ("XYZ", False),
+        "input2": ("XYZ", False),
+        "output": ("XYZ", False),
+    },
+    "plusMinusAverage": {"input3D": ("xyz", True), "output3D": ("xyz", False)},
+}
+
+
+def type_info(node_type):
+    """Return the inherited types and whether ``node_type`` is dag and a shape."""
+    inherited, _ = NODE_TYPES.get(node_type, ([node_type], []))
+    return inherited, "dagNode" in inherited, "shape" in inherited
+
+
+def _build_attrs(node_type):
+    attrs = OrderedDict()
+    _, builders = NODE_TYPES.get(node_type, ([node_type], []))
+    for builder in [_base_attrs] + list(builders):
+        for attr in builder():
+            attrs[attr.name] = attr
+    return attrs
+
+
+# ---------------------------------------------------------------------------
+# Scene
+# ---------------------------------------------------------------------------
+
+
+class Node(object):
+
+    _ids = itertools.count(1)
+
+    def __init__(self, scene, name, node_type):
+        self.scene = scene
+        self.name = name
+        self.type = node_type
+        self.id = next(Node._ids)
+        self.inherited, self.is_dag, self.is_shape = type_info(node_type)
+        self.attrs = _build_attrs(node_type)
+        self.values = {}
+        self.locks = {}
+        self.flags = {}
+        self.elements = {}
+        self.inputs = {}
+        self.outputs = {}
+        self.parent = None
+        self.children = []
+        self.alive = True
+        # nurbs curves control points and knots.
+        self.cvs = []
+        self.knots = []
+        # members of object sets, in the order they were added.
+        self.set_members = OrderedDict()
+
+    def __repr__(self):
+        return "Node(%s)" % self.name
+
+    # -- attributes -------------------------------------------------------
+
+    def find_attr(self, name):
+        attr = self.attrs.get(name)
+        if attr is not None:
+            return attr
+        for attr in self.attrs.values():
+            if attr.short_name == name:
+                return attr
+        return None
+
+    def ensure_attr(self, name, multi=False):
+        """Return the attribute ``name``, creating it on utility nodes."""
+        attr = self.find_attr(name)
+        if attr is None and not self.is_dag and self.type not in NODE_TYPES:
+            compounds = UTILITY_COMPOUNDS.get(self.type, {})
+            for compound, (suffixes, multi) in compounds.items():
+                if name == compound or name in [compound + s for s in suffixes]:
+                    writable = not compound.startswith("out")
+                    attrs = _compound(compound, "double", suffixes, writable=writable)
+                    attrs[0].multi = multi
+                    for attr in attrs:
+                        self.attrs[attr.name] = attr
+                    return self.attrs[name]
+            default = IDENTITY if "matrix" in name.lower() else None
+            # the outputs of the maya utility nodes are read only.
+            writable = not name.startswith("output") and name != "matrixSum"
+            attr = AttrDef(
+                name, "generic", default=default, multi=multi, writable=writable
+            )
+            self.attrs[name] = attr
+        if attr is None:
+            raise ValueError("No object matches name: {}.{}".format(self.name, name))
+        return attr
+
+    def add_attr(self, attr):
+        self.attrs[attr.name] = attr
+
+    def remove_attr(self, name):
+        attr = self.attrs[name]
+        names = set([name] + attr.children)
+        for key in list(self.inputs):
+            if _root_of(key) in names:
+                self.scene.disconnect(self.inputs[key], (self, key))
+        for key in list(self.outputs):
+            if _root_of(key) in names:
+                for dst in list(self.outputs.get(key, [])):
+                    self.scene.disconnect((self, key), dst)
+        for store in (self.values, self.locks, self.elements):
+            for key in list(store):
+                if _root_of(key) in names:
+                    del store[key]
+        for key in list(self.flags):
+            if _root_of(key[0]) in names:
+                del self.flags[key]
+        for child in attr.children:
+            self.attrs.pop(child, None)
+        del self.attrs[name]
+
+
+def _root_of(path):
+    return path.split(".")[0].split("[")[0]
+
+
+_split_paths = {}
+
+
+def split_path(path):
+    """Split an attribute path to a list of ``(name, index)`` tuples."""
+    try:
+        return list(_split_paths[path])
+    except KeyError:
+        pass
+    segments = []
+    for part in path.split("."):
+        match = _ELEMENT_REGEX.match(part)
+        if not match:
+            raise ValueError("Invalid attribute path: {}".format(path))
+        index = match.group("index")
+        if index is not None and index != "*":
+            index = int(index)
+        segments.append((match.group("name"), index))
+    _split_paths[path] = tuple(segments)
+    return segments
+
+
+def child_path(path, child):
+    """Return the path of the ``child`` attribute of the compound ``path``."""
+    segments = split_path(path)
+    if segments[-1][1] is not None:
+        return path + "." + child
+    return join_path(segments[:-1] + [(child, None)])
+
+
+def join_path(segments):
+    parts = []
+    for name, index in segments:
+        if index is None:
+            parts.append(name)
+        else:
+            parts.append("{}[{}]".format(name, index))
+    return ".".join(parts)
+
+
+class Scene(object):
+    def __init__(self):
+        self.nodes = OrderedDict()
+        # parent of the top level dag nodes in OpenMaya, not listed by ls.
+        self.world = Node(self, "world", "world")
+        self.selection = []
+        self.scene_name = ""
+        self.callbacks = {}
+        self._callback_ids = itertools.count(1)
+        self.undo_chunks = 0
+        # evaluated values, cleared whenever the graph changes.
+        self._cache = {}
+
+    # -- callbacks --------------------------------------------------------
+
+    def add_callback(self, events, func, key=None):
+        """Call ``func`` when one of ``events`` is emitted for ``key``."""
+        if isinstance(events, str):
+            events = (events,)
+        callback_id = next(self._callback_ids)
+        self.callbacks[callback_id] = (tuple(events), key, func)
+        return callback_id
+
+    def remove_callback(self, callback_id):
+        self.callbacks.pop(callback_id, None)
+
+    def emit(self, event, key, *args):
+        for events, callback_key, func in list(self.callbacks.values()):
+            if event not in events:
+                continue
+            if callback_key is not None and callback_key is not key:
+                continue
+            func(*args)
+
+    def dirty(self, node=None):
+        """Clear the evaluation cache after a change to the graph.
+
+        When ``node`` is given, only the values of ``node`` and of the nodes
+        downstream of it are cleared. A node is only evaluated after its
+        inputs, so the walk stops at the nodes that have nothing cached.
+        """
+        if not self._cache:
+            return
+        if node is None:
+            self._cache = {}
+            return
+        to_visit = [node]
+        while to_visit:
+            node = to_visit.pop()
+            if self._cache.pop(node.id, None) is None:
+                continue
+            for destinations in node.outputs.values():
+                to_visit.extend(dst_node for dst_node, _ in destinations)
+            to_visit.extend(node.children)
+
+    # -- nodes ------------------------------------------------------------
+
+    def unique_name(self, name):
+        if name not in self.nodes:
+            return name
+        match = _TRAILING_DIGITS.match(name)
+        base = match.group("base")
+        index = int(match.group("digits") or 0) + 1
+        while "{}{}".format(base, index) in self.nodes:
+            index += 1
+        return "{}{}".format(base, index)
+
+    def create_node(self, node_type, name=None, parent=None):
+        if not name:
+            name = node_type + "1"
+        name = self.unique_name(name)
+        node = Node(self, name, node_type)
+        self.nodes[name] = node
+        if parent is not None:
+            self.reparent(node, parent)
+        self.emit("node_added", None, node)
+        return node
+
+    def get(self, name):
+        if isinstance(name, Node):
+            return name
+        name = name.split("|")[-1]
+        return self.nodes.get(name)
+
+    def node_or_raise(self, name):
+        node = self.get(name)
+        if node is None:
+            raise ValueError("No object matches name: {}".format(name))
+        return node
+
+    def rename(self, node, new_name):
+        if new_name == node.name:
+            return node.name
+        del self.nodes[node.name]
+        new_name = self.unique_name(new_name)
+        old_name = node.name
+        node.name = new_name
+        self.nodes[new_name] = node
+        self.emit("node_renamed", node, node, old_name)
+        return new_name
+
+    def delete(self, node):
+        if not node.alive:
+            return
+        doomed = [node] + self.descendants(node)
+        doomed_ids = set(n.id for n in doomed)
+        # evaluate what the surviving destinations keep while the cache is valid.
+        kept = []
+        for n in doomed:
+            for key, dsts in n.outputs.items():
+                for dst in dsts:
+                    if dst[0].id not in doomed_ids:
+                        kept.append(((n, key), dst, self._kept_value(*dst)))
+        for src, dst, value in kept:
+            self.disconnect(src, dst, value=value)
+        for n in reversed(doomed):
+            self.emit("node_removed", None, n)
+            for key, src in list(n.inputs.items()):
+                self.disconnect(src, (n, key), value=None)
+            for key, dsts in list(n.outputs.items()):
+                for dst in list(dsts):
+                    self.disconnect((n, key), dst, value=None)
+        for n in reversed(doomed):
+            if n.parent is not None:
+                n.parent.children.remove(n)
+                n.parent = None
+            del self.nodes[n.name]
+            if n in self.selection:
+                self.selection.remove(n)
+            n.alive = False
+        for n in doomed:
+            self._cache.pop(n.id, None)
+
+    def reparent(self, node, parent, keep_world=False):
+        world = self.world_matrix(node) if keep_world else None
+        self.dirty(node)
+        if node.parent is not None:
+            node.parent.children.remove(node)
+        node.parent = parent
+        if parent is not None:
+            parent.children.append(node)
+        if keep_world and "translate" in node.attrs:
+            self.set_world_matrix(node, world)
+
+    def descendants(self, node):
+        result = []
+        for child in node.children:
+            result.append(child)
+            result.extend(self.descendants(child))
+        return result
+
+    # -- plugs ------------------------------------------------------------
+
+    def resolve(self, plug_name):
+        """Return the node and normalized attribute path of ``plug_name``."""
+        node_name, _, path = plug_name.partition(".")
+        node = self.node_or_raise(node_name)
+        return node, self.normalize(node, path)
+
+    def normalize(self, node, path):
+        segments = []
+        for name, index in split_path(path):
+            attr = node.ensure_attr(name, multi=index is not None)
+            if index is not None and not attr.multi:
+                if attr.type == "generic" and not attr.dynamic:
+                    attr.multi = True
+            if segments and segments[-1] == (attr.parent, None):
+                # ``translate.translateX`` is stored as ``translateX``.
+                segments.pop()
+            segments.append((attr.name, index))
+        return join_path(segments)
+
+    def plug_exists(self, plug_name):
+        node_name, _, path = plug_name.partition(".")
+        node = self.get(node_name)
+        if node is None:
+            return False
+        if not path:
+            return True
+        for name, _ in split_path(path):
+            if node.find_attr(name) is None:
+                return False
+        return True
+
+    def attr_of(self, node, path):
+        return node.find_attr(split_path(path)[-1][0])
+
+    def elements(self, node, path):
+        """Return the existing logical indices of the multi ``path``."""
+        indices = set(node.elements.get(path, ()))
+        prefix = path + "["
+        for key in itertools.chain(node.values, node.inputs, node.outputs):
+            if key.startswith(prefix):
+                index = key[len(prefix) :].split("]")[0]
+                indices.add(int(index))
+        return sorted(indices)
+
+    def add_element(self, node, path):
+        segments = split_path(path)
+        for i, (name, index) in enumerate(segments):
+            if index is not None:
+                parent_path = join_path(segments[:i] + [(name, None)])
+                node.elements.setdefault(parent_path, set()).add(index)
+
+    def remove_element(self, node, path):
+        segments = split_path(path)
+        name, index = segments[-1]
+        parent_path = join_path(segments[:-1] + [(name, None)])
+        node.elements.get(parent_path, set()).discard(index)
+        self.dirty(node)
+        prefix = path
+        for store in (node.values, node.locks, node.flags):
+            for key in list(store):
+                if (
+                    key == prefix
+                    or key.startswith(prefix + ".")
+                    or key.startswith(prefix + "[")
+                ):
+                    del store[key]
+        for key in list(node.inputs):
+            if key == prefix or key.startswith(prefix + "."):
+                self.disconnect(node.inputs[key], (node, key))
+        for key in list(node.outputs):
+            if key == prefix or key.startswith(prefix + "."):
+                for dst in list(node.outputs[key]):
+                    self.disconnect((node, key), dst)
+
+    # -- values -----------------------------------------------------------
+
+    def get_value(self, node, path):
+        cache = self._cache.setdefault(node.id, {})
+        try:
+            value = cache[path]
+        except KeyError:
+            value = cache[path] = self._evaluate(node, path)
+        if isinstance(value, list):
+            return list(value)
+        return value
+
+    def _evaluate(self, node, path):
+        attr = self.attr_of(node, path)
+        # outputs of nodes that are not evaluated keep a scalar default
+        # value, compound destinations then use their own defaults.
+        source = node.inputs.get(path)
+        if source is not None:
+            value = self.get_value(*source)
+            if attr.type != "compound" or isinstance(value, (list, tuple)):
+                return value
+        if attr.parent:
+            parent_path = path[: -len(attr.name)] + attr.parent
+            source = node.inputs.get(parent_path)
+            if source is not None:
+                parent = self.attr_of(node, parent_path)
+                value = self.get_value(*source)
+                if isinstance(value, (list, tuple)):
+                    return value[parent.children.index(attr.name)]
+                return attr.default
+        computed = self._computed_value(node, path, attr)
+        if computed is not None:
+            return computed
+        if attr.type == "compound":
+            return tuple(
+                self.get_value(node, child_path(path, child)) for child in attr.children
+            )
+        if path in node.values:
+            return node.values[path]
+        default = attr.default
+        if isinstance(default, list):
+            return list(default)
+        return default
+
+    def set_value(self, node, path, value):
+        attr = self.attr_of(node, path)
+        if attr.type == "compound":
+            for child, child_value in zip(attr.children, value):
+                self.set_value(node, child_path(path, child), child_value)
+            return
+        if attr.type in ("double", "doubleLinear", "doubleAngle", "float"):
+            value = float(value)
+        elif attr.type == "bool":
+            value = bool(value)
+        elif attr.type in ("long", "short", "byte", "enum"):
+            value = int(value)
+        node.values[path] = value
+        self.add_element(node, path)
+        self.dirty(node)
+        self.emit("attribute_changed", node, node, path)
+
+    def is_locked(self, node, path):
+        if node.locks.get(path):
+            return True
+        attr = self.attr_of(node, path)
+        if attr is not None and attr.parent:
+            return bool(node.locks.get(path[: -len(attr.name)] + attr.parent))
+        return False
+
+    def get_flag(self, node, path, flag):
+        if (path, flag) in node.flags:
+            return node.flags[(path, flag)]
+        attr = self.attr_of(node, path)
+        if flag == "keyable":
+            return attr.keyable
+        return attr.channel_box
+
+    def set_flag(self, node, path, flag, value):
+        node.flags[(path, flag)] = bool(value)
+        attr = self.attr_of(node, path)
+        for child in attr.children:
+            node.flags[(child_path(path, child), flag)] = bool(value)
+
+    def _computed_value(self, node, path, attr):
+        name = attr.name
+        if not node.is_dag:
+            evaluate = _EVALUATORS.get(node.type)
+            return evaluate(self, node, name) if evaluate else None
+        if name in (
+            "worldMatrix",
+            "worldInverseMatrix",
+            "parentMatrix",
+            "parentInverseMatrix",
+        ):
+            if name.startswith("world"):
+                mat = self.world_matrix(node)
+            else:
+                mat = self.parent_world_matrix(node)
+            if "Inverse" in name:
+                mat = mat_inverse(mat)
+            return mat
+        if name == "matrix":
+            return self.local_matrix(node)
+        if name == "inverseMatrix":
+            return mat_inverse(self.local_matrix(node))
+        return None
+
+    # -- connections ------------------------------------------------------
+
+    def connect(self, src, dst, force=False):
+        src_node, src_path = src
+        dst_node, dst_path = dst
+        existing = dst_node.inputs.get(dst_path)
+        if existing is not None:
+            if existing == (src_node, src_path):
+                # maya only warns about connections that already exist.
+                return
+            if not force:
+                raise RuntimeError(
+                    "Connection not made: '{}.{}' -> '{}.{}'. "
+                    "Destination attribute must be writable.".format(
+                        src_node.name, src_path, dst_node.name, dst_path
+                    )
+                )
+            self.disconnect(existing, dst)
+        if self.is_locked(dst_node, dst_path):
+            raise RuntimeError(
+                "The destination attribute '{}.{}' cannot be connected "
+                "because it is locked.".format(dst_node.name, dst_path)
+            )
+        self.dirty(dst_node)
+        dst_node.inputs[dst_path] = (src_node, src_path)
+        src_node.outputs.setdefault(src_path, []).append((dst_node, dst_path))
+        self.add_element(dst_node, dst_path)
+        self.add_element(src_node, src_path)
+        if dst_node.type == "objectSet" and _root_of(dst_path) in (
+            "dagSetMembers",
+            "dnSetMembers",
+        ):
+            dst_node.set_members[src_node] = None
+        self.emit("connection", dst_node, dst_node, dst_path, True)
+        self.emit("connection", src_node, src_node, src_path, True)
+
+    def disconnect(self, src, dst, value=_UNSET):
+        src_node, src_path = src
+        dst_node, dst_path = dst
+        if dst_node.inputs.get(dst_path) != (src_node, src_path):
+            raise RuntimeError(
+                "There is no connection from '{}.{}' to '{}.{}' to disconnect".format(
+                    src_node.name, src_path, dst_node.name, dst_path
+                )
+            )
+        attr = self.attr_of(dst_node, dst_path)
+        if value is _UNSET:
+            value = self._kept_value(dst_node, dst_path)
+        del dst_node.inputs[dst_path]
+        self.dirty(dst_node)
+        # like maya, keep the last value the destination received.
+        if value is None:
+            pass
+        elif attr.type == "compound":
+            for child, child_value in zip(attr.children, value):
+                dst_node.values[child_path(dst_path, child)] = child_value
+        else:
+            dst_node.values[dst_path] = value
+        if dst_node.type == "objectSet" and _root_of(dst_path) in (
+            "dagSetMembers",
+            "dnSetMembers",
+        ):
+            dst_node.set_members.pop(src_node, None)
+        outputs = src_node.outputs.get(src_path, [])
+        outputs.remove((dst_node, dst_path))
+        if not outputs:
+            src_node.outputs.pop(src_path, None)
+        self.emit("connection", dst_node, dst_node, dst_path, False)
+        self.emit("connection", src_node, src_node, src_path, False)
+
+    def _kept_value(self, node, path):
+        """Return the value ``node.path`` keeps once disconnected."""
+        if self.attr_of(node, path).type == "message" or not node.alive:
+            return None
+        return self.get_value(node, path)
+
+    # -- transforms -------------------------------------------------------
+
+    def _vec(self, node, name, default=0.0):
+        if name not in node.attrs:
+            return [default] * 3
+        return list(self.get_value(node, name))
+
+    def local_matrix(self, node):
+        if "translate" not in node.attrs:
+            return list(IDENTITY)
+        joint_orient = None
+        if "jointOrient" in node.attrs:
+            joint_orient = self._vec(node, "jointOrient")
+        return compose(
+            self._vec(node, "translate"),
+            self._vec(node, "rotate"),
+            self._vec(node, "scale", 1.0),
+            joint_orient,
+        )
+
+    def offset_parent_matrix(self, node):
+        if "offsetParentMatrix" not in node.attrs:
+            return list(IDENTITY)
+        return self.get_value(node, "offsetParentMatrix")
+
+    def parent_world_matrix(self, node):
+        if node.parent is None:
+            return list(IDENTITY)
+        if "inheritsTransform" in node.attrs and not self.get_value(
+            node, "inheritsTransform"
+        ):
+            return list(IDENTITY)
+        return self.world_matrix(node.parent)
+
+    def world_matrix(self, node):
+        cache = self._cache.setdefault(node.id, {})
+        matrix = cache.get(None)
+        if matrix is None:
+            local = mat_mult(self.local_matrix(node), self.offset_parent_matrix(node))
+            matrix = cache[None] = mat_mult(local, self.parent_world_matrix(node))
+        return list(matrix)
+
+    def set_local_matrix(self, node, matrix):
+        translate, rotate, scale = decompose(matrix)
+        if "jointOrient" in node.attrs:
+            joint_orient = self._vec(node, "jointOrient")
+            rot = mat_mult(
+                euler_to_matrix(rotate), mat_inverse(euler_to_matrix(joint_orient))
+            )
+            rotate = matrix_to_euler(rot)
+        for name, values in (
+            ("translate", translate),
+            ("rotate", rotate),
+            ("scale", scale),
+        ):
+            for axis, value in zip("XYZ", values):
+                path = name + axis
+                if self.is_locked(node, path) or path in node.inputs:
+                    continue
+                self.set_value(node, path, value)
+
+    def set_world_matrix(self, node, matrix):
+        parent = mat_mult(
+            self.offset_parent_matrix(node), self.parent_world_matrix(node)
+        )
+        self.set_local_matrix(node, mat_mult(matrix, mat_inverse(parent)))
+
+    # -- queries ----------------------------------------------------------
+
+    def ls(self, patterns=None, node_type=None):
+        nodes = list(self.nodes.values())
+        if patterns:
+            matched = []
+            for pattern in patterns:
+                pattern = pattern.split("|")[-1]
+                for node in nodes:
+                    if node not in matched and fnmatch.fnmatchcase(node.name, pattern):
+                        matched.append(node)
+            nodes = matched
+        if node_type:
+            if not isinstance(node_type, (list, tuple)):
+                node_type = [node_type]
+            nodes = [n for n in nodes if set(node_type) & set(n.inherited)]
+        return nodes
+
+
+# -- utility nodes ----------------------------------------------------------
+
+
+def _multi_values(scene, node, name):
+    return [
+        scene.get_value(node, "{}[{}]".format(name, i))
+        for i in scene.elements(node, name)
+    ]
+
+
+def _eval_mult_matrix(scene, node, name):
+    if name != "matrixSum":
+        return None
+    result = list(IDENTITY)
+    for matrix in _multi_values(scene, node, "matrixIn"):
+        result = mat_mult(result, matrix)
+    return result
+
+
+def _eval_inverse_matrix(scene, node, name):
+    if name != "outputMatrix":
+        return None
+    return mat_inverse(scene.get_value(node, "inputMatrix"))
+
+
+def _eval_decompose_matrix(scene, node, name):
+    outputs = ("outputTranslate", "outputRotate", "outputScale")
+    for index, output in enumerate(outputs):
+        if name.startswith(output):
+            values = decompose(scene.get_value(node, "inputMatrix"))[index]
+            axis = name[len(output) :]
+            if not axis:
+                return tuple(values)
+            return values["XYZ".index(axis)]
+    return None
+
+
+def _eval_compose_matrix(scene, node, name):
+    if name != "outputMatrix":
+        return None
+    channels = []
+    for channel, default in (
+        ("inputTranslate", 0.0),
+        ("inputRotate", 0.0),
+        ("inputScale", 1.0),
+    ):
+        values = []
+        for axis in "XYZ":
+            value = scene.get_value(node, channel + axis)
+            values.append(default if value is None and default else value or 0.0)
+        channels.append(values)
+    return compose(*channels)
+
+
+def _eval_choice(scene, node, name):
+    if name != "output":
+        return None
+    selector = int(scene.get_value(node, "selector") or 0)
+    return scene.get_value(node, "input[{}]".format(selector))
+
+
+_EVALUATORS = {
+    "choice": _eval_choice,
+    "multMatrix": _eval_mult_matrix,
+    "inverseMatrix": _eval_inverse_matrix,
+    "decomposeMatrix": _eval_decompose_matrix,
+    "composeMatrix": _eval_compose_matrix,
+}
+
+
+_scene = Scene()
+
+
+def current():
+    """Return the current headless scene."""
+    return _scene
+
+
+def new_scene():
+    """Replace the current scene with an empty one, keeping the callbacks."""
+    global _scene
+    callbacks = _scene.callbacks
+    ids = _scene._callback_ids
+    _scene.emit("scene", None, "beforeNew")
+    # like in maya, the handles to the nodes of the previous scene are no longer valid.
+    for node in _scene.nodes.values():
+        node.alive = False
+    _scene = Scene()
+    _scene.callbacks = callbacks
+    _scene._callback_ids = ids
+    _scene.emit("scene", None, "afterNew")
+    return _scene
@@ -2,6 +2,7 @@ import maya.cmds as cmds
 
 from mop.modules.chain import Chain
 from mop.core.fields import IntField, ObjectListField, ObjectField, StringField
+import mop.config
 import mop.metadata
 
 
@@ -83,7 +84,35 @@ class ChainSwitcher(Chain):
     def _setup_switch(self):
         """Create the necessary nodes to switch between the A and B chains"""
         settings_ctl = self.settings_ctl.get()
-        self.reverse_switch.set(self.add_node("reverse", description="switch"))
+        offset_parent_matrix = mop.config.constraint_mode == "offsetParentMatrix"
+        if offset_parent_matrix:
+            node_types = ["wtAddMatrix", "multMatrix"]
+        else:
+            node_types = [
+                "wtAddMatrix",
+                "multMatrix",
+                "decomposeMatrix",
+                "eulerToQuat",
+                "quatInvert",
+                "quatProd",
+                "quatToEuler",
+            ]
+        joint_nodes = []
+        with self.batch_nodes() as batch:
+            reverse_switch = batch.add_node("reverse", description="switch")
+            for a in self.chain_a:
+                metadata = mop.metadata.metadata_from_name(a)
+                joint_nodes.append(
+                    [
+                        batch.add_node(
+                            node_type,
+                            description=metadata["description"],
+                            object_id=metadata["id"],
+                        )
+                        for node_type in node_types
+                    ]
+                )
+        self.reverse_switch.set(reverse_switch)
         cmds.connectAttr(
             settings_ctl + "." + self.switch_long_name.get(),
             self.reverse_switch.get() + ".inputX",
@@ -92,22 +121,7 @@ class ChainSwitcher(Chain):
         for i, deform in enumerate(self.deform_joints):
             a = self.chain_a[i]
             b = self.chain_b[i]
-            metadata = mop.metadata.metadata_from_name(a)
-            wt_add_mat = self.add_node(
-                "wtAddMatrix",
-                description=metadata["description"],
-                object_id=metadata["id"],
-            )
-            mult_mat = self.add_node(
-                "multMatrix",
-                description=metadata["description"],
-                object_id=metadata["id"],
-            )
-            decompose_mat = self.add_node(
-                "decomposeMatrix",
-                description=metadata["description"],
-                object_id=metadata["id"],
-            )
+            wt_add_mat, mult_mat = joint_nodes[i][:2]
             cmds.connectAttr(
                 a + ".worldMatrix[0]", wt_add_mat + ".wtMatrix[0].matrixIn"
             )
@@ -122,6 +136,27 @@ class ChainSwitcher(Chain):
                 settings_ctl + "." + self.switch_long_name.get(),
                 wt_add_mat + ".wtMatrix[1].weightIn",
             )
+
+            if offset_parent_matrix:
+                # cancel the deform joint's own matrix out, like
+                # the "offsetParentMatrix" mode of `mop.dag.matrix_constraint`.
+                cmds.connectAttr(deform + ".inverseMatrix", mult_mat + ".matrixIn[0]")
+                cmds.connectAttr(wt_add_mat + ".matrixSum", mult_mat + ".matrixIn[1]")
+                cmds.connectAttr(
+                    deform + ".parentInverseMatrix[0]", mult_mat + ".matrixIn[2]"
+                )
+                cmds.connectAttr(
+                    mult_mat + ".matrixSum", deform + ".offsetParentMatrix"
+                )
+                continue
+
+            (
+                decompose_mat,
+                euler_to_quat,
+                quat_invert,
+                quat_prod,
+                quat_to_euler,
+            ) = joint_nodes[i][2:]
             cmds.connectAttr(wt_add_mat + ".matrixSum", mult_mat + ".matrixIn[0]")
             cmds.connectAttr(
                 deform + ".parentInverseMatrix[0]", mult_mat + ".matrixIn[1]"
@@ -129,27 +164,6 @@ class ChainSwitcher(Chain):
             cmds.connectAttr(mult_mat + ".matrixSum", decompose_mat + ".inputMatrix")
 
             # substract the driven's joint orient from the rotation
-            euler_to_quat = self.add_node(
-                "eulerToQuat",
-                description=metadata["description"],
-                object_id=metadata["id"],
-            )
-            quat_invert = self.add_node(
-                "quatInvert",
-                description=metadata["description"],
-                object_id=metadata["id"],
-            )
-            quat_prod = self.add_node(
-                "quatProd",
-                description=metadata["description"],
-                object_id=metadata["id"],
-            )
-            quat_to_euler = self.add_node(
-                "quatToEuler",
-                description=metadata["description"],
-                object_id=metadata["id"],
-            )
-
             cmds.connectAttr(deform + ".jointOrient", euler_to_quat + ".inputRotate")
             cmds.connectAttr(euler_to_quat + ".outputQuat", quat_invert + ".inputQuat")
             cmds.connectAttr(decompose_mat + ".outputQuat", quat_prod + ".input1Quat")
@@ -0,0 +1,49 @@
+"""Maya plugin recording the modifiers applied by `mop` in the undo queue.
+
+It is loaded on demand by `mop.utils.undo.apply_modifier`.
+"""
+import maya.api.OpenMaya as om2
+
+
+def maya_useNewAPI():
+    pass
+
+
+class ApplyModifier(om2.MPxCommand):
+    """Apply the modifier pending in `mop.utils.undo`."""
+
+    name = "mopApplyModifier"
+
+    def __init__(self):
+        super(ApplyModifier, self).__init__()
+        self.modifier = None
+
+    @staticmethod
+    def creator():
+        return ApplyModifier()
+
+    def doIt(self, args):
+        # imported here to get the current module after a reload of mop.
+        import mop.utils.undo
+
+        self.modifier = mop.utils.undo._pending_modifiers.pop()
+        self.redoIt()
+
+    def redoIt(self):
+        self.modifier.doIt()
+
+    def undoIt(self):
+        self.modifier.undoIt()
+
+    def isUndoable(self):
+        return True
+
+
+def initializePlugin(plugin):
+    om2.MFnPlugin(plugin, "HolisticCoders").registerCommand(
+        ApplyModifier.name, ApplyModifier.creator
+    )
+
+
+def uninitializePlugin(plugin):
+    om2.MFnPlugin(plugin).deregisterCommand(ApplyModifier.name)
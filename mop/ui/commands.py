@@ -1,8 +1,8 @@
 """Commands used throughout the GUI."""
 import logging
 import sys
-import time
 from mop.custom_scripts import run_scripts
+from mop.utils.profiler import Profiler, phase
 
 
 logger = logging.getLogger(__name__)
@@ -67,12 +67,17 @@ def build_rig():
 
     mop.incremental_save()
     rig = Rig()
-    start_time = time.time()
-    run_scripts("build_pre")
-    rig.build()
-    run_scripts("build_post")
-    tot_time = time.time() - start_time
-    logger.info("Building the rig took {}s".format(tot_time))
+    with Profiler() as profiler:
+        with phase("build_pre scripts"):
+            run_scripts("build_pre")
+        rig.build()
+        with phase("build_post scripts"):
+            run_scripts("build_post")
+    logger.info("Building the rig took {}s".format(profiler.total_time))
+    profiler.log_summary()
+    report_path = profiler.default_path()
+    if report_path:
+        profiler.write(report_path)
 
 
 def unbuild_rig():
@@ -206,7 +206,7 @@ class mopParentSpaces(MayaQWidgetBaseMixin, QtWidgets.QMainWindow):
             mop.dag.remove_parent_spaces(ctl)
 
         if drivers:
-            Rig.reset_pose()
+            Rig().reset_pose()
             mop.dag.create_space_switching(ctl, drivers, space_type)
 
         data = json.dumps({space_type: drivers})
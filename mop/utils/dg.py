@@ -1,20 +1,75 @@
+from collections import OrderedDict
+
 import maya.cmds as cmds
+import maya.api.OpenMaya as om2
 import mop.metadata
 
+# utility nodes without side effects, their outputs only depend on their inputs.
+DEDUPLICABLE_TYPES = set(
+    [
+        "addDoubleLinear",
+        "blendColors",
+        "choice",
+        "clamp",
+        "composeMatrix",
+        "condition",
+        "decomposeMatrix",
+        "distanceBetween",
+        "eulerToQuat",
+        "inverseMatrix",
+        "multDoubleLinear",
+        "multMatrix",
+        "multiplyDivide",
+        "pickMatrix",
+        "plusMinusAverage",
+        "quatInvert",
+        "quatNormalize",
+        "quatProd",
+        "quatToEuler",
+        "remapValue",
+        "reverse",
+        "setRange",
+        "vectorProduct",
+        "wtAddMatrix",
+    ]
+)
+
 
 class CatchCreatedNodes(object):
+    """Catch the nodes created inside of the context.
+
+    The nodes are recorded by a node added callback as they are created,
+    so the cost of the context depends on the number of created nodes
+    instead of the size of the scene. Nodes created then deleted inside
+    of the context are ignored.
+    """
+
     def __init__(self):
         self.nodes = []
-        self.before_nodes = set()
-        self.after_nodes = set()
+        self._handles = []
+        self._callback_id = None
 
     def __enter__(self):
-        self.before_nodes = set(cmds.ls("*"))
+        self._callback_id = om2.MDGMessage.addNodeAddedCallback(self._node_added)
         return self.nodes
 
     def __exit__(self, *args):
-        self.after_nodes = set(cmds.ls("*"))
-        self.nodes.extend(list(self.after_nodes - self.before_nodes))
+        om2.MMessage.removeCallback(self._callback_id)
+        self._callback_id = None
+        self.nodes.extend(
+            node_name(handle.object()) for handle in self._handles if handle.isValid()
+        )
+        self._handles = []
+
+    def _node_added(self, mobj, *args):
+        self._handles.append(om2.MObjectHandle(mobj))
+
+
+def node_name(mobj):
+    """Return the shortest unique name of a node from its MObject."""
+    if mobj.hasFn(om2.MFn.kDagNode):
+        return om2.MDagPath.getAPathTo(mobj).partialPathName()
+    return om2.MFnDependencyNode(mobj).name()
 
 
 def find_mirror_node(node):
@@ -35,3 +90,97 @@ def find_mirror_node(node):
         return mirror_node
 
     return None
+
+
+def deduplicate_nodes(nodes):
+    """Merge the utility nodes of ``nodes`` computing the same values.
+
+    Nodes are duplicates when they have the same type, input connections
+    and static attribute values. The outputs of a duplicate are moved to
+    the first of its duplicates, then it is deleted. This is repeated
+    until no duplicate is left, as merging nodes can make the nodes they
+    drive identical.
+
+    Only the `DEDUPLICABLE_TYPES` are merged, and nodes with a connected
+    message attribute are kept as something references them.
+
+    :param nodes: nodes to deduplicate.
+    :type nodes: list
+    :return: the deleted duplicates.
+    :rtype: list
+    """
+    candidates = [
+        node
+        for node in nodes
+        if cmds.nodeType(node) in DEDUPLICABLE_TYPES
+        and not cmds.listConnections(node + ".message")
+    ]
+    removed = []
+    while True:
+        groups = OrderedDict()
+        for node in candidates:
+            inputs = _input_connections(node)
+            key = (cmds.nodeType(node), tuple(sorted(inputs.iteritems())))
+            groups.setdefault(key, []).append((node, inputs))
+
+        duplicates = []
+        for group in groups.itervalues():
+            if len(group) < 2:
+                continue
+            identicals = OrderedDict()
+            for node, inputs in group:
+                identicals.setdefault(_static_values(node, inputs), []).append(node)
+            for identical in identicals.itervalues():
+                for duplicate in identical[1:]:
+                    _move_outputs(duplicate, identical[0])
+                    duplicates.append(duplicate)
+
+        if not duplicates:
+            return removed
+        cmds.delete(duplicates)
+        removed.extend(duplicates)
+        duplicates = set(duplicates)
+        candidates = [node for node in candidates if node not in duplicates]
+
+
+def _input_connections(node):
+    """Return the source plug of every connected attribute of ``node``."""
+    connections = cmds.listConnections(
+        node, source=True, destination=False, connections=True, plugs=True
+    )
+    connections = connections or []
+    return dict(
+        (dst.partition(".")[2], src)
+        for dst, src in zip(connections[::2], connections[1::2])
+    )
+
+
+def _static_values(node, inputs):
+    """Return the values of the unconnected attributes of ``node``."""
+    values = []
+    for attr in cmds.listAttr(node, multi=True, write=True, hasData=True) or []:
+        if attr in inputs:
+            continue
+        try:
+            value = cmds.getAttr(node + "." + attr)
+        except (RuntimeError, ValueError):
+            continue
+        values.append((attr, _hashable(value)))
+    return tuple(values)
+
+
+def _hashable(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_hashable(v) for v in value)
+    return value
+
+
+def _move_outputs(node, target):
+    """Connect the outputs of ``node`` from the same attributes of ``target``."""
+    connections = cmds.listConnections(
+        node, source=False, destination=True, connections=True, plugs=True
+    )
+    connections = connections or []
+    for src, dst in zip(connections[::2], connections[1::2]):
+        attr = src.partition(".")[2]
+        cmds.connectAttr(target + "." + attr, dst, force=True)
@@ -0,0 +1,220 @@
+"""Profile the build of a rig.
+
+A `Profiler` records, for every phase of the build, the wall time spent in
+it, the number of DG nodes created and the number of `maya.cmds` calls
+issued. Phases are declared with `phase` and can be nested, they cost
+nothing when no profiler is running::
+
+    with Profiler() as profiler:
+        with phase("build"):
+            rig.build()
+    profiler.log_summary()
+    profiler.write(profiler.default_path())
+"""
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import maya.cmds as cmds
+import maya.api.OpenMaya as om2
+
+logger = logging.getLogger(__name__)
+
+_active = None
+
+
+def active_profiler():
+    """Return the running profiler, if any."""
+    return _active
+
+
+@contextmanager
+def phase(name, group=None):
+    """Record the code block as a phase of the running profiler.
+
+    :param name: name of the phase.
+    :type name: str
+    :param group: phases sharing the same group are summed up
+        in the report, e.g. the type of the module being built.
+    :type group: str
+    """
+    if _active is None:
+        yield
+        return
+    with _active.phase(name, group):
+        yield
+
+
+class Profiler(object):
+    """Record the wall time, created nodes and cmds calls of the phases."""
+
+    def __init__(self):
+        self.phases = []
+        self.cmds_calls = 0
+        self.nodes_created = 0
+        self._stack = []
+        self._callback_id = None
+        self._original_cmds = {}
+        self._start_time = None
+        self.total_time = 0.0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        global _active
+        if _active is not None:
+            raise RuntimeError("A profiler is already running.")
+        _active = self
+        self._start_time = time.time()
+        self._callback_id = om2.MDGMessage.addNodeAddedCallback(self._node_added)
+        self._wrap_cmds()
+
+    def stop(self):
+        global _active
+        self._unwrap_cmds()
+        om2.MMessage.removeCallback(self._callback_id)
+        self._callback_id = None
+        self.total_time = time.time() - self._start_time
+        _active = None
+
+    @contextmanager
+    def phase(self, name, group=None):
+        path = "/".join([p["name"] for p in self._stack] + [name])
+        record = OrderedDict(
+            [
+                ("name", name),
+                ("path", path),
+                ("group", group),
+                ("depth", len(self._stack)),
+                ("wall_time", 0.0),
+                ("nodes_created", 0),
+                ("cmds_calls", 0),
+            ]
+        )
+        self.phases.append(record)
+        self._stack.append(record)
+        start_time = time.time()
+        start_nodes = self.nodes_created
+        start_calls = self.cmds_calls
+        try:
+            yield record
+        finally:
+            record["wall_time"] = time.time() - start_time
+            record["nodes_created"] = self.nodes_created - start_nodes
+            record["cmds_calls"] = self.cmds_calls - start_calls
+            self._stack.pop()
+
+    def groups(self):
+        """Return the totals of every group of phases."""
+        groups = OrderedDict()
+        for record in self.phases:
+            if record["group"] is None:
+                continue
+            totals = groups.setdefault(
+                record["group"],
+                OrderedDict(
+                    [
+                        ("count", 0),
+                        ("wall_time", 0.0),
+                        ("nodes_created", 0),
+                        ("cmds_calls", 0),
+                    ]
+                ),
+            )
+            totals["count"] += 1
+            for key in ("wall_time", "nodes_created", "cmds_calls"):
+                totals[key] += record[key]
+        return groups
+
+    def report(self):
+        return OrderedDict(
+            [
+                ("scene", cmds.file(query=True, sceneName=True)),
+                ("date", time.strftime("%Y-%m-%dT%H:%M:%S")),
+                ("wall_time", self.total_time),
+                ("nodes_created", self.nodes_created),
+                ("cmds_calls", self.cmds_calls),
+                ("phases", self.phases),
+                ("groups", self.groups()),
+            ]
+        )
+
+    @staticmethod
+    def default_path(suffix="build_profile"):
+        """Return the path of the report, next to the current scene."""
+        scene = cmds.file(query=True, sceneName=True)
+        if not scene:
+            return None
+        return "{}_{}.json".format(os.path.splitext(scene)[0], suffix)
+
+    def write(self, path):
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=4)
+        logger.info("Profiling report written to {}".format(path))
+
+    def log_summary(self, count=10):
+        """Log the totals, the groups and the slowest leaf phases."""
+        logger.info(
+            "Profiled {:.3f}s, {} nodes created, {} cmds calls".format(
+                self.total_time, self.nodes_created, self.cmds_calls
+            )
+        )
+        for group, totals in self.groups().iteritems():
+            logger.info(
+                "    {}: {:.3f}s, {} nodes, {} cmds calls ({} phases)".format(
+                    group,
+                    totals["wall_time"],
+                    totals["nodes_created"],
+                    totals["cmds_calls"],
+                    totals["count"],
+                )
+            )
+        parents = set(record["path"].rpartition("/")[0] for record in self.phases)
+        leaves = [record for record in self.phases if record["path"] not in parents]
+        leaves.sort(key=lambda record: record["wall_time"], reverse=True)
+        logger.info("Slowest phases:")
+        for record in leaves[:count]:
+            logger.info(
+                "    {}: {:.3f}s, {} nodes, {} cmds calls".format(
+                    record["path"],
+                    record["wall_time"],
+                    record["nodes_created"],
+                    record["cmds_calls"],
+                )
+            )
+
+    def _node_added(self, *args):
+        self.nodes_created += 1
+
+    def _wrap_cmds(self):
+        """Replace every command of `maya.cmds` with a counting wrapper."""
+        for name in dir(cmds):
+            if name.startswith("_"):
+                continue
+            func = getattr(cmds, name)
+            if not callable(func) or isinstance(func, type):
+                continue
+            self._original_cmds[name] = func
+            setattr(cmds, name, self._counted(func))
+
+    def _unwrap_cmds(self):
+        for name, func in self._original_cmds.iteritems():
+            setattr(cmds, name, func)
+        self._original_cmds = {}
+
+    def _counted(self, func):
+        def wrapped(*args, **kwargs):
+            self.cmds_calls += 1
+            return func(*args, **kwargs)
+
+        wrapped.__name__ = func.__name__
+        wrapped.__doc__ = func.__doc__
+        return wrapped
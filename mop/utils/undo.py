@@ -1,8 +1,18 @@
 import contextlib
+import os
 from functools import wraps
 
 import maya.cmds as cmds
 
+_PLUGIN_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "plugins",
+    "mopApplyModifier.py",
+)
+
+# modifiers waiting to be picked up by the `mopApplyModifier` command.
+_pending_modifiers = []
+
 
 @contextlib.contextmanager
 def undoChunk():
@@ -24,3 +34,22 @@ def undoable(func):
             cmds.undoInfo(closeChunk=True)
 
     return wrapped
+
+
+def apply_modifier(modifier):
+    """Call ``doIt()`` on a ``MDGModifier`` and put it in the undo queue.
+
+    Modifiers are not undoable on their own, they are applied by the
+    ``mopApplyModifier`` command so undoing it undoes the whole modifier.
+
+    :param modifier: modifier to apply.
+    :type modifier: om2.MDGModifier
+    """
+    if not cmds.pluginInfo(_PLUGIN_PATH, query=True, loaded=True):
+        cmds.loadPlugin(_PLUGIN_PATH, quiet=True)
+    _pending_modifiers.append(modifier)
+    try:
+        cmds.mopApplyModifier()
+    finally:
+        if modifier in _pending_modifiers:
+            _pending_modifiers.remove(modifier)